@@ -3,6 +3,12 @@ ASGI config for edificio project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Los eventos en vivo (/eventos/, Server-Sent Events) solo se sirven a través
+de esta aplicación: cada cliente conectado es una corrutina y no un worker.
+Las lecturas AJAX de disponibilidad y calendario son vistas async: aquí
+esperan a la base de datos sin ocupar un hilo por request (la comparación
+con las versiones sync está en `manage.py comparar_vistas_async`).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,108 @@
+"""
+Configuración de gunicorn para producción (línea web: del Procfile).
+
+    gunicorn -c edificio/gunicorn_conf.py
+
+Por defecto sirve la aplicación ASGI con workers de uvicorn: los eventos en
+vivo (SSE) y las vistas async lo necesitan. Con SERVIDOR=wsgi sirve
+edificio.wsgi con workers gthread. Cada valor se puede ajustar con variables
+de entorno sin tocar el código. Sin REDIS_URL corre un solo worker.
+"""
+import os
+
+# Gunicorn lee como ajuste cualquier nombre de este módulo, y `config` es uno
+from decouple import config as _entorno
+from uvicorn_worker import UvicornWorker as _UvicornWorker
+
+SERVIDOR = _entorno('SERVIDOR', default='asgi')
+
+# Sin REDIS_URL la cache (versiones, ETags, JSON cacheado) y el canal de
+# eventos son de cada proceso: con varios workers quedarían desincronizados
+REDIS = bool(_entorno('REDIS_URL', default=''))
+
+
+def _cpus():
+    # En contenedores la afinidad refleja los CPUs asignados, no los del host
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# ============================================
+# APLICACIÓN Y WORKERS
+# ============================================
+
+bind = f"0.0.0.0:{_entorno('PORT', default='8000')}"
+
+if SERVIDOR == 'wsgi':
+    wsgi_app = 'edificio.wsgi:application'
+    worker_class = 'gthread'
+    # Workers sync: mientras esperan a la base de datos otro proceso atiende
+    workers = _entorno('WEB_CONCURRENCY', default=_cpus() * 2 + 1 if REDIS else 1, cast=int)
+    threads = _entorno('GUNICORN_THREADS', default=4, cast=int)
+else:
+    wsgi_app = 'edificio.asgi:application'
+    worker_class = 'edificio.gunicorn_conf.UvicornWorker'
+    # Un loop de eventos por CPU ya atiende muchas conexiones a la vez
+    workers = _entorno('WEB_CONCURRENCY', default=_cpus() + 1 if REDIS else 1, cast=int)
+
+if workers > 1 and not REDIS:
+    raise RuntimeError(
+        f'WEB_CONCURRENCY={workers} requiere REDIS_URL: sin una cache y un canal de eventos '
+        'compartidos cada worker tendría sus propias versiones y eventos'
+    )
+
+# Se importa Django una vez en el maestro y los workers lo heredan al fork:
+# arrancan más rápido y comparten la memoria de solo lectura
+preload_app = True
+
+# Más que el tiempo ocioso del proxy (60 s), así nunca cerramos primero una
+# conexión que el proxy va a reutilizar
+keepalive = _entorno('GUNICORN_KEEPALIVE', default=65, cast=int)
+
+# Reciclar cada worker tras N requests acota cualquier crecimiento de memoria;
+# el jitter evita que todos se reinicien al mismo tiempo
+max_requests = _entorno('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = _entorno('GUNICORN_MAX_REQUESTS_JITTER', default=100, cast=int)
+
+# ============================================
+# TIEMPOS Y APAGADO
+# ============================================
+
+# Sin latido del worker en este tiempo, el maestro lo reinicia. En los
+# workers async no limita la duración de un request (las conexiones SSE
+# duran minutos)
+timeout = _entorno('GUNICORN_TIMEOUT', default=60, cast=int)
+
+# Al recibir SIGTERM (deploy) cada worker deja de aceptar conexiones y tiene
+# este tiempo para terminar las que tiene en curso
+graceful_timeout = _entorno('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+
+accesslog = '-'
+errorlog = '-'
+loglevel = _entorno('GUNICORN_LOGLEVEL', default='info')
+
+
+class UvicornWorker(_UvicornWorker):
+    """
+    Worker de uvicorn ajustado a Django: sin protocolo lifespan (Django no lo
+    implementa) y cortando las conexiones abiertas antes de que el maestro
+    mate el proceso. Los EventSource se reconectan solos a otro worker.
+    """
+
+    CONFIG_KWARGS = {
+        **_UvicornWorker.CONFIG_KWARGS,
+        'lifespan': 'off',
+        'timeout_graceful_shutdown': max(graceful_timeout - 5, 1),
+    }
+
+
+def post_fork(server, worker):
+    # Con preload_app una conexión abierta en el maestro quedaría compartida
+    # entre procesos; cada worker abre las suyas
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    connections.close_all()
@@ -0,0 +1,237 @@
+"""
+Instrumentación por request: consultas SQL, tiempo en la base de datos,
+consultas duplicadas y tiempo de vista y de plantillas.
+
+Se activa con INSTRUMENTACION=True en el entorno. Desactivada, Django la
+saca de la cadena de middlewares al arrancar (MiddlewareNotUsed) y no cuesta
+nada. Activa:
+
+- agrega el header Server-Timing (visible en las herramientas del navegador);
+- registra en el logger 'edificio.instrumentacion' un JSON por cada request
+  más lento que INSTRUMENTACION_UMBRAL_MS, con más consultas que
+  INSTRUMENTACION_UMBRAL_CONSULTAS o que excede el presupuesto de su vista;
+- deja la medición en `response.medicion` para que los tests comparen contra
+  el presupuesto declarado con @presupuesto.
+
+Las consultas se cuentan con un execute_wrapper en cada conexión que lee la
+medición del request desde una ContextVar, así también se cuentan las del
+ORM async (que corren en otro hilo pero copian el contexto).
+"""
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('edificio.instrumentacion')
+
+_medicion = ContextVar('medicion', default=None)
+
+
+def presupuesto(consultas=None, ms=None):
+    """
+    Declara el máximo de consultas SQL y/o milisegundos de una vista. Se
+    aplica por fuera de los demás decoradores de la vista.
+    """
+    def decorador(vista):
+        vista.presupuesto = {'consultas': consultas, 'ms': ms}
+        return vista
+    return decorador
+
+
+class Medicion:
+    """Lo medido durante un request"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.total_s = 0.0
+        self.vista = None
+        self.presupuesto = None
+        self.inicio_vista = None
+        self.vista_s = 0.0
+        self.consultas = 0
+        self.sql_s = 0.0
+        self.plantilla_s = 0.0
+        self.en_plantilla = False
+        self._por_sql = Counter()
+        self._exactas = Counter()
+
+    def registrar(self, sql, params, segundos):
+        self.consultas += 1
+        self.sql_s += segundos
+        self._por_sql[sql] += 1
+        self._exactas[(sql, repr(params))] += 1
+
+    @property
+    def duplicadas(self):
+        """Consultas repetidas con el mismo SQL y los mismos parámetros"""
+        return sum(veces - 1 for veces in self._exactas.values())
+
+    def repetidas(self, limite=3):
+        """Los SQL que más se repiten con distintos parámetros (posibles N+1)"""
+        return [(sql, veces) for sql, veces in self._por_sql.most_common(limite) if veces > 1]
+
+    def excesos(self):
+        """Lista de textos con lo que supera el presupuesto de la vista"""
+        if not self.presupuesto:
+            return []
+        excesos = []
+        maximo = self.presupuesto.get('consultas')
+        if maximo is not None and self.consultas > maximo:
+            excesos.append(f'{self.consultas} consultas (presupuesto {maximo})')
+        maximo = self.presupuesto.get('ms')
+        if maximo is not None and self.total_s * 1000 > maximo:
+            excesos.append(f'{self.total_s * 1000:.0f} ms (presupuesto {maximo})')
+        return excesos
+
+    def server_timing(self):
+        return ', '.join([
+            f'sql;dur={self.sql_s * 1000:.1f};desc="{self.consultas} consultas, {self.duplicadas} duplicadas"',
+            f'plantilla;dur={self.plantilla_s * 1000:.1f}',
+            f'vista;dur={self.vista_s * 1000:.1f}',
+            f'total;dur={self.total_s * 1000:.1f}',
+        ])
+
+    def registro(self, request, response):
+        return {
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': self.vista,
+            'estado': response.status_code,
+            'total_ms': round(self.total_s * 1000, 1),
+            'vista_ms': round(self.vista_s * 1000, 1),
+            'plantilla_ms': round(self.plantilla_s * 1000, 1),
+            'sql_ms': round(self.sql_s * 1000, 1),
+            'consultas': self.consultas,
+            'duplicadas': self.duplicadas,
+            'repetidas': [{'sql': sql[:300], 'veces': veces} for sql, veces in self.repetidas()],
+            'excesos': self.excesos(),
+        }
+
+
+# ============================================
+# GANCHOS EN LA BASE DE DATOS Y LAS PLANTILLAS
+# ============================================
+
+def _envoltura_sql(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.registrar(sql, params, time.perf_counter() - inicio)
+
+
+def _instrumentar_conexion(connection, **kwargs):
+    if _envoltura_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_envoltura_sql)
+
+
+def _instrumentar_plantillas():
+    """
+    Envuelve Template.render una sola vez por proceso. Solo se mide el render
+    más externo: los {% include %} ya quedan dentro de ese tiempo.
+    """
+    from django.template.base import Template
+
+    original = Template.render
+    if getattr(original, 'instrumentado', False):
+        return
+
+    @wraps(original)
+    def render(self, context):
+        medicion = _medicion.get()
+        if medicion is None or medicion.en_plantilla:
+            return original(self, context)
+        medicion.en_plantilla = True
+        inicio = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            medicion.en_plantilla = False
+            medicion.plantilla_s += time.perf_counter() - inicio
+
+    render.instrumentado = True
+    Template.render = render
+
+
+def _instalar():
+    connection_created.connect(_instrumentar_conexion, dispatch_uid='edificio.instrumentacion')
+    # Las conexiones abiertas antes de cargar el middleware no avisan
+    for connection in connections.all(initialized_only=True):
+        _instrumentar_conexion(connection)
+    _instrumentar_plantillas()
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+class InstrumentacionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTACION_ACTIVA', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral_ms = getattr(settings, 'INSTRUMENTACION_UMBRAL_MS', 500)
+        self.umbral_consultas = getattr(settings, 'INSTRUMENTACION_UMBRAL_CONSULTAS', 30)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        _instalar()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, response, medicion)
+
+    async def __acall__(self, request):
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, response, medicion)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicion = _medicion.get()
+        if medicion is not None:
+            medicion.vista = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+            medicion.presupuesto = getattr(view_func, 'presupuesto', None)
+            medicion.inicio_vista = time.perf_counter()
+        return None
+
+    def _terminar(self, request, response, medicion):
+        fin = time.perf_counter()
+        medicion.total_s = fin - medicion.inicio
+        if medicion.inicio_vista is not None:
+            medicion.vista_s = fin - medicion.inicio_vista
+        response['Server-Timing'] = medicion.server_timing()
+        response.medicion = medicion
+
+        if (
+            medicion.total_s * 1000 >= self.umbral_ms
+            or medicion.consultas >= self.umbral_consultas
+            or medicion.excesos()
+        ):
+            registro = medicion.registro(request, response)
+            logger.warning(json.dumps(registro, ensure_ascii=False), extra={'instrumentacion': registro})
+        return response
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir el request completo (ver edificio/middleware.py)
+    'edificio.middleware.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,12 +81,19 @@ WSGI_APPLICATION = 'edificio.wsgi.application'
 
 import dj_database_url
 
+# Servidor de producción (edificio/gunicorn_conf.py)
+SERVIDOR = config('SERVIDOR', default='asgi')
+
 # Usar DATABASE_URL de Railway (conexión privada)
 if 'DATABASE_URL' in os.environ:
     DATABASES = {
         'default': dj_database_url.config(
             default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600,
+            # Bajo ASGI el código sync de cada request corre en un hilo nuevo y
+            # una conexión persistente quedaría abierta por hilo hasta agotar
+            # las de PostgreSQL; Django indica desactivarlas. Con WSGI los
+            # hilos de gthread se reutilizan y la conexión también
+            conn_max_age=0 if SERVIDOR == 'asgi' else 600,
             conn_health_checks=True,
         )
     }
@@ -98,6 +107,43 @@ else:
     }
 
 
+# Cache
+# Redis compartido entre procesos en producción; memoria local en desarrollo
+
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Eventos en vivo (Server-Sent Events): con Redis llegan a todos los workers
+if 'REDIS_URL' in os.environ:
+    RESERVAS_CANAL_EVENTOS = 'reservas.eventos.CanalRedis'
+else:
+    RESERVAS_CANAL_EVENTOS = 'reservas.eventos.CanalLocal'
+
+
+# Ciclo de vida de las reservas (reservas/historial.py): `mantener_reservas`
+# archiva en SQLite las anteriores a este horizonte; en PostgreSQL la tabla
+# está particionada por mes y solo se crean las particiones que faltan
+RESERVAS_DIAS_EN_CALIENTE = config('RESERVAS_DIAS_EN_CALIENTE', default=400, cast=int)
+
+
+# Instrumentación por request (edificio/middleware.py): header Server-Timing
+# y log de requests lentos. Desactivada no agrega ningún costo
+INSTRUMENTACION_ACTIVA = config('INSTRUMENTACION', default=False, cast=bool)
+INSTRUMENTACION_UMBRAL_MS = config('INSTRUMENTACION_UMBRAL_MS', default=500, cast=int)
+INSTRUMENTACION_UMBRAL_CONSULTAS = config('INSTRUMENTACION_UMBRAL_CONSULTAS', default=30, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -116,6 +162,38 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hasher preferido para las contraseñas (reservas/hashers.py). Al iniciar
+# sesión Django re-hashea con él cualquier contraseña guardada con otro
+# hasher o con otro costo; los demás de la lista solo verifican hashes viejos
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='argon2')
+PASSWORD_ARGON2_TIEMPO = config('PASSWORD_ARGON2_TIEMPO', default=2, cast=int)
+PASSWORD_ARGON2_MEMORIA_KB = config('PASSWORD_ARGON2_MEMORIA_KB', default=19456, cast=int)
+PASSWORD_ARGON2_PARALELISMO = config('PASSWORD_ARGON2_PARALELISMO', default=1, cast=int)
+PASSWORD_SCRYPT_FACTOR = config('PASSWORD_SCRYPT_FACTOR', default=2 ** 14, cast=int)
+PASSWORD_PBKDF2_ITERACIONES = config('PASSWORD_PBKDF2_ITERACIONES', default=600000, cast=int)
+
+# El ajustado reemplaza al de Django con el mismo algoritmo (si quedaran los
+# dos, el de Django verificaría y pediría re-hashear en cada login)
+_HASHERS = {
+    'argon2': ('reservas.hashers.Argon2Ajustado', 'django.contrib.auth.hashers.Argon2PasswordHasher'),
+    'scrypt': ('reservas.hashers.ScryptAjustado', 'django.contrib.auth.hashers.ScryptPasswordHasher'),
+    'pbkdf2': ('reservas.hashers.PBKDF2Ajustado', 'django.contrib.auth.hashers.PBKDF2PasswordHasher'),
+}
+PASSWORD_HASHERS = [_HASHERS[PASSWORD_HASHER][0]] + [
+    de_django for nombre, (_, de_django) in _HASHERS.items() if nombre != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+
+# Sesiones: con Redis se leen de la cache y solo van a la base de datos si la
+# cache no las tiene, así un request autenticado no consulta la tabla de
+# sesiones. Sin una cache compartida, un logout o un cambio de contraseña solo
+# borraría la sesión de la cache de un proceso: ahí se usa solo la base de datos
+SESSION_ENGINE = config(
+    'SESSION_ENGINE',
+    default='django.contrib.sessions.backends.cached_db' if 'REDIS_URL' in os.environ
+    else 'django.contrib.sessions.backends.db',
+)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Oficina, Espacio, Reserva
+from .models import Oficina, Espacio, Reserva, OcupacionDiaria, SerieReserva
 
 @admin.register(Oficina)
 class OficinaAdmin(admin.ModelAdmin):
@@ -21,4 +21,16 @@ class ReservaAdmin(admin.ModelAdmin):
     
     def duracion_horas(self, obj):
         return f"{obj.duracion_horas()}h"
-    duracion_horas.short_description = 'Duración'
\ No newline at end of file
+    duracion_horas.short_description = 'Duración'
+
+@admin.register(SerieReserva)
+class SerieReservaAdmin(admin.ModelAdmin):
+    list_display = ['oficina', 'espacio', 'frecuencia', 'fecha_inicio', 'fecha_fin']
+    list_filter = ['frecuencia', 'espacio__tipo']
+    search_fields = ['oficina__numero', 'espacio__nombre']
+
+@admin.register(OcupacionDiaria)
+class OcupacionDiariaAdmin(admin.ModelAdmin):
+    list_display = ['espacio', 'fecha', 'total_reservas', 'mascara']
+    list_filter = ['espacio__tipo']
+    date_hierarchy = 'fecha'
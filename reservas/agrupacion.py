@@ -0,0 +1,159 @@
+"""
+Agrupación de bloques consecutivos de reservas en la base de datos.
+
+Dos reservas son del mismo grupo si comparten oficina, espacio y fecha y una
+termina justo cuando empieza la otra. El agrupamiento es un problema de
+"gaps and islands": LAG() marca dónde empieza cada isla, una suma acumulada
+de esas marcas numera las islas y un GROUP BY devuelve una fila por grupo
+con sus IDs, inicio, fin y cantidad de bloques.
+"""
+from django.db import connection
+from django.db.models import ExpressionWrapper, IntegerField
+
+from .estadisticas import duracion_minutos
+from .historial import Historial
+from .models import Reserva
+
+# Orden en que se devuelven los grupos (y el del listado del panel)
+ORDEN = ('-fecha', 'espacio_id', 'oficina_id', 'hora_inicio', 'id')
+
+
+class ReservaAgrupada:
+    """Un grupo de bloques consecutivos, con la misma interfaz que usan las plantillas"""
+
+    __slots__ = (
+        'id', 'oficina', 'espacio', 'fecha', 'hora_inicio', 'hora_fin',
+        'fecha_creacion', 'nombre_visitante', 'placa_visitante', 'empresa_visitante', 'serie_id',
+        'reservas_ids', 'cantidad_bloques', 'ultimo_id', 'ultima_hora_inicio', '_duracion',
+    )
+
+    def __init__(self, isla, primera):
+        self.id = primera.id
+        self.oficina = primera.oficina
+        self.espacio = primera.espacio
+        self.fecha = isla['fecha']
+        self.hora_inicio = isla['hora_inicio']
+        self.hora_fin = isla['hora_fin']
+        self.fecha_creacion = primera.fecha_creacion
+        self.nombre_visitante = primera.nombre_visitante
+        self.placa_visitante = primera.placa_visitante
+        self.empresa_visitante = primera.empresa_visitante
+        self.serie_id = primera.serie_id
+        self.reservas_ids = isla['reservas_ids']
+        self.cantidad_bloques = isla['cantidad_bloques']
+        self.ultimo_id = isla['ultimo_id']
+        self.ultima_hora_inicio = isla['ultima_hora_inicio']
+        self._duracion = isla['horas']
+
+    @property
+    def es_agrupada(self):
+        return self.cantidad_bloques > 1
+
+    def duracion_horas(self):
+        return self._duracion
+
+    def __repr__(self):
+        return f'<ReservaAgrupada {self.espacio} {self.fecha} {self.hora_inicio}-{self.hora_fin} x{self.cantidad_bloques}>'
+
+
+def _agregado_ids():
+    if connection.vendor == 'postgresql':
+        return 'ARRAY_AGG(id ORDER BY hora_inicio)'
+    return 'GROUP_CONCAT(id)'
+
+
+def _lista_ids(valor):
+    if isinstance(valor, list):
+        return valor
+    return sorted(int(i) for i in str(valor).split(','))
+
+
+def _columnas(queryset):
+    return queryset.annotate(
+        horas=ExpressionWrapper(duracion_minutos() / 60, output_field=IntegerField())
+    ).values('id', 'oficina_id', 'espacio_id', 'fecha', 'hora_inicio', 'hora_fin', 'horas')
+
+
+def islas(fuente, orden=None, limite=None):
+    """
+    Agrupa en SQL las reservas de `fuente` (un queryset filtrado o un
+    historial.Historial) y devuelve una lista de dicts, uno por grupo, en el
+    ORDEN del módulo. Si se pasan, `orden` y `limite` eligen las filas que
+    se agrupan.
+    """
+    if isinstance(fuente, Historial):
+        base = fuente.union(_columnas)
+    else:
+        base = _columnas(fuente)
+    if orden:
+        base = base.order_by(*orden)
+    if limite:
+        base = base[:limite]
+    base_sql, parametros = base.query.sql_with_params()
+
+    ventana = 'PARTITION BY oficina_id, espacio_id, fecha ORDER BY hora_inicio, id'
+    sql = f"""
+        WITH base AS ({base_sql}),
+        marcadas AS (
+            SELECT base.*,
+                   CASE WHEN LAG(hora_fin) OVER ({ventana}) = hora_inicio THEN 0 ELSE 1 END AS nueva
+            FROM base
+        ),
+        numeradas AS (
+            SELECT marcadas.*,
+                   SUM(nueva) OVER ({ventana} ROWS UNBOUNDED PRECEDING) AS isla
+            FROM marcadas
+        )
+        SELECT MIN(CASE WHEN nueva = 1 THEN id END) AS primer_id,
+               MAX(id) AS ultimo_id,
+               oficina_id,
+               espacio_id,
+               fecha,
+               MIN(hora_inicio) AS hora_inicio,
+               MAX(hora_fin) AS hora_fin,
+               MAX(hora_inicio) AS ultima_hora_inicio,
+               COUNT(*) AS cantidad_bloques,
+               SUM(horas) AS horas,
+               {_agregado_ids()} AS reservas_ids
+        FROM numeradas
+        GROUP BY oficina_id, espacio_id, fecha, isla
+        ORDER BY fecha DESC, espacio_id, oficina_id, MIN(hora_inicio)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        columnas = [col[0] for col in cursor.description]
+        filas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+    # Convertir los tipos que SQLite devuelve como texto
+    campo_fecha = Reserva._meta.get_field('fecha')
+    campo_hora = Reserva._meta.get_field('hora_inicio')
+    for fila in filas:
+        fila['fecha'] = campo_fecha.to_python(fila['fecha'])
+        for campo in ('hora_inicio', 'hora_fin', 'ultima_hora_inicio'):
+            fila[campo] = campo_hora.to_python(fila[campo])
+        fila['reservas_ids'] = _lista_ids(fila['reservas_ids'])
+    return filas
+
+
+def agrupar(queryset):
+    """
+    Devuelve los grupos del queryset como ReservaAgrupada, con oficina y
+    espacio cargados. Son dos consultas sin importar la cantidad de grupos.
+    """
+    return materializar(islas(queryset), queryset)
+
+
+def materializar(grupos, fuente):
+    """
+    Convierte el resultado de islas() en ReservaAgrupada. `fuente` es la que
+    se agrupó: con un queryset es una consulta; con un Historial, una más si
+    hay grupos archivados.
+    """
+    if not grupos:
+        return []
+    ids = [grupo['primer_id'] for grupo in grupos]
+    if isinstance(fuente, Historial):
+        primeras = fuente.in_bulk(ids)
+    else:
+        primeras = fuente.model.objects.select_related('oficina', 'espacio').in_bulk(ids)
+    return [ReservaAgrupada(grupo, primeras[grupo['primer_id']]) for grupo in grupos]
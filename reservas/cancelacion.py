@@ -0,0 +1,103 @@
+"""
+Cancelación masiva de reservas con una sola sentencia.
+
+Las reservas se eligen por lista de IDs, por rango de fechas (de un espacio
+o de todos) o por serie, siempre dentro de una oficina. Un único
+DELETE ... RETURNING las borra y devuelve lo necesario para el mensaje al
+usuario y para actualizar la ocupación y los resúmenes en la misma
+transacción (PostgreSQL y SQLite >= 3.35 aceptan RETURNING).
+"""
+from django.db import connection, transaction
+
+from . import sincronizacion
+from .models import Espacio, Reserva, SerieReserva
+
+COLUMNAS = ('id', 'oficina_id', 'espacio_id', 'serie_id', 'fecha', 'hora_inicio', 'hora_fin')
+
+
+class CancelacionInvalida(ValueError):
+    """No se indicó qué reservas cancelar"""
+
+
+class Resumen:
+    """Lo que se canceló, para el mensaje de la vista"""
+
+    def __init__(self, reservas, espacios):
+        self.reservas = reservas
+        self.cantidad = len(reservas)
+        self.fechas = sorted({reserva.fecha for reserva in reservas})
+        self.espacios = sorted(set(espacios))
+
+    def __bool__(self):
+        return self.cantidad > 0
+
+    def descripcion(self):
+        """'Sala 1 - 03/03/2025' o 'Sala 1, Sala 2 - del 03/03/2025 al 10/03/2025'"""
+        if not self.cantidad:
+            return ''
+        espacios = ', '.join(self.espacios)
+        if len(self.fechas) == 1:
+            return f'{espacios} - {self.fechas[0]:%d/%m/%Y}'
+        return f'{espacios} - del {self.fechas[0]:%d/%m/%Y} al {self.fechas[-1]:%d/%m/%Y}'
+
+
+def seleccionar(oficina, ids=None, espacio=None, desde=None, hasta=None, serie=None):
+    """Queryset con las reservas de la oficina que cumplen los criterios"""
+    if not ids and desde is None and hasta is None and serie is None:
+        raise CancelacionInvalida('Indique las reservas, un rango de fechas o una serie')
+    reservas = Reserva.objects.filter(oficina=oficina)
+    if ids:
+        reservas = reservas.filter(id__in=ids)
+    if espacio is not None:
+        reservas = reservas.filter(espacio=espacio)
+    if desde is not None:
+        reservas = reservas.filter(fecha__gte=desde)
+    if hasta is not None:
+        reservas = reservas.filter(fecha__lte=hasta)
+    if serie is not None:
+        reservas = reservas.filter(serie=serie)
+    return reservas
+
+
+def _borrar(reservas):
+    """DELETE ... RETURNING sobre el queryset: devuelve (reservas borradas, nombres de espacios)"""
+    q = connection.ops.quote_name
+    tabla = q(Reserva._meta.db_table)
+    subconsulta, parametros = reservas.values('id').query.sql_with_params()
+    devueltas = ', '.join(f'{tabla}.{q(columna)}' for columna in COLUMNAS)
+    sql = f"""
+        DELETE FROM {tabla}
+        WHERE {q('id')} IN ({subconsulta})
+        RETURNING {devueltas},
+                  (SELECT {q('nombre')} FROM {q(Espacio._meta.db_table)}
+                   WHERE {q('id')} = {tabla}.{q('espacio_id')})
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        filas = cursor.fetchall()
+
+    # SQLite devuelve fechas y horas como texto
+    campos = [Reserva._meta.get_field(columna) for columna in COLUMNAS]
+    borradas = [
+        Reserva(**{campo.attname: campo.to_python(valor) for campo, valor in zip(campos, fila)})
+        for fila in filas
+    ]
+    return borradas, [fila[-1] for fila in filas]
+
+
+def cancelar(oficina, **criterios):
+    """
+    Borra las reservas que indiquen los criterios (ver seleccionar()) y
+    actualiza los datos derivados en la misma transacción. Las series que se
+    quedan sin reservas también se borran. Devuelve un Resumen.
+    """
+    reservas = seleccionar(oficina, **criterios)
+    with transaction.atomic():
+        borradas, espacios = _borrar(reservas)
+        if borradas:
+            # El DELETE crudo no dispara señales
+            sincronizacion.reservas_eliminadas(borradas)
+            series = {reserva.serie_id for reserva in borradas if reserva.serie_id}
+            if series:
+                SerieReserva.objects.filter(id__in=series, reservas__isnull=True).delete()
+    return Resumen(borradas, espacios)
@@ -0,0 +1,212 @@
+"""
+Motor de disponibilidad de espacios.
+
+Carga la ocupación de un espacio para una fecha en una sola consulta (la
+máscara de OcupacionDiaria o, si hace falta exactitud fuera de los slots,
+la lista ordenada de intervalos de sus reservas) y verifica todos los
+bloques solicitados de una vez.
+Lo usan tanto la vista previa AJAX como el registro de reservas, así ambos
+caminos nunca pueden dar respuestas distintas.
+"""
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+
+from . import horarios, ocupacion, restricciones, sincronizacion
+from .models import Reserva
+
+
+class ConflictoHorario(Exception):
+    """Un bloque solicitado se cruza con una reserva existente"""
+
+    def __init__(self, bloque):
+        self.bloque = bloque
+        super().__init__(f'Conflicto en horario {bloque}')
+
+
+class BloqueInvalido(ValueError):
+    """El bloque no tiene el formato HH:MM-HH:MM"""
+
+    def __init__(self, bloque):
+        self.bloque = bloque
+        super().__init__(f'Formato inválido: {bloque}')
+
+
+def parsear_bloque(bloque):
+    """Convierte '09:00-10:00' (o '9:00-10:00') en una tupla (inicio, fin) de time"""
+    try:
+        hora_inicio_str, hora_fin_str = bloque.split('-')
+        hora_inicio = datetime.strptime(hora_inicio_str, '%H:%M').time()
+        hora_fin = datetime.strptime(hora_fin_str, '%H:%M').time()
+    except ValueError:
+        raise BloqueInvalido(bloque)
+    return hora_inicio, hora_fin
+
+
+class AgendaDia:
+    """
+    Intervalos ocupados [inicio, fin) de un espacio en una fecha.
+
+    Los intervalos se mantienen ordenados por inicio junto con el máximo fin
+    acumulado, así cada consulta de cruce es una búsqueda binaria.
+    """
+
+    def __init__(self, intervalos=()):
+        self._reconstruir(sorted(intervalos))
+
+    @classmethod
+    def cargar(cls, espacio, fecha):
+        """Una sola consulta con todas las reservas del espacio en la fecha"""
+        intervalos = Reserva.objects.filter(
+            espacio=espacio,
+            fecha=fecha
+        ).values_list('hora_inicio', 'hora_fin')
+        return cls(intervalos)
+
+    @classmethod
+    async def acargar(cls, espacio, fecha):
+        """Versión async de cargar(), para las vistas servidas por ASGI"""
+        intervalos = Reserva.objects.filter(
+            espacio=espacio,
+            fecha=fecha
+        ).values_list('hora_inicio', 'hora_fin')
+        return cls([intervalo async for intervalo in intervalos])
+
+    def _reconstruir(self, intervalos):
+        self._inicios = []
+        self._fines = []
+        self._max_fin = []
+        for inicio, fin in intervalos:
+            self._agregar_al_final(inicio, fin)
+
+    def _agregar_al_final(self, inicio, fin):
+        self._inicios.append(inicio)
+        self._fines.append(fin)
+        self._max_fin.append(max(fin, self._max_fin[-1]) if self._max_fin else fin)
+
+    def ocupado(self, inicio, fin):
+        """True si [inicio, fin) se cruza con algún intervalo de la agenda"""
+        # Intervalos que empiezan antes de `fin`: índices [0, idx)
+        idx = bisect_left(self._inicios, fin)
+        return idx > 0 and self._max_fin[idx - 1] > inicio
+
+    def agregar(self, inicio, fin):
+        if not self._inicios or inicio >= self._inicios[-1]:
+            self._agregar_al_final(inicio, fin)
+            return
+        intervalos = list(zip(self._inicios, self._fines))
+        insort(intervalos, (inicio, fin))
+        self._reconstruir(intervalos)
+
+    def __len__(self):
+        return len(self._inicios)
+
+
+def parsear_bloques(bloques):
+    """
+    Parsea los bloques del formulario en una lista de (bloque, inicio, fin).
+    Los bloques sin '-' se ignoran como en el formulario original.
+    """
+    return [(bloque, *parsear_bloque(bloque)) for bloque in bloques if '-' in bloque]
+
+
+def cargar_agenda(espacio, fecha, intervalos):
+    """
+    Elige la fuente más barata que responda exacto para esos intervalos:
+    la máscara de OcupacionDiaria si todos están alineados a sus slots, o
+    las reservas del día en otro caso.
+    """
+    if all(ocupacion.alineado(inicio, fin) for inicio, fin in intervalos):
+        return ocupacion.MascaraDia.cargar(espacio, fecha)
+    return AgendaDia.cargar(espacio, fecha)
+
+
+async def acargar_agenda(espacio, fecha, intervalos):
+    if all(ocupacion.alineado(inicio, fin) for inicio, fin in intervalos):
+        return await ocupacion.MascaraDia.acargar(espacio, fecha)
+    return await AgendaDia.acargar(espacio, fecha)
+
+
+def validar_bloques(agenda, validos):
+    """
+    Verifica todos los bloques parseados contra la agenda y lanza
+    ConflictoHorario con el primero que choque.
+    """
+    for bloque, inicio, fin in validos:
+        if agenda.ocupado(inicio, fin):
+            raise ConflictoHorario(bloque)
+        # Un mismo formulario tampoco puede repetir o solapar sus bloques
+        agenda.agregar(inicio, fin)
+    return validos
+
+
+def reservar(oficina, espacio, fecha, bloques, nombre_visitante='',
+             placa_visitante='', empresa_visitante=''):
+    """
+    Crea todos los bloques de una reserva en una sola transacción.
+    Si cualquier bloque falla no se guarda ninguno.
+
+    La verificación previa evita el viaje a la base de datos en el caso
+    normal; si otra oficina reserva el mismo horario entre la lectura y la
+    escritura, la restricción de no solapamiento rechaza el INSERT y se
+    informa como ConflictoHorario.
+    """
+    validos = parsear_bloques(bloques)
+    try:
+        with transaction.atomic():
+            agenda = cargar_agenda(espacio, fecha, [(inicio, fin) for _, inicio, fin in validos])
+            validar_bloques(agenda, validos)
+            creadas = Reserva.objects.bulk_create([
+                Reserva(
+                    oficina=oficina,
+                    espacio=espacio,
+                    fecha=fecha,
+                    hora_inicio=inicio,
+                    hora_fin=fin,
+                    nombre_visitante=nombre_visitante,
+                    placa_visitante=placa_visitante,
+                    empresa_visitante=empresa_visitante
+                )
+                for _, inicio, fin in validos
+            ])
+            # bulk_create no dispara señales
+            sincronizacion.reservas_creadas(creadas)
+            return creadas
+    except IntegrityError as e:
+        if not restricciones.es_solapamiento(e):
+            raise
+        raise ConflictoHorario(_bloque_en_conflicto(espacio, fecha, validos))
+
+
+def _bloque_en_conflicto(espacio, fecha, validos):
+    """Tras perder una carrera, busca qué bloque fue el que chocó"""
+    agenda = AgendaDia.cargar(espacio, fecha)
+    for bloque, inicio, fin in validos:
+        if agenda.ocupado(inicio, fin):
+            return bloque
+    return validos[0][0]
+
+
+def horarios_con_disponibilidad(espacio, fecha):
+    """
+    Bloques {'inicio', 'fin', 'label', 'ocupado'} de la plantilla del espacio
+    (reservas/horarios.py) para esa fecha.
+    """
+    plantilla = horarios.para_espacio(espacio)
+    agenda = cargar_agenda(espacio, fecha, plantilla.intervalos)
+    return _marcar_ocupados(plantilla, agenda)
+
+
+async def ahorarios_con_disponibilidad(espacio, fecha):
+    """Versión async de horarios_con_disponibilidad()"""
+    plantilla = horarios.para_espacio(espacio)
+    agenda = await acargar_agenda(espacio, fecha, plantilla.intervalos)
+    return _marcar_ocupados(plantilla, agenda)
+
+
+def _marcar_ocupados(plantilla, agenda):
+    resultado = plantilla.horarios()
+    for horario, (inicio, fin) in zip(resultado, plantilla.intervalos):
+        horario['ocupado'] = agenda.ocupado(inicio, fin)
+    return resultado
@@ -0,0 +1,336 @@
+"""
+Resúmenes diarios para el panel de administración y el de cada oficina.
+
+Cada alta o baja de reservas suma o resta su aporte (reservas y minutos) en
+tres tablas: por espacio, por oficina y por hora de inicio. El panel lee
+solo estas tablas, así su costo no crece con el historial de reservas.
+
+Los indicadores de mis_reservas se guardan además en la cache bajo la
+versión de la oficina y la del ranking (ver versiones.py).
+"""
+from collections import Counter
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (
+    Case, CharField, Count, ExpressionWrapper, IntegerField, Q, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, ExtractHour, ExtractMinute
+
+from . import ranking, versiones
+from .historial import Historial
+from .models import ResumenDiarioEspacio, ResumenDiarioHora, ResumenDiarioOficina
+
+FRANJAS = [
+    ('Mañanas (8AM-12PM)', 8, 12),
+    ('Tardes (12PM-4PM)', 12, 16),
+    ('Tardes (4PM-8PM)', 16, 20),
+]
+FRANJA_OTRAS = 'Otras horas'
+HORAS_POR_DIA = 10
+# Respaldo por si una versión no llega a incrementarse; las claves viejas
+# expiran solas
+DURACION_CACHE = 60 * 60
+
+
+def minutos_reserva(reserva):
+    inicio = reserva.hora_inicio.hour * 60 + reserva.hora_inicio.minute
+    fin = reserva.hora_fin.hour * 60 + reserva.hora_fin.minute
+    return fin - inicio
+
+
+def duracion_minutos(prefijo=''):
+    """Expresión SQL con la duración en minutos de una reserva"""
+    def en_minutos(campo):
+        return ExtractHour(prefijo + campo) * 60 + ExtractMinute(prefijo + campo)
+    return ExpressionWrapper(
+        en_minutos('hora_fin') - en_minutos('hora_inicio'),
+        output_field=IntegerField(),
+    )
+
+
+def franja_de_hora_expr(campo):
+    """Expresión SQL Case/When que asigna la franja del panel a una hora 0-23"""
+    return Case(
+        *[When(**{f'{campo}__gte': desde, f'{campo}__lt': hasta}, then=Value(nombre))
+          for nombre, desde, hasta in FRANJAS],
+        default=Value(FRANJA_OTRAS),
+        output_field=CharField(),
+    )
+
+
+# ============================================
+# ACTUALIZACIÓN INCREMENTAL
+# ============================================
+
+def acumular(cambios):
+    """
+    Aplica una lista de (reserva, signo) a los resúmenes, con signo +1 para
+    altas y -1 para bajas. Una sola sentencia por tabla.
+    """
+    por_espacio = Counter()
+    por_oficina = Counter()
+    por_hora = Counter()
+    for reserva, signo in cambios:
+        minutos = minutos_reserva(reserva)
+        for contador, clave in (
+            (por_espacio, (reserva.espacio_id, reserva.fecha)),
+            (por_oficina, (reserva.oficina_id, reserva.fecha)),
+            (por_hora, (reserva.fecha, reserva.hora_inicio.hour)),
+        ):
+            contador[clave + ('reservas',)] += signo
+            contador[clave + ('minutos',)] += signo * minutos
+
+    _sumar(ResumenDiarioEspacio, ['espacio_id', 'fecha'], por_espacio)
+    _sumar(ResumenDiarioOficina, ['oficina_id', 'fecha'], por_oficina)
+    _sumar(ResumenDiarioHora, ['fecha', 'hora'], por_hora)
+
+
+def _sumar(modelo, columnas_clave, contador):
+    """
+    INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x
+
+    Suma los deltas en la base de datos en lugar de leer y reescribir, así dos
+    reservas simultáneas del mismo día no se pisan. PostgreSQL y SQLite
+    (>= 3.24) aceptan la misma sintaxis.
+    """
+    claves = sorted({clave[:-1] for clave in contador})
+    if not claves:
+        return
+    q = connection.ops.quote_name
+    tabla = q(modelo._meta.db_table)
+    columnas = columnas_clave + ['reservas', 'minutos']
+    filas = []
+    parametros = []
+    for clave in claves:
+        filas.append('(' + ', '.join(['%s'] * len(columnas)) + ')')
+        parametros.extend(
+            connection.ops.adapt_datefield_value(valor) if isinstance(valor, date) else valor
+            for valor in clave
+        )
+        parametros.append(contador[clave + ('reservas',)])
+        parametros.append(contador[clave + ('minutos',)])
+    sql = (
+        f"INSERT INTO {tabla} ({', '.join(q(c) for c in columnas)}) "
+        f"VALUES {', '.join(filas)} "
+        f"ON CONFLICT ({', '.join(q(c) for c in columnas_clave)}) DO UPDATE SET "
+        f"{q('reservas')} = {tabla}.{q('reservas')} + excluded.{q('reservas')}, "
+        f"{q('minutos')} = {tabla}.{q('minutos')} + excluded.{q('minutos')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+
+
+def reconstruir(batch_size=1000):
+    """
+    Regenera los tres resúmenes desde el historial completo (Reserva y
+    ReservaArchivada) con un GROUP BY por tabla. Un mismo día puede venir de
+    las dos tablas mientras se archiva: los aportes se suman con el mismo
+    upsert que usa acumular(). Devuelve la cantidad de filas de los resúmenes.
+    """
+    agrupaciones = [
+        (ResumenDiarioEspacio, ['espacio_id', 'fecha'], lambda reservas: reservas.values('espacio_id', 'fecha')),
+        (ResumenDiarioOficina, ['oficina_id', 'fecha'], lambda reservas: reservas.values('oficina_id', 'fecha')),
+        (ResumenDiarioHora, ['fecha', 'hora'],
+         lambda reservas: reservas.annotate(hora=ExtractHour('hora_inicio')).values('fecha', 'hora')),
+    ]
+
+    total = 0
+    for modelo, columnas_clave, agrupar in agrupaciones:
+        modelo.objects.all().delete()
+        filas = Historial().union(
+            lambda reservas: agrupar(reservas).annotate(reservas=Count('id'), minutos=Sum(duracion_minutos()))
+        ).iterator(chunk_size=batch_size)
+        contador = Counter()
+        for fila in filas:
+            clave = tuple(fila[columna] for columna in columnas_clave)
+            contador[clave + ('reservas',)] += fila['reservas']
+            contador[clave + ('minutos',)] += fila['minutos']
+            if len(contador) >= 2 * batch_size:
+                _sumar(modelo, columnas_clave, contador)
+                contador = Counter()
+        _sumar(modelo, columnas_clave, contador)
+        total += modelo.objects.count()
+    return total
+
+
+# ============================================
+# LECTURAS DEL PANEL
+# ============================================
+
+def _crecimiento(actual, anterior):
+    if anterior > 0:
+        return ((actual - anterior) / anterior) * 100
+    return 100 if actual > 0 else 0
+
+
+def panel_admin(hoy, espacios_activos):
+    """
+    Indicadores del panel de administración.
+
+    Todo se resuelve en la base de datos sobre los resúmenes diarios con una
+    cantidad fija de consultas: un aggregate condicional para los totales,
+    uno por franjas horarias, uno para el espacio favorito y uno para el top
+    de oficinas.
+    """
+    ayer = hoy - timedelta(days=1)
+    hace_una_semana = hoy - timedelta(days=7)
+    hace_dos_semanas = hoy - timedelta(days=14)
+    mes_actual = hoy.replace(day=1)
+    mes_anterior = (mes_actual - timedelta(days=1)).replace(day=1)
+
+    def suma(campo, **filtro):
+        return Coalesce(Sum(campo, filter=Q(**filtro) if filtro else None), 0)
+
+    totales = ResumenDiarioEspacio.objects.aggregate(
+        total_reservas=suma('reservas'),
+        mes_actual=suma('reservas', fecha__gte=mes_actual, fecha__lte=hoy),
+        mes_anterior=suma('reservas', fecha__gte=mes_anterior, fecha__lt=mes_actual),
+        hoy=suma('reservas', fecha=hoy),
+        ayer=suma('reservas', fecha=ayer),
+        minutos_semana=suma('minutos', fecha__gte=hace_una_semana, fecha__lte=hoy),
+        minutos_semana_anterior=suma('minutos', fecha__gte=hace_dos_semanas, fecha__lt=hace_una_semana),
+    )
+    total_reservas = totales['total_reservas']
+    reservas_mes_actual = totales['mes_actual']
+    reservas_mes_anterior = totales['mes_anterior']
+    reservas_hoy = totales['hoy']
+    reservas_ayer = totales['ayer']
+    horas_esta_semana = totales['minutos_semana'] // 60
+    horas_semana_anterior = totales['minutos_semana_anterior'] // 60
+
+    # Ocupación vs capacidad (HORAS_POR_DIA bloques por espacio activo)
+    dias_mes_actual = (hoy - mes_actual).days + 1
+    capacidad_mes_actual = espacios_activos * dias_mes_actual * HORAS_POR_DIA
+    ocupacion_actual = (reservas_mes_actual * 100) / capacidad_mes_actual if capacidad_mes_actual > 0 else 0
+
+    dias_mes_anterior = (mes_actual - mes_anterior).days
+    capacidad_mes_anterior = espacios_activos * dias_mes_anterior * HORAS_POR_DIA
+    ocupacion_anterior = (reservas_mes_anterior * 100) / capacidad_mes_anterior if capacidad_mes_anterior > 0 else 0
+
+    if ocupacion_anterior > 0:
+        cambio_ocupacion = ocupacion_actual - ocupacion_anterior
+    else:
+        cambio_ocupacion = ocupacion_actual
+
+    # Horario pico
+    horario_pico = ResumenDiarioHora.objects.annotate(
+        franja=franja_de_hora_expr('hora')
+    ).values('franja').annotate(
+        total=Sum('reservas')
+    ).filter(total__gt=0).order_by('-total').values_list('franja', 'total').first()
+    horario_pico = horario_pico or ('No definido', 0)
+
+    # Espacio favorito
+    espacio_favorito = ResumenDiarioEspacio.objects.values(
+        'espacio__nombre'
+    ).annotate(
+        total=Sum('reservas')
+    ).filter(total__gt=0).order_by('-total').first()
+
+    return {
+        'total_reservas': total_reservas,
+        'reservas_hoy': reservas_hoy,
+        'horas_totales': int(horas_esta_semana),
+        'ocupacion': round(ocupacion_actual, 1),
+        'crecimiento_mensual': round(_crecimiento(reservas_mes_actual, reservas_mes_anterior), 1),
+        'crecimiento_diario': round(_crecimiento(reservas_hoy, reservas_ayer), 1),
+        'crecimiento_semanal': round(_crecimiento(horas_esta_semana, horas_semana_anterior), 1),
+        'cambio_ocupacion': round(cambio_ocupacion, 1),
+        'horario_pico': horario_pico[0],
+        'porcentaje_pico': round((horario_pico[1] / total_reservas * 100), 0) if total_reservas > 0 else 0,
+        'espacio_favorito': espacio_favorito['espacio__nombre'] if espacio_favorito else 'No definido',
+        'porcentaje_favorito': round((espacio_favorito['total'] / total_reservas * 100), 0) if espacio_favorito and total_reservas > 0 else 0,
+        'oficinas_activas': top_oficinas(mes_actual, hoy),
+    }
+
+
+def top_oficinas(desde, hasta, limite=10):
+    """Oficinas con más reservas en el período (ranking.top), con sus horas y promedio"""
+    oficinas = ranking.top(desde, hasta, limite)
+    for oficina in oficinas:
+        horas_totales_oficina = oficina.minutos // 60
+        if oficina.total_reservas > 0:
+            oficina.promedio_horas = round(horas_totales_oficina / oficina.total_reservas, 1)
+        else:
+            oficina.promedio_horas = 0
+        oficina.horas_totales_mes = int(horas_totales_oficina)
+        oficina.porcentaje_barra = min((oficina.total_reservas / 20) * 100, 100) if oficina.total_reservas > 0 else 0
+    return oficinas
+
+
+# ============================================
+# PANEL DE LA OFICINA (mis_reservas)
+# ============================================
+
+def panel_oficina(oficina, hoy):
+    """
+    Indicadores de mis_reservas para una oficina.
+
+    Se leen de la cache con una sola lectura de versiones; solo cuando la
+    oficina tuvo cambios (o cambió el ranking del mes) se vuelven a calcular.
+    """
+    version_oficina, version_ranking = versiones.actuales(f'oficina:{oficina.pk}', 'ranking')
+
+    clave = f'reservas:panel_oficina:{oficina.pk}:{hoy.isoformat()}:{version_oficina}'
+    datos = cache.get(clave)
+    if datos is None:
+        datos = _calcular_panel_oficina(oficina.pk, hoy)
+        cache.set(clave, datos, DURACION_CACHE)
+
+    clave = f'reservas:ranking:{oficina.pk}:{hoy.isoformat()}:{version_ranking}'
+    posicion = cache.get(clave)
+    if posicion is None:
+        posicion = ranking.posicion(oficina.pk, hoy.replace(day=1), hoy) or (1, 1, 1)
+        cache.set(clave, posicion, DURACION_CACHE)
+
+    puesto, empatadas, total_oficinas = posicion
+    return {
+        **datos,
+        'mi_ranking': puesto,
+        'oficinas_empatadas': empatadas,
+        'total_oficinas': total_oficinas,
+    }
+
+
+def _calcular_panel_oficina(oficina_id, hoy):
+    primer_dia_mes = hoy.replace(day=1)
+    mes_anterior = (primer_dia_mes - timedelta(days=1)).replace(day=1)
+
+    def suma(campo, **filtro):
+        return Coalesce(Sum(campo, filter=Q(**filtro)), 0)
+
+    meses = ResumenDiarioOficina.objects.filter(oficina_id=oficina_id).aggregate(
+        reservas_mes=suma('reservas', fecha__gte=primer_dia_mes, fecha__lte=hoy),
+        minutos_mes=suma('minutos', fecha__gte=primer_dia_mes, fecha__lte=hoy),
+        minutos_mes_anterior=suma('minutos', fecha__gte=mes_anterior, fecha__lt=primer_dia_mes),
+    )
+    horas_este_mes = meses['minutos_mes'] / 60
+    horas_mes_anterior = meses['minutos_mes_anterior'] / 60
+    reservas_este_mes = meses['reservas_mes']
+
+    # Espacio favorito y distribución por tipo salen del mismo GROUP BY
+    # (una fila por espacio y tabla del historial)
+    filas = Historial().filter(oficina_id=oficina_id).union(
+        lambda reservas: reservas.values('espacio__nombre', 'espacio__tipo').annotate(cantidad=Count('id'))
+    )
+    por_espacio = Counter()
+    por_tipo = Counter()
+    for fila in filas:
+        por_espacio[fila['espacio__nombre'], fila['espacio__tipo']] += fila['cantidad']
+        por_tipo[fila['espacio__tipo']] += fila['cantidad']
+
+    return {
+        'horas_este_mes': int(horas_este_mes),
+        'reservas_este_mes': reservas_este_mes,
+        'espacio_favorito': por_espacio.most_common(1)[0][0][0] if por_espacio else 'Ninguno',
+        'promedio_horas': round(horas_este_mes / reservas_este_mes, 1) if reservas_este_mes > 0 else 0,
+        'crecimiento_porcentaje': round(_crecimiento(horas_este_mes, horas_mes_anterior), 1),
+        'tipos_espacios': [
+            {'espacio__tipo': tipo, 'cantidad': cantidad} for tipo, cantidad in por_tipo.most_common()
+        ],
+        'horas_mes_anterior': int(horas_mes_anterior),
+        'mejora_vs_anterior': horas_este_mes > horas_mes_anterior,
+    }
+
@@ -0,0 +1,186 @@
+"""
+Eventos en vivo de reservas para las páginas abiertas (Server-Sent Events).
+
+Al confirmarse una transacción con altas o bajas de reservas se publica:
+
+- en el tema 'dia:<espacio_id>:<fecha>', un evento 'reserva' o 'cancelacion'
+  con los bloques afectados, para nueva_reserva;
+- en el tema 'panel', un evento 'kpi' con la variación de reservas y minutos
+  por fecha, para el panel de administración.
+
+El canal de publicación/suscripción se elige con RESERVAS_CANAL_EVENTOS. El
+canal en memoria solo llega a los clientes conectados al mismo proceso; con
+varios workers se usa el de Redis.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import estadisticas
+
+logger = logging.getLogger(__name__)
+
+TEMA_PANEL = 'panel'
+# Eventos pendientes por cliente antes de empezar a descartar
+MAX_PENDIENTES = 100
+
+
+def tema_dia(espacio_id, fecha):
+    return f'dia:{espacio_id}:{fecha.isoformat()}'
+
+
+# ============================================
+# CANALES
+# ============================================
+
+class CanalLocal:
+    """Publicación/suscripción en memoria del proceso"""
+
+    def __init__(self):
+        self._suscripciones = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publicar(self, tema, evento):
+        with self._lock:
+            destinos = list(self._suscripciones.get(tema, ()))
+        for loop, cola in destinos:
+            try:
+                loop.call_soon_threadsafe(self._encolar, cola, evento)
+            except RuntimeError:
+                # El loop del cliente ya se cerró
+                pass
+
+    @staticmethod
+    def _encolar(cola, evento):
+        if cola.qsize() < MAX_PENDIENTES:
+            cola.put_nowait(evento)
+
+    async def escuchar(self, temas, espera):
+        """
+        Generador de eventos. Entrega None apenas queda suscrito y luego cada
+        `espera` segundos sin eventos.
+        """
+        suscripcion = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            for tema in temas:
+                self._suscripciones[tema].add(suscripcion)
+        try:
+            yield None
+            while True:
+                try:
+                    yield await asyncio.wait_for(suscripcion[1].get(), espera)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                for tema in temas:
+                    self._suscripciones[tema].discard(suscripcion)
+                    if not self._suscripciones[tema]:
+                        del self._suscripciones[tema]
+
+
+class CanalRedis:
+    """Publicación/suscripción de Redis, compartida entre procesos y servidores"""
+
+    PREFIJO = 'reservas:eventos'
+
+    def __init__(self, url=None):
+        import redis
+
+        self.url = url or os.environ['REDIS_URL']
+        self._cliente = redis.Redis.from_url(self.url)
+
+    def publicar(self, tema, evento):
+        self._cliente.publish(f'{self.PREFIJO}:{tema}', json.dumps(evento))
+
+    async def escuchar(self, temas, espera):
+        from redis import asyncio as aioredis
+
+        cliente = aioredis.Redis.from_url(self.url)
+        pubsub = cliente.pubsub()
+        await pubsub.subscribe(*[f'{self.PREFIJO}:{tema}' for tema in temas])
+        try:
+            yield None
+            while True:
+                mensaje = await pubsub.get_message(ignore_subscribe_messages=True, timeout=espera)
+                yield json.loads(mensaje['data']) if mensaje else None
+        finally:
+            await pubsub.aclose()
+            await cliente.aclose()
+
+
+_canal = None
+_canal_lock = threading.Lock()
+
+
+def canal():
+    global _canal
+    if _canal is None:
+        with _canal_lock:
+            if _canal is None:
+                ruta = getattr(settings, 'RESERVAS_CANAL_EVENTOS', 'reservas.eventos.CanalLocal')
+                _canal = import_string(ruta)()
+    return _canal
+
+
+def publicar(tema, evento):
+    """Publica sin interrumpir nunca a quien reserva si el canal falla"""
+    try:
+        canal().publicar(tema, evento)
+    except Exception:
+        logger.exception('No se pudo publicar el evento en %s', tema)
+
+
+def escuchar(temas, espera=15):
+    return canal().escuchar(temas, espera)
+
+
+# ============================================
+# EVENTOS DE RESERVAS
+# ============================================
+
+def reservas_cambiadas(cambios):
+    """
+    Arma los eventos de una lista de (reserva, signo) y los publica cuando se
+    confirme la transacción. Los datos se copian ahora porque las reservas
+    borradas ya no existen al confirmar.
+    """
+    bloques = defaultdict(list)
+    por_fecha = defaultdict(lambda: [0, 0])
+    for reserva, signo in cambios:
+        tipo = 'reserva' if signo > 0 else 'cancelacion'
+        bloques[(reserva.espacio_id, reserva.fecha, tipo)].append(
+            f'{reserva.hora_inicio:%H:%M}-{reserva.hora_fin:%H:%M}'
+        )
+        por_fecha[reserva.fecha][0] += signo
+        por_fecha[reserva.fecha][1] += signo * estadisticas.minutos_reserva(reserva)
+
+    mensajes = [
+        (tema_dia(espacio_id, fecha), {
+            'tipo': tipo,
+            'espacio_id': espacio_id,
+            'fecha': fecha.isoformat(),
+            'bloques': sorted(lista),
+        })
+        for (espacio_id, fecha, tipo), lista in bloques.items()
+    ]
+    mensajes.append((TEMA_PANEL, {
+        'tipo': 'kpi',
+        'cambios': [
+            {'fecha': fecha.isoformat(), 'reservas': reservas, 'minutos': minutos}
+            for fecha, (reservas, minutos) in sorted(por_fecha.items())
+        ],
+    }))
+
+    def enviar():
+        for tema, evento in mensajes:
+            publicar(tema, evento)
+
+    transaction.on_commit(enviar)
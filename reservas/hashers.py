@@ -0,0 +1,28 @@
+"""
+Hashers de contraseñas con el costo ajustable desde settings.
+
+Django vuelve a hashear una contraseña al iniciar sesión cuando su hash no
+es del hasher preferido o tiene otros parámetros (must_update), así que
+cambiar PASSWORD_HASHER o el costo migra a los usuarios a medida que entran,
+sin pedirles nada.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher,
+)
+
+
+class Argon2Ajustado(Argon2PasswordHasher):
+    """Argon2id; por defecto los parámetros mínimos que recomienda OWASP"""
+
+    time_cost = getattr(settings, 'PASSWORD_ARGON2_TIEMPO', 2)
+    memory_cost = getattr(settings, 'PASSWORD_ARGON2_MEMORIA_KB', 19456)
+    parallelism = getattr(settings, 'PASSWORD_ARGON2_PARALELISMO', 1)
+
+
+class ScryptAjustado(ScryptPasswordHasher):
+    work_factor = getattr(settings, 'PASSWORD_SCRYPT_FACTOR', 2 ** 14)
+
+
+class PBKDF2Ajustado(PBKDF2PasswordHasher):
+    iterations = getattr(settings, 'PASSWORD_PBKDF2_ITERACIONES', 600000)
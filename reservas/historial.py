@@ -0,0 +1,124 @@
+"""
+Ciclo de vida de las reservas.
+
+Reserva guarda lo reciente: todo lo que miran la disponibilidad, la
+ocupación y las reservas nuevas, siempre filtrado desde hoy o desde el mes
+en curso.
+- En PostgreSQL la tabla está particionada por mes de `fecha`
+  (reservas/particiones.py), así esas consultas solo leen las particiones
+  recientes aunque la tabla tenga años de historial.
+- En SQLite, `manage.py mantener_reservas` mueve a ReservaArchivada las
+  reservas anteriores al horizonte de RESERVAS_DIAS_EN_CALIENTE.
+
+El historial completo se lee con ``Historial``, que aplica los mismos
+filtros a las dos tablas y las junta con UNION ALL en cada consulta. No hay
+una vista en la base: las migraciones pueden alterar Reserva sin tocar nada
+más (SQLite no reconstruye una tabla que una vista usa y PostgreSQL no
+cambia el tipo de una columna que una vista lee).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Reserva, ReservaArchivada
+
+COLUMNAS = (
+    'id', 'oficina_id', 'espacio_id', 'serie_id', 'fecha', 'hora_inicio', 'hora_fin',
+    'fecha_creacion', 'nombre_visitante', 'placa_visitante', 'empresa_visitante',
+)
+TAM_LOTE = 5000
+
+
+# ============================================
+# LECTURA DEL HISTORIAL COMPLETO
+# ============================================
+
+class Historial:
+    """
+    Reserva y ReservaArchivada como una sola fuente de lectura. Tiene lo que
+    usan los listados: filter() sobre las dos tablas, union() para leer las
+    filas juntas e in_bulk() para cargar filas sueltas por id.
+    """
+    modelos = (Reserva, ReservaArchivada)
+
+    def __init__(self, querysets=None):
+        self.querysets = querysets or tuple(modelo.objects.all() for modelo in self.modelos)
+
+    def filter(self, *args, **kwargs):
+        return Historial(tuple(queryset.filter(*args, **kwargs) for queryset in self.querysets))
+
+    def union(self, columnas):
+        """
+        UNION ALL de `columnas(queryset)` en cada tabla; `columnas` devuelve
+        un queryset de values() o values_list() con los mismos campos. Se
+        puede ordenar y cortar, no filtrar.
+        """
+        primera, *resto = (columnas(queryset.order_by()) for queryset in self.querysets)
+        return primera.union(*resto, all=True)
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def in_bulk(self, ids):
+        """
+        {id: fila} con oficina y espacio cargados. Los ids no se repiten entre
+        tablas (las archivadas conservan el suyo); ReservaArchivada solo se
+        consulta si falta alguno en Reserva.
+        """
+        filas = {}
+        pendientes = list(ids)
+        for modelo in self.modelos:
+            if not pendientes:
+                break
+            filas.update(modelo.objects.select_related('oficina', 'espacio').in_bulk(pendientes))
+            pendientes = [pk for pk in pendientes if pk not in filas]
+        return filas
+
+
+# ============================================
+# ARCHIVO
+# ============================================
+
+def corte(hoy=None, dias=None):
+    """
+    Primera fecha que se queda en Reserva. Nunca es posterior al inicio del
+    mes en curso: mis_reservas lee el mes actual solo desde Reserva.
+    """
+    hoy = hoy or timezone.localdate()
+    if dias is None:
+        dias = settings.RESERVAS_DIAS_EN_CALIENTE
+    return min(hoy - timedelta(days=dias), hoy.replace(day=1))
+
+
+def archivar(hasta, tam_lote=TAM_LOTE, progreso=None):
+    """
+    Mueve a ReservaArchivada las reservas con fecha anterior a `hasta`, por
+    lotes, cada uno en su transacción. No es una cancelación: la ocupación y
+    los resúmenes no cambian y no se disparan señales. Devuelve el total.
+    """
+    q = connection.ops.quote_name
+    origen = q(Reserva._meta.db_table)
+    destino = q(ReservaArchivada._meta.db_table)
+    columnas = ', '.join(q(columna) for columna in COLUMNAS)
+    pendientes = Reserva.objects.filter(fecha__lt=hasta).order_by('id').values_list('id', flat=True)
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            # Los ids del lote se fijan antes: el INSERT y el DELETE ven las mismas filas
+            ids = list(pendientes[:tam_lote])
+            if not ids:
+                return total
+            marcadores = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {destino} ({columnas}) SELECT {columnas} FROM {origen} '
+                    f'WHERE {q("id")} IN ({marcadores})',
+                    ids,
+                )
+                cursor.execute(f'DELETE FROM {origen} WHERE {q("id")} IN ({marcadores})', ids)
+        total += len(ids)
+        if progreso:
+            progreso(total)
@@ -0,0 +1,155 @@
+"""
+Plantillas de horarios por espacio.
+
+Cada espacio ofrece una lista fija de bloques: la estándar de su tipo o, si
+tiene usar_horarios_personalizados, la de horarios_personalizados. La
+plantilla se compila una vez (inicio y fin en minutos, bloque canónico
+'HH:MM-HH:MM' y etiqueta) y queda en memoria por espacio hasta que el
+espacio se guarda o se borra (ver reservas/signals.py).
+
+horarios_personalizados acepta elementos {'inicio': '8:00', 'fin': '9:00',
+'label': opcional} o cadenas '08:00-09:00'.
+"""
+import json
+from datetime import time
+
+# Horas de apertura y cierre de los bloques de una hora de cada tipo.
+# El tipo se compara por inclusión como lo hacía generar_horarios_por_tipo.
+HORARIOS_POR_TIPO = [
+    ('directorio', 8, 19),
+    ('estacionamiento', 7, 22),
+    ('terraza', 15, 22),
+    ('comedor', 8, 11),
+]
+HORARIO_SALA = (8, 18)
+
+_plantillas = {}
+
+
+class HorarioInvalido(ValueError):
+    """Un elemento de horarios_personalizados no se puede interpretar"""
+
+
+def a_minutos(texto):
+    """'8:00' o '08:00' -> 480"""
+    try:
+        horas, minutos = texto.split(':')
+        horas, minutos = int(horas), int(minutos)
+    except (AttributeError, ValueError):
+        raise HorarioInvalido(f'Hora inválida: {texto!r}')
+    if not (0 <= horas < 24 and 0 <= minutos < 60):
+        raise HorarioInvalido(f'Hora inválida: {texto!r}')
+    return horas * 60 + minutos
+
+
+def formato_24h(minutos):
+    return f'{minutos // 60:02d}:{minutos % 60:02d}'
+
+
+def formato_12h(minutos):
+    horas = minutos // 60
+    sufijo = 'AM' if horas < 12 else 'PM'
+    return f'{(horas % 12) or 12}:{minutos % 60:02d} {sufijo}'
+
+
+class Plantilla:
+    """Bloques ofrecidos por un espacio, ordenados por inicio"""
+
+    __slots__ = ('inicios', 'fines', 'bloques', 'etiquetas', 'intervalos', '_indice')
+
+    def __init__(self, bloques):
+        bloques = sorted(bloques)
+        self.inicios = tuple(inicio for inicio, _, _ in bloques)
+        self.fines = tuple(fin for _, fin, _ in bloques)
+        self.bloques = tuple(f'{formato_24h(i)}-{formato_24h(f)}' for i, f in zip(self.inicios, self.fines))
+        self.etiquetas = tuple(
+            etiqueta or f'{formato_12h(inicio)} - {formato_12h(fin)}'
+            for inicio, fin, etiqueta in bloques
+        )
+        self.intervalos = tuple(
+            (time(i // 60, i % 60), time(f // 60, f % 60)) for i, f in zip(self.inicios, self.fines)
+        )
+        self._indice = frozenset(zip(self.inicios, self.fines))
+
+    def __len__(self):
+        return len(self.inicios)
+
+    def contiene(self, inicio, fin):
+        """True si [inicio, fin) (time) es uno de los bloques de la plantilla"""
+        return (inicio.hour * 60 + inicio.minute, fin.hour * 60 + fin.minute) in self._indice
+
+    def horarios(self):
+        """Lista nueva de {'inicio', 'fin', 'label'} para la respuesta JSON"""
+        return [
+            {'inicio': bloque[:5], 'fin': bloque[6:], 'label': etiqueta}
+            for bloque, etiqueta in zip(self.bloques, self.etiquetas)
+        ]
+
+
+def _bloques_por_tipo(tipo):
+    tipo = tipo.lower()
+    desde, hasta = next(
+        ((desde, hasta) for nombre, desde, hasta in HORARIOS_POR_TIPO if nombre in tipo),
+        HORARIO_SALA,
+    )
+    return [(hora * 60, (hora + 1) * 60, None) for hora in range(desde, hasta)]
+
+
+def _bloques_personalizados(horarios):
+    bloques = []
+    for horario in horarios:
+        if isinstance(horario, str):
+            inicio, _, fin = horario.partition('-')
+            etiqueta = None
+        elif isinstance(horario, dict):
+            inicio, fin = horario.get('inicio'), horario.get('fin')
+            etiqueta = horario.get('label')
+        else:
+            raise HorarioInvalido(f'Horario inválido: {horario!r}')
+        inicio, fin = a_minutos(inicio), a_minutos(fin)
+        if fin <= inicio:
+            raise HorarioInvalido(f'El horario {formato_24h(inicio)}-{formato_24h(fin)} termina antes de empezar')
+        bloques.append((inicio, fin, etiqueta))
+    return bloques
+
+
+def compilar(tipo, personalizados=None):
+    """
+    Compila la plantilla de un tipo de espacio, o la de `personalizados` si
+    se indica. Lanza HorarioInvalido con un horario mal formado.
+    """
+    if personalizados:
+        return Plantilla(_bloques_personalizados(personalizados))
+    return Plantilla(_bloques_por_tipo(tipo))
+
+
+def _firma(espacio):
+    if espacio.usar_horarios_personalizados and espacio.horarios_personalizados:
+        return espacio.tipo, json.dumps(espacio.horarios_personalizados, sort_keys=True)
+    return espacio.tipo, None
+
+
+def para_espacio(espacio):
+    """
+    Plantilla del espacio, compilada una sola vez.
+
+    La entrada guarda la configuración con que se compiló: si otro proceso
+    modificó el espacio, la instancia recién leída trae otra firma y la
+    plantilla se recompila aunque acá no haya llegado la señal.
+    """
+    firma = _firma(espacio)
+    guardada = _plantillas.get(espacio.pk)
+    if guardada is not None and guardada[0] == firma:
+        return guardada[1]
+    tipo, personalizados = firma
+    plantilla = compilar(tipo, espacio.horarios_personalizados if personalizados else None)
+    _plantillas[espacio.pk] = (firma, plantilla)
+    return plantilla
+
+
+def invalidar(espacio_id=None):
+    """Descarta la plantilla de un espacio, o todas sin argumento"""
+    if espacio_id is None:
+        _plantillas.clear()
+    else:
+        _plantillas.pop(espacio_id, None)
@@ -0,0 +1,320 @@
+"""
+Importación de usuarios y oficinas desde fixtures JSON (como usuarios.json).
+
+A diferencia de loaddata:
+- detecta la codificación (BOM de UTF-8/16/32 o UTF-16 sin BOM);
+- lee el archivo por bloques y decodifica un registro a la vez, así la
+  memoria no depende del tamaño del archivo;
+- actualiza o crea por lotes usando el username como clave (los pk del
+  archivo no se usan), manteniendo los hashes de contraseña tal cual;
+- reporta el progreso y los errores de cada registro sin cortar el resto.
+
+Se usa desde `manage.py importar_usuarios`; la vista importar_usuarios solo
+importa fixtures chicos dentro del request, de a uno por vez.
+"""
+import codecs
+import io
+import json
+import os
+
+from django.contrib.auth.hashers import identify_hasher
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import versiones
+from .models import Oficina
+
+TAM_BLOQUE = 64 * 1024
+# Un registro que no cierra en este tamaño es un JSON roto, no uno grande
+MAX_REGISTRO = 1024 * 1024
+MAX_ERRORES = 100
+# Entre registros: espacios, comas, corchetes del arreglo y un BOM suelto
+SEPARADORES = ' \t\r\n,[]\ufeff'
+# La vista importa dentro del request hasta este tamaño; los archivos más
+# grandes van por `manage.py importar_usuarios`
+MAX_BYTES_EN_REQUEST = 2 * 1024 * 1024
+CLAVE_EN_CURSO = 'reservas:importacion:en_curso'
+# Si el proceso muere a mitad, el bloqueo se libera solo
+DURACION_EN_CURSO = 10 * 60
+
+CAMPOS_USUARIO = (
+    'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser', 'password', 'last_login',
+)
+CAMPOS_OFICINA = ('numero', 'nombre_empresa')
+
+# El BOM de UTF-32 LE empieza como el de UTF-16 LE: va primero
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+class ImportacionInvalida(ValueError):
+    """El archivo no se puede seguir leyendo (JSON roto)"""
+
+
+class RegistroInvalido(ValueError):
+    """Un registro con datos inválidos: se informa y se sigue con el resto"""
+
+
+class ImportacionEnCurso(Exception):
+    """Ya hay otra importación corriendo"""
+
+
+class ArchivoDemasiadoGrande(ValueError):
+    """El archivo supera lo que se importa dentro de un request"""
+
+
+# ============================================
+# LECTURA
+# ============================================
+
+def detectar_codificacion(inicio):
+    """Codificación de un JSON a partir de sus primeros bytes"""
+    for bom, codificacion in BOMS:
+        if inicio.startswith(bom):
+            return codificacion
+    # Sin BOM: un JSON empieza con un carácter ASCII, así que los bytes nulos
+    # alrededor de él delatan UTF-16
+    if len(inicio) >= 2:
+        if inicio[0] and not inicio[1]:
+            return 'utf-16-le'
+        if not inicio[0] and inicio[1]:
+            return 'utf-16-be'
+    return 'utf-8'
+
+
+def abrir(ruta, codificacion=None):
+    """Archivo de texto con la codificación indicada o detectada"""
+    binario = open(ruta, 'rb')
+    if not codificacion:
+        codificacion = detectar_codificacion(binario.read(4))
+        binario.seek(0)
+    return io.TextIOWrapper(binario, encoding=codificacion, newline='')
+
+
+def leer_registros(flujo, tam_bloque=TAM_BLOQUE):
+    """
+    Genera los objetos de un arreglo JSON (o de un objeto por línea) leyendo
+    `flujo` por bloques. En memoria hay como mucho un registro y un bloque.
+    """
+    decodificador = json.JSONDecoder()
+    buffer, pos, agotado = '', 0, False
+    while True:
+        while pos < len(buffer) and buffer[pos] in SEPARADORES:
+            pos += 1
+        if pos == len(buffer):
+            if agotado:
+                return
+            buffer, pos = flujo.read(tam_bloque), 0
+            agotado = not buffer
+            continue
+        try:
+            registro, pos = decodificador.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            # Lo más probable es que el registro siga en el próximo bloque
+            if agotado or len(buffer) - pos > MAX_REGISTRO:
+                raise ImportacionInvalida(f'JSON inválido: {e}') from e
+            bloque = flujo.read(tam_bloque)
+            agotado = not bloque
+            buffer, pos = buffer[pos:] + bloque, 0
+            continue
+        yield registro
+
+
+# ============================================
+# IMPORTACIÓN
+# ============================================
+
+class Resultado:
+    def __init__(self):
+        self.procesados = 0
+        self.usuarios_creados = 0
+        self.usuarios_actualizados = 0
+        self.oficinas_creadas = 0
+        self.oficinas_actualizadas = 0
+        self.total_errores = 0
+        self.errores = []
+        self.terminado = False
+        self.error_fatal = None
+
+    def error(self, numero, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({'registro': numero, 'error': mensaje})
+
+
+def _datos_usuario(fields):
+    username = (fields.get('username') or '').strip()
+    if not username:
+        raise RegistroInvalido('Falta el username')
+    datos = {campo: fields[campo] for campo in CAMPOS_USUARIO if campo in fields}
+    if datos.get('password'):
+        try:
+            identify_hasher(datos['password'])
+        except ValueError:
+            raise RegistroInvalido('La contraseña no es un hash reconocido')
+    else:
+        # Sin contraseña en el archivo se conserva la actual
+        datos.pop('password', None)
+    for campo in ('last_login', 'date_joined'):
+        if fields.get(campo):
+            fecha = parse_datetime(fields[campo])
+            if fecha is None:
+                raise RegistroInvalido(f'Fecha inválida en {campo}')
+            datos[campo] = fecha
+    try:
+        User(username=username, **datos).clean_fields(exclude={'password', 'last_login', 'date_joined'})
+    except ValidationError as e:
+        raise RegistroInvalido('; '.join(f'{campo}: {" ".join(m)}' for campo, m in e.message_dict.items()))
+    return username, datos
+
+
+def _username_de_oficina(valor, usernames_por_pk):
+    # Clave natural [username] o pk del usuario dentro del mismo archivo
+    if isinstance(valor, list) and valor:
+        return valor[0]
+    if valor in usernames_por_pk:
+        return usernames_por_pk[valor]
+    raise RegistroInvalido(f'El usuario {valor!r} de la oficina no está en el archivo')
+
+
+def importar(registros, batch_size=500, progreso=None):
+    """
+    Importa los registros 'auth.user' y 'reservas.oficina' de un fixture.
+    Cada lote se guarda en su propia transacción. `progreso(resultado)` se
+    llama después de cada lote. Devuelve un Resultado.
+    """
+    resultado = Resultado()
+    usuarios = {}      # username -> (número de registro, datos)
+    oficinas = {}      # username -> (número de registro, datos)
+    usernames_por_pk = {}
+
+    def guardar():
+        for pendientes, guardar_lote in ((usuarios, _guardar_usuarios), (oficinas, _guardar_oficinas)):
+            if not pendientes:
+                continue
+            try:
+                guardar_lote(pendientes, resultado)
+            except DatabaseError as e:
+                for numero, _ in pendientes.values():
+                    resultado.error(numero, f'No se pudo guardar: {e}')
+            pendientes.clear()
+        if progreso:
+            progreso(resultado)
+
+    try:
+        for numero, registro in enumerate(registros, start=1):
+            resultado.procesados = numero
+            try:
+                if not isinstance(registro, dict):
+                    raise RegistroInvalido('El registro no es un objeto')
+                modelo = str(registro.get('model', '')).lower()
+                fields = registro.get('fields') or {}
+                if modelo == 'auth.user':
+                    username, datos = _datos_usuario(fields)
+                    if 'pk' in registro:
+                        usernames_por_pk[registro['pk']] = username
+                    usuarios[username] = (numero, datos)
+                elif modelo == 'reservas.oficina':
+                    username = _username_de_oficina(fields.get('user'), usernames_por_pk)
+                    oficinas[username] = (numero, {c: fields[c] for c in CAMPOS_OFICINA if c in fields})
+                else:
+                    raise RegistroInvalido(f'Modelo no soportado: {modelo or "(sin model)"}')
+            except RegistroInvalido as e:
+                resultado.error(numero, str(e))
+            if len(usuarios) + len(oficinas) >= batch_size:
+                guardar()
+        guardar()
+    except ImportacionInvalida as e:
+        resultado.error_fatal = str(e)
+        guardar()
+    resultado.terminado = True
+    return resultado
+
+
+def _guardar_usuarios(pendientes, resultado):
+    existentes = User.objects.in_bulk(list(pendientes), field_name='username')
+    nuevos, cambiados = [], []
+    for username, (_, datos) in pendientes.items():
+        usuario = existentes.get(username)
+        if usuario is None:
+            usuario = User(username=username, **datos)
+            if 'password' not in datos:
+                usuario.set_unusable_password()
+            nuevos.append(usuario)
+        else:
+            datos = {campo: valor for campo, valor in datos.items() if campo != 'date_joined'}
+            for campo, valor in datos.items():
+                setattr(usuario, campo, valor)
+            cambiados.append(usuario)
+    with transaction.atomic():
+        User.objects.bulk_create(nuevos)
+        if cambiados:
+            User.objects.bulk_update(cambiados, CAMPOS_USUARIO)
+    resultado.usuarios_creados += len(nuevos)
+    resultado.usuarios_actualizados += len(cambiados)
+
+
+def _guardar_oficinas(pendientes, resultado):
+    ids = dict(User.objects.filter(username__in=list(pendientes)).values_list('username', 'id'))
+    existentes = {o.user_id: o for o in Oficina.objects.filter(user_id__in=ids.values())}
+    nuevas, cambiadas = [], []
+    for username, (numero, datos) in pendientes.items():
+        if username not in ids:
+            resultado.error(numero, f'El usuario {username} de la oficina no existe')
+            continue
+        oficina = existentes.get(ids[username])
+        if oficina is None:
+            if not datos.get('numero'):
+                resultado.error(numero, 'Falta el número de la oficina')
+                continue
+            nuevas.append(Oficina(user_id=ids[username], **datos))
+        else:
+            for campo, valor in datos.items():
+                setattr(oficina, campo, valor)
+            cambiadas.append(oficina)
+    with transaction.atomic():
+        Oficina.objects.bulk_create(nuevas)
+        if nuevas:
+            # bulk_create no dispara post_save: el total de oficinas del ranking cambió
+            versiones.incrementar('ranking')
+        if cambiadas:
+            Oficina.objects.bulk_update(cambiadas, CAMPOS_OFICINA)
+    resultado.oficinas_creadas += len(nuevas)
+    resultado.oficinas_actualizadas += len(cambiadas)
+
+
+def importar_archivo(ruta, codificacion=None, batch_size=500, progreso=None):
+    with abrir(ruta, codificacion) as flujo:
+        return importar(leer_registros(flujo), batch_size=batch_size, progreso=progreso)
+
+
+# ============================================
+# DESDE LA VISTA
+# ============================================
+
+def importar_en_request(ruta, batch_size=500):
+    """
+    Importa `ruta` dentro del request. Solo corre una importación a la vez
+    (bloqueo en la cache compartida) y solo con archivos de hasta
+    MAX_BYTES_EN_REQUEST: los más grandes se importan con el comando.
+    Lanza ImportacionEnCurso o ArchivoDemasiadoGrande.
+    """
+    if os.path.getsize(ruta) > MAX_BYTES_EN_REQUEST:
+        raise ArchivoDemasiadoGrande(
+            f'{ruta} es demasiado grande para importarlo desde la web: '
+            f'use python manage.py importar_usuarios {ruta}'
+        )
+    if not cache.add(CLAVE_EN_CURSO, str(ruta), DURACION_EN_CURSO):
+        raise ImportacionEnCurso(f'Ya hay una importación en curso ({cache.get(CLAVE_EN_CURSO)})')
+    try:
+        return importar_archivo(ruta, batch_size=batch_size)
+    finally:
+        cache.delete(CLAVE_EN_CURSO)
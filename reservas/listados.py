@@ -0,0 +1,165 @@
+"""
+Listado paginado de reservas agrupadas para la tabla del panel de administración.
+
+La paginación es por cursor (keyset): cada página continúa desde la última
+reserva entregada, sin OFFSET, así el costo de una página es el mismo sin
+importar cuánto historial haya. Los bloques consecutivos de una misma
+oficina y espacio se entregan como un solo grupo (ver reservas/agrupacion.py)
+y nunca se cortan entre páginas.
+"""
+import base64
+import json
+from datetime import date, time, timedelta
+
+from django.db.models import Q
+from django.utils import dateformat, timezone
+
+from . import agrupacion
+from .models import Espacio
+
+ORDEN = agrupacion.ORDEN
+LIMITE_POR_DEFECTO = 25
+LIMITE_MAXIMO = 100
+TIPOS_DISPLAY = dict(Espacio.TIPOS)
+
+
+# ============================================
+# CURSOR
+# ============================================
+
+def codificar_cursor(grupo):
+    """El cursor apunta al último bloque del grupo (dict de agrupacion.islas)"""
+    clave = [grupo['fecha'].isoformat(), grupo['espacio_id'], grupo['oficina_id'],
+             grupo['ultima_hora_inicio'].isoformat(), grupo['ultimo_id']]
+    return base64.urlsafe_b64encode(json.dumps(clave).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Lanza ValueError si el cursor no es válido"""
+    try:
+        fecha, espacio_id, oficina_id, hora_inicio, reserva_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return (date.fromisoformat(fecha), int(espacio_id), int(oficina_id),
+                time.fromisoformat(hora_inicio), int(reserva_id))
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError('Cursor inválido') from e
+
+
+def _despues_de(clave):
+    """Filas que van después de `clave` en el ORDEN (fecha descendente, resto ascendente)"""
+    fecha, espacio_id, oficina_id, hora_inicio, reserva_id = clave
+    misma_fecha = Q(fecha=fecha)
+    mismo_espacio = misma_fecha & Q(espacio_id=espacio_id)
+    misma_oficina = mismo_espacio & Q(oficina_id=oficina_id)
+    return (
+        Q(fecha__lt=fecha)
+        | (misma_fecha & Q(espacio_id__gt=espacio_id))
+        | (mismo_espacio & Q(oficina_id__gt=oficina_id))
+        | (misma_oficina & Q(hora_inicio__gt=hora_inicio))
+        | (misma_oficina & Q(hora_inicio=hora_inicio, id__gt=reserva_id))
+    )
+
+
+# ============================================
+# FILTROS
+# ============================================
+
+def filtrar(queryset, params, ahora=None):
+    """
+    Aplica los filtros de la tabla: periodo (today, upcoming, week, all),
+    fecha exacta, rango desde/hasta, tipo de espacio, oficina (número) y q
+    (búsqueda de texto). Lanza ValueError con fechas mal formadas.
+    """
+    ahora = ahora or timezone.localtime()
+    hoy = ahora.date()
+
+    periodo = params.get('periodo', 'all')
+    if periodo == 'today':
+        queryset = queryset.filter(fecha=hoy)
+    elif periodo == 'upcoming':
+        # Incluye las de hoy que todavía no terminan
+        queryset = queryset.filter(Q(fecha__gt=hoy) | Q(fecha=hoy, hora_fin__gt=ahora.time()))
+    elif periodo == 'week':
+        queryset = queryset.filter(fecha__gte=hoy, fecha__lte=hoy + timedelta(days=7))
+
+    if params.get('fecha'):
+        queryset = queryset.filter(fecha=date.fromisoformat(params['fecha']))
+    if params.get('desde'):
+        queryset = queryset.filter(fecha__gte=date.fromisoformat(params['desde']))
+    if params.get('hasta'):
+        queryset = queryset.filter(fecha__lte=date.fromisoformat(params['hasta']))
+    if params.get('tipo') and params['tipo'] != 'all':
+        queryset = queryset.filter(espacio__tipo=params['tipo'])
+    if params.get('oficina'):
+        queryset = queryset.filter(oficina__numero=params['oficina'])
+
+    texto = params.get('q', '').strip()
+    if texto:
+        queryset = queryset.filter(
+            Q(oficina__numero__icontains=texto)
+            | Q(oficina__nombre_empresa__icontains=texto)
+            | Q(espacio__nombre__icontains=texto)
+            | Q(nombre_visitante__icontains=texto)
+            | Q(placa_visitante__icontains=texto)
+        )
+    return queryset
+
+
+# ============================================
+# PÁGINAS
+# ============================================
+
+def pagina_agrupada(queryset, cursor=None, limite=LIMITE_POR_DEFECTO):
+    """
+    Devuelve (grupos, siguiente_cursor). Cada grupo es una
+    agrupacion.ReservaAgrupada. `siguiente_cursor` es None en la última página.
+    `queryset` puede ser también un historial.Historial.
+
+    Se agrupa en SQL un lote de filas desde el cursor; si el lote se llenó,
+    su último grupo puede estar incompleto y se descarta para la página
+    siguiente.
+    """
+    filas = queryset
+    if cursor:
+        filas = filas.filter(_despues_de(decodificar_cursor(cursor)))
+    tam_lote = limite * 4 + 1
+
+    while True:
+        grupos = agrupacion.islas(filas, orden=ORDEN, limite=tam_lote)
+        lote_lleno = sum(g['cantidad_bloques'] for g in grupos) == tam_lote
+        if lote_lleno:
+            grupos.pop()
+        if len(grupos) > limite or (lote_lleno and len(grupos) == limite):
+            grupos = grupos[:limite]
+            return agrupacion.materializar(grupos, queryset), codificar_cursor(grupos[-1])
+        if not lote_lleno:
+            return agrupacion.materializar(grupos, queryset), None
+        # Grupos más largos que lo estimado: se relee con un lote mayor
+        tam_lote *= 2
+
+
+def serializar_grupo(grupo):
+    creada = timezone.localtime(grupo.fecha_creacion)
+    tipo = grupo.espacio.tipo
+    return {
+        'id': grupo.id,
+        'reservas_ids': grupo.reservas_ids,
+        'cantidad_bloques': grupo.cantidad_bloques,
+        'oficina': grupo.oficina.numero,
+        'empresa': grupo.oficina.nombre_empresa,
+        'espacio': grupo.espacio.nombre,
+        'tipo': tipo,
+        'tipo_display': TIPOS_DISPLAY.get(tipo, tipo),
+        'fecha': grupo.fecha.isoformat(),
+        'fecha_display': dateformat.format(grupo.fecha, 'd M Y'),
+        'hora_inicio': grupo.hora_inicio.strftime('%H:%M'),
+        'hora_fin': grupo.hora_fin.strftime('%H:%M'),
+        'horario_display': f"{dateformat.time_format(grupo.hora_inicio, 'g:i A')} - "
+                           f"{dateformat.time_format(grupo.hora_fin, 'g:i A')}",
+        'duracion_horas': grupo.duracion_horas(),
+        'nombre_visitante': grupo.nombre_visitante,
+        'placa_visitante': grupo.placa_visitante,
+        'empresa_visitante': grupo.empresa_visitante,
+        'creada_dia': dateformat.format(creada, 'd/m'),
+        'creada_fecha': dateformat.format(creada, 'd/m/Y'),
+        'creada_hora': dateformat.time_format(creada, 'g:i A'),
+    }
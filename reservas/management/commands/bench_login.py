@@ -0,0 +1,110 @@
+"""
+Benchmark de inicio de sesión y del costo de la sesión por request.
+
+Compara dos configuraciones en una base de datos de test descartable:
+
+- antes: PBKDF2 de Django (1.000.000 iteraciones) y sesiones en la base;
+- despues: la política de settings (PASSWORD_HASHER) y SESSION_ENGINE.
+
+Los usuarios empiezan con un hash PBKDF2 como los del fixture, así el primer
+login del escenario "despues" incluye el re-hash al hasher preferido.
+
+    python manage.py bench_login --usuarios 20
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from reservas.management.medicion import base_de_datos_descartable, percentil
+
+CLAVE = 'clave-bench-123'
+
+ESCENARIOS = {
+    'antes': {
+        'PASSWORD_HASHERS': ['django.contrib.auth.hashers.PBKDF2PasswordHasher'],
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    },
+    'despues': {},
+}
+
+
+class Command(BaseCommand):
+    help = 'Mide logins por segundo y consultas de sesión por request, antes y después de la política de hashing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests autenticados por escenario')
+
+    def handle(self, *args, **options):
+        with base_de_datos_descartable():
+            for nombre, ajustes in ESCENARIOS.items():
+                with override_settings(**ajustes):
+                    self._escenario(nombre, options)
+
+    def _escenario(self, nombre, options):
+        # Mismo hash heredado para todos: calcularlo una vez por usuario
+        # haría que preparar el escenario tarde más que medirlo
+        heredado = make_password(CLAVE, hasher='pbkdf2_sha256')
+        User.objects.filter(username__startswith='bench').delete()
+        usuarios = User.objects.bulk_create(
+            User(username=f'bench{i}', password=heredado) for i in range(options['usuarios'])
+        )
+        cache.clear()
+
+        primeros = [self._login(usuario) for usuario in usuarios]
+        siguientes = [self._login(usuario) for usuario in usuarios]
+        algoritmos = sorted({
+            hash_.split('$', 1)[0]
+            for hash_ in User.objects.filter(username__startswith='bench').values_list('password', flat=True)
+        })
+
+        # Recargado: el re-hash cambió la contraseña y con ella el hash de sesión
+        cliente = Client()
+        cliente.force_login(User.objects.get(pk=usuarios[0].pk))
+        tiempos, consultas, de_sesion = [], 0, 0
+        url = reverse('dashboard')
+        for _ in range(options['requests']):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            if 'next=' in respuesta.url:
+                raise RuntimeError('La sesión del benchmark se cerró')
+            consultas += len(capturadas)
+            de_sesion += sum('django_session' in q['sql'] for q in capturadas)
+
+        n = options['requests']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{nombre}: {settings.PASSWORD_HASHERS[0].rsplit(".", 1)[-1]}, {settings.SESSION_ENGINE.rsplit(".", 1)[-1]}'
+        ))
+        self.stdout.write(
+            f'  primer login      p50 {percentil(primeros, 50):8.1f} ms  '
+            f'{len(primeros) / (sum(primeros) / 1000):6.1f} logins/s'
+        )
+        self.stdout.write(
+            f'  logins siguientes p50 {percentil(siguientes, 50):8.1f} ms  '
+            f'{len(siguientes) / (sum(siguientes) / 1000):6.1f} logins/s'
+        )
+        self.stdout.write(f'  hashes guardados: {", ".join(algoritmos)}')
+        self.stdout.write(
+            f'  request autenticado p50 {percentil(tiempos, 50):.2f} ms · '
+            f'{consultas / n:.2f} consultas/request · {de_sesion / n:.2f} a django_session'
+        )
+
+    def _login(self, usuario):
+        cliente = Client()
+        inicio = time.perf_counter()
+        respuesta = cliente.post(reverse('login'), {'username': usuario.username, 'password': CLAVE})
+        transcurrido = (time.perf_counter() - inicio) * 1000
+        if respuesta.status_code != 302:
+            raise RuntimeError(f'Falló el login de {usuario.username}')
+        return transcurrido
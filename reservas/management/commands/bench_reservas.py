@@ -0,0 +1,240 @@
+"""
+Benchmark de punta a punta de las vistas de reservas.
+
+Genera datos sintéticos (reservas/semilla.py) en una base de datos de test
+descartable y recorre cada vista con el cliente de test de Django, midiendo
+latencia (p50/p95/p99), consultas SQL por request y pico de memoria.
+
+    python manage.py bench_reservas --reservas 20000 --salida bench.json
+    python manage.py bench_reservas --base bench.json --umbral 0.2
+
+Con --base compara contra una corrida guardada y termina con error si alguna
+vista empeora más que el umbral.
+"""
+import json
+import platform
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from reservas import semilla
+from reservas.management.medicion import base_de_datos_descartable, percentil
+from reservas.models import Reserva
+
+# Diferencias de latencia por debajo de esto son ruido aunque superen el umbral
+HOLGURA_MS = 1.0
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia, consultas y memoria de las vistas de reservas y compara con una base'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--oficinas', type=int, default=20)
+        parser.add_argument('--espacios', type=int, default=10)
+        parser.add_argument('--reservas', type=int, default=2000)
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--repeticiones', type=int, default=30)
+        parser.add_argument('--calentamiento', type=int, default=2)
+        parser.add_argument('--vistas', help='Nombres separados por coma (por defecto todas)')
+        parser.add_argument('--cache-caliente', action='store_true',
+                            help='No vaciar la cache antes de cada request')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--base', help='Archivo JSON de una corrida anterior para comparar')
+        parser.add_argument('--umbral', type=float, default=0.25,
+                            help='Empeoramiento relativo tolerado (0.25 = 25%%)')
+        parser.add_argument('--bd-actual', action='store_true',
+                            help='Usar la base configurada dentro de una transacción que se revierte')
+
+    def handle(self, *args, **options):
+        if options['bd_actual']:
+            with transaction.atomic():
+                resultados = self._correr(options)
+                transaction.set_rollback(True)
+        else:
+            with base_de_datos_descartable():
+                resultados = self._correr(options)
+
+        self._mostrar(resultados)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+        if options['base']:
+            with open(options['base'], encoding='utf-8') as archivo:
+                base = json.load(archivo)
+            regresiones = comparar(base, resultados, options['umbral'])
+            if regresiones:
+                raise CommandError('Regresiones respecto a la base:\n' + '\n'.join(regresiones))
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto a la base'))
+
+    def _correr(self, options):
+        hoy = date.today()
+        cache.clear()
+        inicio = time.perf_counter()
+        oficinas, espacios, creadas, desde = semilla.poblar(
+            oficinas=options['oficinas'], espacios=options['espacios'],
+            reservas=options['reservas'], semilla=options['semilla'], hoy=hoy,
+        )
+        self.stdout.write(f'Datos generados: {creadas} reservas en {time.perf_counter() - inicio:.1f} s')
+
+        escenarios = _escenarios(oficinas, espacios, hoy)
+        if options['vistas']:
+            pedidas = options['vistas'].split(',')
+            desconocidas = set(pedidas) - set(escenarios)
+            if desconocidas:
+                raise CommandError(f"Vistas desconocidas: {', '.join(sorted(desconocidas))}")
+            escenarios = {nombre: escenarios[nombre] for nombre in pedidas}
+
+        return {
+            'meta': {
+                'fecha': hoy.isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'base_de_datos': connection.vendor,
+                'oficinas': options['oficinas'],
+                'espacios': options['espacios'],
+                'reservas': creadas,
+                'desde': desde.isoformat(),
+                'semilla': options['semilla'],
+                'repeticiones': options['repeticiones'],
+                'cache_caliente': options['cache_caliente'],
+            },
+            'vistas': {
+                nombre: self._medir(escenario, options)
+                for nombre, escenario in escenarios.items()
+            },
+        }
+
+    def _medir(self, escenario, options):
+        pedir, esperado = escenario
+
+        def una(iteracion):
+            if not options['cache_caliente']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                response = pedir(iteracion)
+                ms = (time.perf_counter() - inicio) * 1000
+            if response.status_code != esperado:
+                raise CommandError(f'{response.status_code} en lugar de {esperado}: {response.content[:200]!r}')
+            return ms, len(consultas)
+
+        iteracion = 0
+        for _ in range(options['calentamiento']):
+            una(iteracion)
+            iteracion += 1
+
+        tiempos, consultas = [], []
+        for _ in range(options['repeticiones']):
+            ms, cantidad = una(iteracion)
+            tiempos.append(ms)
+            consultas.append(cantidad)
+            iteracion += 1
+
+        # La memoria se mide aparte: tracemalloc hace más lento cada request
+        tracemalloc.start()
+        try:
+            una(iteracion)
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': round(percentil(tiempos, 50), 3),
+            'p95_ms': round(percentil(tiempos, 95), 3),
+            'p99_ms': round(percentil(tiempos, 99), 3),
+            'consultas': max(consultas),
+            'memoria_pico_kb': round(pico / 1024, 1),
+        }
+
+    def _mostrar(self, resultados):
+        meta = resultados['meta']
+        self.stdout.write(
+            f"{meta['reservas']} reservas · {meta['oficinas']} oficinas · {meta['espacios']} espacios · "
+            f"{meta['repeticiones']} repeticiones · {meta['base_de_datos']}"
+        )
+        self.stdout.write(
+            f"{'vista':<28}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'consultas':>11}{'memoria KB':>12}"
+        )
+        for nombre, medida in resultados['vistas'].items():
+            self.stdout.write(
+                f"{nombre:<28}{medida['p50_ms']:>9.2f}{medida['p95_ms']:>9.2f}{medida['p99_ms']:>9.2f}"
+                f"{medida['consultas']:>11}{medida['memoria_pico_kb']:>12.1f}"
+            )
+
+
+def _escenarios(oficinas, espacios, hoy):
+    """{nombre: (pedir(iteracion) -> response, status esperado)}"""
+    admin = User.objects.create_superuser('bench-admin', password=semilla.CLAVE)
+    cliente_admin = Client()
+    cliente_admin.force_login(admin)
+
+    # La oficina con más reservas es el peor caso de mis_reservas
+    oficina = max(oficinas, key=lambda o: Reserva.objects.filter(oficina=o).count())
+    cliente = Client()
+    cliente.force_login(oficina.user)
+
+    sala = next((e for e in espacios if e.tipo == 'sala'), espacios[0])
+    fecha = hoy.isoformat()
+    ids = ','.join(str(e.pk) for e in espacios)
+    # Cada POST reserva un día distinto y lejano para no chocar con nada
+    lejano = hoy + timedelta(days=3650)
+
+    def get(cliente, nombre, parametros=None):
+        url = reverse(nombre)
+        return lambda iteracion: cliente.get(url, parametros)
+
+    def post_reserva(iteracion):
+        return cliente.post(reverse('nueva_reserva'), {
+            'espacio': sala.pk,
+            'fecha': (lejano + timedelta(days=iteracion)).isoformat(),
+            'bloques_horarios': ['09:00-10:00'],
+        })
+
+    return {
+        'admin_dashboard': (get(cliente_admin, 'admin_dashboard'), 200),
+        'reservas_recientes': (get(cliente_admin, 'reservas_recientes_ajax'), 200),
+        'mis_reservas': (get(cliente, 'mis_reservas'), 200),
+        'nueva_reserva': (get(cliente, 'nueva_reserva'), 200),
+        'nueva_reserva_post': (post_reserva, 302),
+        'verificar_disponibilidad': (get(cliente, 'verificar_disponibilidad_ajax', {
+            'espacio_id': sala.pk, 'fecha': fecha,
+        }), 200),
+        'calendario_ocupacion': (get(cliente, 'calendario_ocupacion_ajax', {
+            'espacio_id': sala.pk, 'mes': fecha[:7],
+        }), 200),
+        'calendario_edificio': (get(cliente, 'calendario_edificio_ajax', {'mes': fecha[:7]}), 200),
+        'matriz_disponibilidad': (get(cliente, 'matriz_disponibilidad_ajax', {
+            'espacios': ids, 'desde': fecha,
+        }), 200),
+    }
+
+
+def comparar(base, actual, umbral):
+    """Lista de regresiones (texto) de `actual` respecto a `base`"""
+    regresiones = []
+    for nombre, medida in actual['vistas'].items():
+        anterior = base.get('vistas', {}).get(nombre)
+        if not anterior:
+            continue
+        for campo in ('p50_ms', 'p95_ms', 'p99_ms'):
+            limite = max(anterior[campo] * (1 + umbral), anterior[campo] + HOLGURA_MS)
+            if medida[campo] > limite:
+                regresiones.append(f'{nombre}: {campo} {anterior[campo]:.2f} -> {medida[campo]:.2f}')
+        # Una consulta de más siempre es una regresión, sin umbral
+        if medida['consultas'] > anterior['consultas']:
+            regresiones.append(f"{nombre}: consultas {anterior['consultas']} -> {medida['consultas']}")
+        if medida['memoria_pico_kb'] > anterior['memoria_pico_kb'] * (1 + umbral):
+            regresiones.append(
+                f"{nombre}: memoria {anterior['memoria_pico_kb']:.1f} KB -> {medida['memoria_pico_kb']:.1f} KB"
+            )
+    return regresiones
@@ -0,0 +1,149 @@
+"""
+Compara las vistas de lectura sync (WSGI, un hilo por request) con sus
+versiones async (ASGI, una corrutina por request) bajo la misma carga.
+
+    python manage.py comparar_vistas_async --peticiones 500 --concurrencia 50
+
+Por defecto corre sin cache para medir la base de datos y no el micro-cache.
+El ORM async de Django todavía ejecuta cada consulta en un hilo del driver
+(sync_to_async), así que con una base local la versión async no es más
+rápida por request: lo que gana es que mientras espera no retiene un hilo
+del worker, y las conexiones de larga espera (SSE, base remota lenta) no
+agotan el pool de hilos.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from reservas import views
+from reservas.management.medicion import percentil
+from reservas.models import Espacio
+
+VISTAS = {
+    'disponibilidad': (views.verificar_disponibilidad_ajax, views.verificar_disponibilidad_async),
+    'calendario': (views.obtener_calendario_ocupacion_ajax, views.calendario_ocupacion_async),
+}
+
+SIN_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    help = 'Compara las vistas AJAX sync y async de disponibilidad y calendario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vista', choices=sorted(VISTAS), default='disponibilidad')
+        parser.add_argument('--peticiones', type=int, default=500)
+        parser.add_argument('--concurrencia', type=int, default=50,
+                            help='Hilos del worker sync y corrutinas simultáneas del async')
+        parser.add_argument('--espacio', type=int, help='ID del espacio (por defecto el primero activo)')
+        parser.add_argument('--fecha', help='YYYY-MM-DD (por defecto hoy)')
+        parser.add_argument('--con-cache', action='store_true',
+                            help='Usar la cache configurada en vez de desactivarla')
+
+    def handle(self, *args, **options):
+        usuario = get_user_model().objects.order_by('pk').first()
+        espacio = (
+            Espacio.objects.filter(pk=options['espacio']) if options['espacio']
+            else Espacio.objects.filter(activo=True).order_by('pk')
+        ).first()
+        if usuario is None or espacio is None:
+            raise CommandError('Hace falta al menos un usuario y un espacio en la base de datos')
+
+        fecha = options['fecha'] or date.today().isoformat()
+        if options['vista'] == 'disponibilidad':
+            parametros = {'espacio_id': espacio.pk, 'fecha': fecha}
+        else:
+            parametros = {'espacio_id': espacio.pk, 'mes': fecha[:7]}
+
+        vista_sync, vista_async = VISTAS[options['vista']]
+        peticiones = options['peticiones']
+        concurrencia = options['concurrencia']
+
+        with override_settings(**({} if options['con_cache'] else {'CACHES': SIN_CACHE})):
+            resultados = [
+                ('sync (hilos)',) + self._medir_sync(vista_sync, parametros, usuario, peticiones, concurrencia),
+                ('async (corrutinas)',) + self._medir_async(vista_async, parametros, usuario, peticiones, concurrencia),
+            ]
+
+        self.stdout.write(
+            f"{options['vista']} · espacio {espacio.pk} · {peticiones} peticiones · concurrencia {concurrencia}"
+        )
+        self.stdout.write(f"{'versión':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'máx ms':>10}{'errores':>9}")
+        for nombre, total, tiempos, errores in resultados:
+            self.stdout.write(
+                f'{nombre:<20}{peticiones / total:>10.1f}{percentil(tiempos, 50):>10.2f}'
+                f'{percentil(tiempos, 95):>10.2f}{max(tiempos):>10.2f}{errores:>9}'
+            )
+
+    def _medir_sync(self, vista, parametros, usuario, peticiones, concurrencia):
+        fabrica = RequestFactory()
+
+        def una():
+            request = fabrica.get('/', parametros)
+            request.user = usuario
+            inicio = time.perf_counter()
+            response = vista(request)
+            return (time.perf_counter() - inicio) * 1000, response.status_code
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as hilos:
+            medidas = list(hilos.map(lambda _: una(), range(peticiones)))
+            total = time.perf_counter() - inicio
+            _cerrar_conexiones(hilos, concurrencia)
+        return (total, *_separar(medidas))
+
+    def _medir_async(self, vista, parametros, usuario, peticiones, concurrencia):
+        fabrica = AsyncRequestFactory()
+
+        async def auser():
+            return usuario
+
+        async def una(limite):
+            async with limite:
+                request = fabrica.get('/', parametros)
+                request.user = usuario
+                request.auser = auser
+                inicio = time.perf_counter()
+                response = await vista(request)
+                return (time.perf_counter() - inicio) * 1000, response.status_code
+
+        async def todas():
+            limite = asyncio.Semaphore(concurrencia)
+            medidas = await asyncio.gather(*[una(limite) for _ in range(peticiones)])
+            total = time.perf_counter() - inicio
+            # El ORM async usa la conexión del hilo de sync_to_async: se cierra en ese hilo
+            await sync_to_async(connections.close_all)()
+            return total, medidas
+
+        inicio = time.perf_counter()
+        total, medidas = asyncio.run(todas())
+        return (total, *_separar(medidas))
+
+
+def _cerrar_conexiones(hilos, cantidad):
+    """
+    Cierra la conexión que abrió cada hilo del pool (una conexión solo se
+    puede cerrar desde su hilo). Las tareas esperan todas en una barrera, así
+    cada uno de los `cantidad` hilos corre exactamente una.
+    """
+    barrera = threading.Barrier(cantidad)
+
+    def cerrar():
+        barrera.wait()
+        connections.close_all()
+
+    list(hilos.map(lambda _: cerrar(), range(cantidad)))
+
+
+def _separar(medidas):
+    tiempos = [tiempo for tiempo, _ in medidas]
+    errores = sum(1 for _, estado in medidas if estado != 200)
+    return tiempos, errores
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reservas import importacion
+
+
+class Command(BaseCommand):
+    help = 'Importa usuarios y oficinas desde un fixture JSON por lotes, sin cargarlo entero en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--codificacion', help='Por defecto se detecta (UTF-8, UTF-16 o UTF-32)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        def progreso(resultado):
+            self.stdout.write(
+                f'  {resultado.procesados} registros · {resultado.usuarios_creados} usuarios nuevos · '
+                f'{resultado.usuarios_actualizados} actualizados · {resultado.total_errores} errores'
+            )
+
+        try:
+            resultado = importacion.importar_archivo(
+                options['archivo'],
+                codificacion=options['codificacion'],
+                batch_size=options['batch_size'],
+                progreso=progreso,
+            )
+        except (OSError, LookupError, UnicodeDecodeError) as e:
+            raise CommandError(f'No se pudo leer {options["archivo"]}: {e}')
+
+        for error in resultado.errores:
+            self.stderr.write(f"  registro {error['registro']}: {error['error']}")
+        if resultado.total_errores > len(resultado.errores):
+            self.stderr.write(f'  ... y {resultado.total_errores - len(resultado.errores)} errores más')
+
+        resumen = (
+            f'{resultado.usuarios_creados} usuarios creados, {resultado.usuarios_actualizados} actualizados; '
+            f'{resultado.oficinas_creadas} oficinas creadas, {resultado.oficinas_actualizadas} actualizadas'
+        )
+        if resultado.error_fatal:
+            raise CommandError(f'{resultado.error_fatal} (importado hasta ahí: {resumen})')
+        estilo = self.style.WARNING if resultado.total_errores else self.style.SUCCESS
+        self.stdout.write(estilo(f'{resumen}; {resultado.total_errores} registros con errores'))
@@ -0,0 +1,50 @@
+"""
+Mantenimiento de la tabla de reservas (reservas/historial.py y
+reservas/particiones.py).
+
+No forma parte del release: archivar o mover filas puede tardar y no debe
+demorar un deploy. Se programa como tarea diaria en la plataforma (cron):
+
+    python manage.py mantener_reservas
+
+Con MESES_ADELANTE meses de particiones creadas de antemano, una corrida
+atrasada no afecta a las reservas nuevas.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from reservas import historial, particiones
+
+
+class Command(BaseCommand):
+    help = (
+        'Mantiene la tabla de reservas acotada: en PostgreSQL crea las particiones mensuales que faltan; '
+        'en SQLite (o con --archivar) mueve las reservas viejas a ReservaArchivada'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.RESERVAS_DIAS_EN_CALIENTE,
+                            help='Reservas con más de estos días pasan al archivo')
+        parser.add_argument('--meses-adelante', type=int, default=particiones.MESES_ADELANTE)
+        parser.add_argument('--archivar', action='store_true',
+                            help='Archivar también en PostgreSQL (ahí alcanza con las particiones)')
+        parser.add_argument('--batch-size', type=int, default=historial.TAM_LOTE)
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1:
+            raise CommandError('--dias tiene que ser mayor que 0')
+
+        if connection.vendor == 'postgresql':
+            creadas = particiones.asegurar(meses_adelante=options['meses_adelante'])
+            self.stdout.write(f'Particiones creadas: {", ".join(creadas) or "ninguna"}')
+            if not options['archivar']:
+                return
+
+        corte = historial.corte(dias=options['dias'])
+        movidas = historial.archivar(
+            corte,
+            tam_lote=options['batch_size'],
+            progreso=lambda total: self.stdout.write(f'  {total} reservas archivadas...'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'{movidas} reservas anteriores al {corte:%d/%m/%Y} archivadas'))
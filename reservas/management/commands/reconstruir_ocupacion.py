@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reservas import ocupacion
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla OcupacionDiaria a partir de las reservas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = ocupacion.reconstruir(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Ocupación reconstruida: {total} día(s) con reservas'))
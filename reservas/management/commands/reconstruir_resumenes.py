@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reservas import estadisticas
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes diarios del panel de administración a partir de las reservas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = estadisticas.reconstruir(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes reconstruidos: {total} fila(s)'))
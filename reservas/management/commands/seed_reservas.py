@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservas import semilla
+from reservas.models import Oficina
+
+
+class Command(BaseCommand):
+    help = 'Genera oficinas, espacios y reservas sintéticas (deterministas) para pruebas de carga'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--oficinas', type=int, default=300)
+        parser.add_argument('--espacios', type=int, default=40)
+        parser.add_argument('--reservas', type=int, default=100000)
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--dias-futuros', type=int, default=30,
+                            help='Días con reservas después de hoy; el resto va hacia atrás')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['oficinas'] < 1 or options['espacios'] < 1:
+            raise CommandError('Hace falta al menos una oficina y un espacio')
+        if Oficina.objects.filter(user__username__startswith=semilla.PREFIJO_USUARIO).exists():
+            raise CommandError(
+                f'Ya hay oficinas generadas (usuarios {semilla.PREFIJO_USUARIO}*); '
+                'vacíe la base con `manage.py flush` antes de volver a generar'
+            )
+
+        inicio = time.perf_counter()
+
+        def progreso(creadas):
+            segundos = time.perf_counter() - inicio
+            self.stdout.write(
+                f"  {creadas:>10,} / {options['reservas']:,} reservas "
+                f"({creadas / segundos:,.0f}/s)"
+            )
+
+        oficinas, espacios, creadas, desde = semilla.poblar(
+            oficinas=options['oficinas'],
+            espacios=options['espacios'],
+            reservas=options['reservas'],
+            semilla=options['semilla'],
+            dias_futuros=options['dias_futuros'],
+            batch_size=options['batch_size'],
+            progreso=progreso,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(oficinas)} oficinas, {len(espacios)} espacios y {creadas} reservas '
+            f'desde {desde:%Y-%m-%d} en {time.perf_counter() - inicio:.1f} s '
+            f'(clave de los usuarios: {semilla.CLAVE})'
+        ))
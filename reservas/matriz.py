@@ -0,0 +1,95 @@
+"""
+Matriz libre/ocupado de varios espacios en un rango de días.
+
+Por cada espacio devuelve una fila por día con un 0/1 por bloque de su
+plantilla (reservas/horarios.py). Toda la ocupación del rango sale de una
+consulta: las máscaras de OcupacionDiaria para los espacios con bloques
+alineados a los slots, y las reservas del rango solo para los espacios con
+horarios fuera de los slots.
+
+El tamaño está acotado (espacios, días y celdas) para que el costo de una
+respuesta sea predecible.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from . import horarios, ocupacion
+from .disponibilidad import AgendaDia
+from .models import OcupacionDiaria, Reserva
+
+MAX_ESPACIOS = 50
+MAX_DIAS = 31
+MAX_CELDAS = 5000
+
+
+class MatrizDemasiadoGrande(ValueError):
+    """El pedido supera alguno de los límites de tamaño"""
+
+
+def _alineada(plantilla):
+    return all(ocupacion.alineado(inicio, fin) for inicio, fin in plantilla.intervalos)
+
+
+def calcular(espacios, desde, hasta):
+    """
+    Devuelve {'fechas': [...], 'espacios': [{id, nombre, tipo, bloques,
+    ocupado}]} donde ocupado[d][b] es 1 si el bloque b está tomado el día d.
+    Lanza ValueError con un rango al revés y MatrizDemasiadoGrande si se
+    pasa de los límites.
+    """
+    if hasta < desde:
+        raise ValueError('El rango de fechas está invertido')
+    espacios = list(espacios)
+    dias = (hasta - desde).days + 1
+    plantillas = {espacio.pk: horarios.para_espacio(espacio) for espacio in espacios}
+    celdas = dias * sum(len(plantilla) for plantilla in plantillas.values())
+    if len(espacios) > MAX_ESPACIOS or dias > MAX_DIAS or celdas > MAX_CELDAS:
+        raise MatrizDemasiadoGrande(
+            f'Máximo {MAX_ESPACIOS} espacios, {MAX_DIAS} días y {MAX_CELDAS} bloques por consulta'
+        )
+
+    fechas = [desde + timedelta(days=i) for i in range(dias)]
+    alineados = {pk for pk, plantilla in plantillas.items() if _alineada(plantilla)}
+    exactos = set(plantillas) - alineados
+
+    mascaras = {}
+    if alineados:
+        mascaras = {
+            (espacio_id, fecha): valor
+            for espacio_id, fecha, valor in OcupacionDiaria.objects.filter(
+                espacio_id__in=alineados, fecha__gte=desde, fecha__lte=hasta
+            ).values_list('espacio_id', 'fecha', 'mascara')
+        }
+    intervalos = defaultdict(list)
+    if exactos:
+        for espacio_id, fecha, inicio, fin in Reserva.objects.filter(
+            espacio_id__in=exactos, fecha__gte=desde, fecha__lte=hasta
+        ).values_list('espacio_id', 'fecha', 'hora_inicio', 'hora_fin'):
+            intervalos[(espacio_id, fecha)].append((inicio, fin))
+
+    filas = []
+    for espacio in espacios:
+        plantilla = plantillas[espacio.pk]
+        if espacio.pk in alineados:
+            bits = [ocupacion.mascara(inicio, fin) for inicio, fin in plantilla.intervalos]
+            ocupado = [
+                [1 if valor & bit else 0 for bit in bits]
+                for valor in (mascaras.get((espacio.pk, fecha), 0) for fecha in fechas)
+            ]
+        else:
+            ocupado = []
+            for fecha in fechas:
+                agenda = AgendaDia(intervalos.get((espacio.pk, fecha), ()))
+                ocupado.append([1 if agenda.ocupado(inicio, fin) else 0 for inicio, fin in plantilla.intervalos])
+        filas.append({
+            'id': espacio.pk,
+            'nombre': espacio.nombre,
+            'tipo': espacio.tipo,
+            'bloques': plantilla.bloques,
+            'ocupado': ocupado,
+        })
+
+    return {
+        'fechas': [fecha.isoformat() for fecha in fechas],
+        'espacios': filas,
+    }
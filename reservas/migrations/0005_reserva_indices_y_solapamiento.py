@@ -0,0 +1,123 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+# SQL congelado de la restricción (la versión viva está en reservas/restricciones.py)
+NOMBRE = 'reserva_sin_solapamiento'
+
+POSTGRES_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    f"""
+    ALTER TABLE reservas_reserva
+    ADD CONSTRAINT {NOMBRE}
+    EXCLUDE USING gist (
+        espacio_id WITH =,
+        tsrange(fecha + hora_inicio, fecha + hora_fin, '[)') WITH &&
+    )
+    """,
+]
+POSTGRES_BORRAR = [
+    f"ALTER TABLE reservas_reserva DROP CONSTRAINT IF EXISTS {NOMBRE}",
+]
+
+SQLITE_CONDICION = """
+    EXISTS (
+        SELECT 1 FROM reservas_reserva
+        WHERE espacio_id = NEW.espacio_id
+          AND fecha = NEW.fecha
+          AND hora_inicio < NEW.hora_fin
+          AND hora_fin > NEW.hora_inicio
+          {extra}
+    )
+"""
+SQLITE_CREAR = [
+    f"""
+    CREATE TRIGGER {NOMBRE}_insert
+    BEFORE INSERT ON reservas_reserva
+    FOR EACH ROW WHEN {SQLITE_CONDICION.format(extra='')}
+    BEGIN
+        SELECT RAISE(ABORT, '{NOMBRE}');
+    END
+    """,
+    f"""
+    CREATE TRIGGER {NOMBRE}_update
+    BEFORE UPDATE OF espacio_id, fecha, hora_inicio, hora_fin ON reservas_reserva
+    FOR EACH ROW WHEN {SQLITE_CONDICION.format(extra='AND id != NEW.id')}
+    BEGIN
+        SELECT RAISE(ABORT, '{NOMBRE}');
+    END
+    """,
+]
+SQLITE_BORRAR = [
+    f"DROP TRIGGER IF EXISTS {NOMBRE}_insert",
+    f"DROP TRIGGER IF EXISTS {NOMBRE}_update",
+]
+
+# Pares de reservas existentes que la restricción rechazaría
+SOLAPADAS = """
+    SELECT a.id, b.id, a.espacio_id, a.fecha, a.hora_inicio, a.hora_fin, b.hora_inicio, b.hora_fin
+    FROM reservas_reserva a
+    JOIN reservas_reserva b
+      ON b.espacio_id = a.espacio_id
+     AND b.fecha = a.fecha
+     AND b.id > a.id
+     AND b.hora_inicio < a.hora_fin
+     AND b.hora_fin > a.hora_inicio
+    ORDER BY a.espacio_id, a.fecha, a.hora_inicio, a.id, b.id
+"""
+MAX_LISTADAS = 50
+
+
+def verificar_sin_solapamientos(apps, schema_editor):
+    """
+    Falla antes de crear la restricción si ya hay reservas solapadas y las
+    lista, para corregirlas a mano (mover o borrar una de cada par).
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(SOLAPADAS)
+        pares = cursor.fetchall()
+    if not pares:
+        return
+    lineas = [
+        f'  reservas {a} y {b}: espacio {espacio}, {fecha}, {inicio_a}-{fin_a} y {inicio_b}-{fin_b}'
+        for a, b, espacio, fecha, inicio_a, fin_a, inicio_b, fin_b in pares[:MAX_LISTADAS]
+    ]
+    if len(pares) > MAX_LISTADAS:
+        lineas.append(f'  ... y {len(pares) - MAX_LISTADAS} pares más')
+    raise RuntimeError(
+        f'No se puede crear {NOMBRE}: hay reservas solapadas ({len(pares)} pares). '
+        'Corrígelos y vuelve a migrar:\n' + '\n'.join(lineas)
+    )
+
+
+def _ejecutar(schema_editor, por_motor):
+    for sql in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def crear_restriccion(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': POSTGRES_CREAR, 'sqlite': SQLITE_CREAR})
+
+
+def borrar_restriccion(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': POSTGRES_BORRAR, 'sqlite': SQLITE_BORRAR})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0004_alter_espacio_tipo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['espacio', 'fecha', 'hora_inicio'], name='reserva_espacio_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['oficina', 'fecha'], name='reserva_oficina_fecha_idx'),
+        ),
+        migrations.RunPython(verificar_sin_solapamientos, migrations.RunPython.noop),
+        migrations.RunPython(crear_restriccion, borrar_restriccion),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:06
+
+import django.db.models.deletion
+from itertools import groupby
+
+from django.db import migrations, models
+
+# Bloques de 30 minutos, bit 0 = 00:00-00:30
+SLOT_MINUTOS = 30
+
+
+def _mascara(inicio, fin):
+    primero = (inicio.hour * 60 + inicio.minute) // SLOT_MINUTOS
+    ultimo = -(-(fin.hour * 60 + fin.minute) // SLOT_MINUTOS)
+    if ultimo <= primero:
+        return 0
+    return ((1 << ultimo) - 1) ^ ((1 << primero) - 1)
+
+
+def _resumir(filas):
+    for (espacio_id, fecha), grupo in groupby(filas, key=lambda f: (f[0], f[1])):
+        valor = 0
+        total = 0
+        for _, _, inicio, fin in grupo:
+            valor |= _mascara(inicio, fin)
+            total += 1
+        yield espacio_id, fecha, valor, total
+
+
+def poblar_ocupacion(apps, schema_editor):
+    Reserva = apps.get_model('reservas', 'Reserva')
+    OcupacionDiaria = apps.get_model('reservas', 'OcupacionDiaria')
+    filas = Reserva.objects.order_by(
+        'espacio_id', 'fecha'
+    ).values_list('espacio_id', 'fecha', 'hora_inicio', 'hora_fin').iterator()
+    OcupacionDiaria.objects.bulk_create(
+        (
+            OcupacionDiaria(espacio_id=espacio_id, fecha=fecha, mascara=valor, total_reservas=total)
+            for espacio_id, fecha, valor, total in _resumir(filas)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0005_reserva_indices_y_solapamiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('mascara', models.BigIntegerField(default=0)),
+                ('total_reservas', models.PositiveIntegerField(default=0)),
+                ('espacio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacion_diaria', to='reservas.espacio')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('espacio', 'fecha'), name='ocupacion_espacio_fecha_unica')],
+            },
+        ),
+        migrations.RunPython(poblar_ocupacion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, IntegerField, Sum
+from django.db.models.functions import ExtractHour, ExtractMinute
+
+
+def _minutos(campo):
+    return ExtractHour(campo) * 60 + ExtractMinute(campo)
+
+
+def poblar_resumenes(apps, schema_editor):
+    """Los tres resúmenes desde las reservas existentes, un GROUP BY por tabla"""
+    Reserva = apps.get_model('reservas', 'Reserva')
+    reservas = Reserva.objects.order_by()
+    agrupaciones = [
+        ('ResumenDiarioEspacio', reservas.values('espacio_id', 'fecha')),
+        ('ResumenDiarioOficina', reservas.values('oficina_id', 'fecha')),
+        ('ResumenDiarioHora', reservas.annotate(hora=ExtractHour('hora_inicio')).values('fecha', 'hora')),
+    ]
+    duracion = ExpressionWrapper(_minutos('hora_fin') - _minutos('hora_inicio'), output_field=IntegerField())
+
+    for nombre, agrupadas in agrupaciones:
+        modelo = apps.get_model('reservas', nombre)
+        filas = agrupadas.annotate(reservas=Count('id'), minutos=Sum(duracion)).iterator(chunk_size=1000)
+        buffer = []
+        for fila in filas:
+            buffer.append(modelo(**fila))
+            if len(buffer) >= 1000:
+                modelo.objects.bulk_create(buffer)
+                buffer = []
+        modelo.objects.bulk_create(buffer)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0006_ocupaciondiaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora', models.PositiveSmallIntegerField()),
+                ('reservas', models.IntegerField(default=0)),
+                ('minutos', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'hora'), name='resumen_hora_fecha_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioEspacio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('reservas', models.IntegerField(default=0)),
+                ('minutos', models.IntegerField(default=0)),
+                ('espacio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='reservas.espacio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha'], name='resumen_espacio_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('espacio', 'fecha'), name='resumen_espacio_fecha_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioOficina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('reservas', models.IntegerField(default=0)),
+                ('minutos', models.IntegerField(default=0)),
+                ('oficina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='reservas.oficina')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha'], name='resumen_oficina_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('oficina', 'fecha'), name='resumen_oficina_fecha_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
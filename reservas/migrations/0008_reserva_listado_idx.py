@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0007_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['-fecha', 'espacio', 'oficina', 'hora_inicio'], name='reserva_listado_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0008_reserva_listado_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieReserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frecuencia', models.CharField(choices=[('semanal', 'Semanal'), ('quincenal', 'Cada dos semanas'), ('mensual', 'Mensual')], max_length=10)),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('bloques', models.JSONField(default=list, help_text='Bloques HH:MM-HH:MM de cada fecha')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('espacio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='reservas.espacio')),
+                ('oficina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='reservas.oficina')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reserva',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='reservas.seriereserva'),
+        ),
+    ]
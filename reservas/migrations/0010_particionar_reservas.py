@@ -0,0 +1,130 @@
+import re
+from datetime import date
+
+from django.db import migrations
+
+# Conversión congelada: reservas/particiones.py mantiene las particiones
+# después, con los mismos nombres
+TABLA = 'reservas_reserva'
+ANTERIOR = 'reservas_reserva_sin_particionar'
+PREDETERMINADA = 'reservas_reserva_otras'
+SECUENCIA = 'reservas_reserva_id_seq'
+MESES_ADELANTE = 3
+
+
+def _siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _nombre(mes):
+    return f'{TABLA}_{mes:%Y_%m}'
+
+
+def _restriccion(particion):
+    return f"""
+    ALTER TABLE {particion}
+    ADD CONSTRAINT {particion}_sin_solapamiento
+    EXCLUDE USING gist (
+        espacio_id WITH =,
+        tsrange(fecha + hora_inicio, fecha + hora_fin, '[)') WITH &&
+    )
+    """
+
+
+def particionar(apps, schema_editor):
+    """
+    Solo en PostgreSQL: convierte reservas_reserva en una tabla particionada
+    por mes de `fecha`, conservando filas, índices (con sus nombres), claves
+    foráneas y la secuencia de ids.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f'",
+            [TABLA],
+        )
+        entrantes = cursor.fetchall()
+        if entrantes:
+            raise RuntimeError(
+                f'No se puede particionar {TABLA}: la clave primaria pasa a ser (id, fecha) y estas '
+                'claves foráneas apuntan a su id: ' + ', '.join(f'{tabla}.{nombre_fk}' for tabla, nombre_fk in entrantes)
+            )
+
+        cursor.execute(f'ALTER TABLE {TABLA} RENAME TO {ANTERIOR}')
+
+        # Índices que no respaldan restricciones (la pk y la de no solapamiento se rehacen aparte)
+        cursor.execute(
+            """
+            SELECT pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            WHERE i.indrelid = %s::regclass
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+            """,
+            [ANTERIOR],
+        )
+        indices = [re.sub(rf'\b{ANTERIOR}\b', TABLA, fila[0]) for fila in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [ANTERIOR],
+        )
+        foraneas = cursor.fetchall()
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', fecha)::date FROM {ANTERIOR}")
+        meses = {fila[0] for fila in cursor.fetchall()}
+
+        cursor.execute(f'CREATE TABLE {TABLA} (LIKE {ANTERIOR} INCLUDING DEFAULTS) PARTITION BY RANGE (fecha)')
+        cursor.execute(f'CREATE TABLE {PREDETERMINADA} PARTITION OF {TABLA} DEFAULT')
+        mes = date.today().replace(day=1)
+        for _ in range(MESES_ADELANTE + 1):
+            meses.add(mes)
+            mes = _siguiente(mes)
+        for mes in sorted(meses):
+            cursor.execute(
+                f"CREATE TABLE {_nombre(mes)} PARTITION OF {TABLA} "
+                f"FOR VALUES FROM ('{mes}') TO ('{_siguiente(mes)}')"
+            )
+
+        cursor.execute(f'INSERT INTO {TABLA} SELECT * FROM {ANTERIOR}')
+        copiadas = cursor.rowcount
+        cursor.execute(f'SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {ANTERIOR}')
+        originales, maximo = cursor.fetchone()
+        if copiadas != originales:
+            raise RuntimeError(f'Se copiaron {copiadas} de {originales} reservas: se deshace la migración')
+        # Con la tabla vieja se van su secuencia de identidad, sus índices y restricciones
+        cursor.execute(f'DROP TABLE {ANTERIOR}')
+
+        cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_pkey PRIMARY KEY (id, fecha)')
+        for definicion in indices:
+            cursor.execute(definicion)
+        for nombre_restriccion, definicion in foraneas:
+            cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {nombre_restriccion} {definicion}')
+
+        cursor.execute(f'CREATE SEQUENCE {SECUENCIA} OWNED BY {TABLA}.id')
+        cursor.execute('SELECT setval(%s, %s, %s)', [SECUENCIA, max(maximo, 1), maximo > 0])
+        cursor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN id SET DEFAULT nextval('{SECUENCIA}')")
+
+        # La restricción de no solapamiento, en cada partición
+        cursor.execute(
+            """
+            SELECT hija.relname
+            FROM pg_inherits
+            JOIN pg_class padre ON padre.oid = pg_inherits.inhparent
+            JOIN pg_class hija ON hija.oid = pg_inherits.inhrelid
+            WHERE padre.relname = %s
+            """,
+            [TABLA],
+        )
+        for particion, in cursor.fetchall():
+            cursor.execute(_restriccion(particion))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0009_series_de_reservas'),
+    ]
+
+    operations = [
+        # Solo en PostgreSQL: tabla particionada por mes de `fecha`
+        migrations.RunPython(particionar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# SQL congelado: la vista con las columnas de Reserva en este punto del historial
+COLUMNAS = (
+    'id, oficina_id, espacio_id, serie_id, fecha, hora_inicio, hora_fin, '
+    'fecha_creacion, nombre_visitante, placa_visitante, empresa_visitante'
+)
+CREAR_VISTA = (
+    f'CREATE VIEW reservas_reserva_historial AS '
+    f'SELECT {COLUMNAS} FROM reservas_reserva '
+    f'UNION ALL '
+    f'SELECT {COLUMNAS} FROM reservas_reservaarchivada'
+)
+BORRAR_VISTA = 'DROP VIEW IF EXISTS reservas_reserva_historial'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0010_particionar_reservas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaHistorica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('fecha_creacion', models.DateTimeField()),
+                ('nombre_visitante', models.CharField(blank=True, max_length=100)),
+                ('placa_visitante', models.CharField(blank=True, max_length=15)),
+                ('empresa_visitante', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'db_table': 'reservas_reserva_historial',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ReservaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('fecha_creacion', models.DateTimeField()),
+                ('nombre_visitante', models.CharField(blank=True, max_length=100)),
+                ('placa_visitante', models.CharField(blank=True, max_length=15)),
+                ('empresa_visitante', models.CharField(blank=True, max_length=100)),
+                ('espacio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_archivadas', to='reservas.espacio')),
+                ('oficina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_archivadas', to='reservas.oficina')),
+                ('serie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservas_archivadas', to='reservas.seriereserva')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['oficina', 'fecha'], name='archivada_oficina_fecha_idx'), models.Index(fields=['-fecha', 'espacio', 'oficina', 'hora_inicio'], name='archivada_listado_idx')],
+            },
+        ),
+        migrations.RunSQL(CREAR_VISTA, BORRAR_VISTA),
+    ]
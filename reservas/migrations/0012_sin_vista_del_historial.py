@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:26
+
+from django.db import migrations
+
+# El historial se lee con historial.Historial (UNION ALL en cada consulta):
+# sin la vista, las migraciones pueden volver a alterar reservas_reserva
+COLUMNAS = (
+    'id, oficina_id, espacio_id, serie_id, fecha, hora_inicio, hora_fin, '
+    'fecha_creacion, nombre_visitante, placa_visitante, empresa_visitante'
+)
+CREAR_VISTA = (
+    f'CREATE VIEW reservas_reserva_historial AS '
+    f'SELECT {COLUMNAS} FROM reservas_reserva '
+    f'UNION ALL '
+    f'SELECT {COLUMNAS} FROM reservas_reservaarchivada'
+)
+BORRAR_VISTA = 'DROP VIEW IF EXISTS reservas_reserva_historial'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0011_archivo_de_reservas'),
+    ]
+
+    operations = [
+        migrations.RunSQL(BORRAR_VISTA, CREAR_VISTA),
+        migrations.DeleteModel(
+            name='ReservaHistorica',
+        ),
+    ]
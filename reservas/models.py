@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from datetime import datetime, date, time
 
+from . import horarios
+
 class Oficina(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     numero = models.CharField(max_length=20)
@@ -45,9 +48,39 @@ class Espacio(models.Model):
         help_text="Usar horarios específicos en lugar de horarios estándar"
     )
     
+    def clean(self):
+        if self.usar_horarios_personalizados:
+            try:
+                horarios.compilar(self.tipo, self.horarios_personalizados)
+            except horarios.HorarioInvalido as e:
+                raise ValidationError({'horarios_personalizados': str(e)})
+
     def __str__(self):
         return self.nombre
 
+class SerieReserva(models.Model):
+    """
+    Reserva periódica: los mismos bloques cada semana, cada dos semanas o
+    cada mes. Cada fecha es una Reserva normal que apunta a su serie; se
+    crean y se cancelan juntas desde reservas/series.py.
+    """
+    FRECUENCIAS = [
+        ('semanal', 'Semanal'),
+        ('quincenal', 'Cada dos semanas'),
+        ('mensual', 'Mensual'),
+    ]
+    
+    oficina = models.ForeignKey(Oficina, on_delete=models.CASCADE, related_name='series')
+    espacio = models.ForeignKey(Espacio, on_delete=models.CASCADE, related_name='series')
+    frecuencia = models.CharField(max_length=10, choices=FRECUENCIAS)
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+    bloques = models.JSONField(default=list, help_text="Bloques HH:MM-HH:MM de cada fecha")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.oficina} - {self.espacio} - {self.get_frecuencia_display()} desde {self.fecha_inicio}"
+
 class Reserva(models.Model):
     oficina = models.ForeignKey(Oficina, on_delete=models.CASCADE)
     espacio = models.ForeignKey(Espacio, on_delete=models.CASCADE)
@@ -61,10 +94,132 @@ class Reserva(models.Model):
     placa_visitante = models.CharField(max_length=15, blank=True)
     empresa_visitante = models.CharField(max_length=100, blank=True)
     
+    serie = models.ForeignKey(
+        SerieReserva,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='reservas',
+    )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['espacio', 'fecha', 'hora_inicio'], name='reserva_espacio_fecha_idx'),
+            models.Index(fields=['oficina', 'fecha'], name='reserva_oficina_fecha_idx'),
+            # Mismo orden que la paginación por cursor de reservas/listados.py
+            models.Index(fields=['-fecha', 'espacio', 'oficina', 'hora_inicio'], name='reserva_listado_idx'),
+        ]
+        # El solapamiento de horarios lo impide la base de datos
+        # (ver migración 0005_reserva_indices_y_solapamiento)
+    
     def __str__(self):
         return f"{self.oficina} - {self.espacio} - {self.fecha}"
     
     def duracion_horas(self):
         inicio = datetime.combine(date.today(), self.hora_inicio)
         fin = datetime.combine(date.today(), self.hora_fin)
-        return (fin - inicio).seconds // 3600
\ No newline at end of file
+        return (fin - inicio).seconds // 3600
+
+# ============================================
+# HISTORIAL
+# Las reservas viejas pasan de Reserva a ReservaArchivada con
+# `python manage.py mantener_reservas` y historial.Historial lee las dos
+# tablas juntas (ver reservas/historial.py)
+# ============================================
+
+class ReservaArchivada(models.Model):
+    """Reserva anterior al horizonte de RESERVAS_DIAS_EN_CALIENTE; conserva su id original"""
+    id = models.BigIntegerField(primary_key=True)
+    oficina = models.ForeignKey(Oficina, on_delete=models.CASCADE, related_name='reservas_archivadas')
+    espacio = models.ForeignKey(Espacio, on_delete=models.CASCADE, related_name='reservas_archivadas')
+    fecha = models.DateField()
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+    fecha_creacion = models.DateTimeField()
+    nombre_visitante = models.CharField(max_length=100, blank=True)
+    placa_visitante = models.CharField(max_length=15, blank=True)
+    empresa_visitante = models.CharField(max_length=100, blank=True)
+    serie = models.ForeignKey(
+        SerieReserva,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservas_archivadas',
+    )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['oficina', 'fecha'], name='archivada_oficina_fecha_idx'),
+            models.Index(fields=['-fecha', 'espacio', 'oficina', 'hora_inicio'], name='archivada_listado_idx'),
+        ]
+
+
+class OcupacionDiaria(models.Model):
+    """
+    Ocupación materializada de un espacio en un día.
+
+    `mascara` tiene un bit por cada bloque de 30 minutos del día (bit 0 =
+    00:00-00:30). Se mantiene sincronizada desde reservas/ocupacion.py y se
+    puede reconstruir con `python manage.py reconstruir_ocupacion`.
+    """
+    espacio = models.ForeignKey(Espacio, on_delete=models.CASCADE, related_name='ocupacion_diaria')
+    fecha = models.DateField()
+    mascara = models.BigIntegerField(default=0)
+    total_reservas = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['espacio', 'fecha'], name='ocupacion_espacio_fecha_unica'),
+        ]
+    
+    def __str__(self):
+        return f"{self.espacio} - {self.fecha}"
+
+
+# ============================================
+# RESÚMENES DIARIOS PARA EL PANEL DE ADMINISTRACIÓN
+# Se actualizan de forma incremental desde reservas/estadisticas.py y se
+# reconstruyen con `python manage.py reconstruir_resumenes`
+# ============================================
+
+class ResumenDiarioEspacio(models.Model):
+    espacio = models.ForeignKey(Espacio, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    fecha = models.DateField()
+    reservas = models.IntegerField(default=0)
+    minutos = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['espacio', 'fecha'], name='resumen_espacio_fecha_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha'], name='resumen_espacio_fecha_idx'),
+        ]
+
+
+class ResumenDiarioOficina(models.Model):
+    oficina = models.ForeignKey(Oficina, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    fecha = models.DateField()
+    reservas = models.IntegerField(default=0)
+    minutos = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['oficina', 'fecha'], name='resumen_oficina_fecha_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha'], name='resumen_oficina_fecha_idx'),
+        ]
+
+
+class ResumenDiarioHora(models.Model):
+    """Reservas por hora de inicio (0-23); las franjas del panel se arman a partir de aquí"""
+    fecha = models.DateField()
+    hora = models.PositiveSmallIntegerField()
+    reservas = models.IntegerField(default=0)
+    minutos = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'hora'], name='resumen_hora_fecha_unico'),
+        ]
@@ -0,0 +1,196 @@
+"""
+Ocupación diaria de espacios como máscara de bits.
+
+Cada fila de OcupacionDiaria guarda, para un (espacio, fecha), un bit por
+bloque de SLOT_MINUTOS minutos. Las consultas de libre/ocupado se resuelven
+con operaciones de bits sobre una sola fila en vez de releer las reservas.
+
+La tabla se mantiene al día desde reservas/sincronizacion.py. Cada fila se
+recalcula desde las reservas del día (no por diferencias: dos reservas
+pueden compartir un slot), con un bloqueo por (espacio, fecha) que dura
+hasta el fin de la transacción.
+"""
+import calendar
+from datetime import date
+from itertools import groupby
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .historial import Historial
+from .models import Espacio, OcupacionDiaria, Reserva
+
+SLOT_MINUTOS = 30
+SLOTS_POR_DIA = 24 * 60 // SLOT_MINUTOS
+CLAVES_POR_CONSULTA = 200
+
+
+def minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def alineado(inicio, fin):
+    """True si el bloque empieza y termina en el borde de un slot"""
+    return minutos(inicio) % SLOT_MINUTOS == 0 and minutos(fin) % SLOT_MINUTOS == 0
+
+
+def mascara(inicio, fin):
+    """Bits de todos los slots que toca el intervalo [inicio, fin)"""
+    primero = minutos(inicio) // SLOT_MINUTOS
+    ultimo = -(-minutos(fin) // SLOT_MINUTOS)
+    if ultimo <= primero:
+        return 0
+    return ((1 << ultimo) - 1) ^ ((1 << primero) - 1)
+
+
+class MascaraDia:
+    """
+    Misma interfaz que disponibilidad.AgendaDia pero sobre la máscara de bits.
+
+    Para bloques alineados a SLOT_MINUTOS la respuesta es exacta: cualquier
+    slot marcado se cruza con alguna reserva real.
+    """
+
+    def __init__(self, valor=0):
+        self.valor = valor
+
+    @classmethod
+    def cargar(cls, espacio, fecha):
+        valor = OcupacionDiaria.objects.filter(
+            espacio=espacio,
+            fecha=fecha
+        ).values_list('mascara', flat=True).first()
+        return cls(valor or 0)
+
+    @classmethod
+    async def acargar(cls, espacio, fecha):
+        valor = await OcupacionDiaria.objects.filter(
+            espacio=espacio,
+            fecha=fecha
+        ).values_list('mascara', flat=True).afirst()
+        return cls(valor or 0)
+
+    def ocupado(self, inicio, fin):
+        return bool(self.valor & mascara(inicio, fin))
+
+    def agregar(self, inicio, fin):
+        self.valor |= mascara(inicio, fin)
+
+
+def resumir(filas):
+    """
+    Convierte filas (espacio_id, fecha, hora_inicio, hora_fin) ordenadas por
+    (espacio_id, fecha) en tuplas (espacio_id, fecha, mascara, total_reservas).
+    """
+    for (espacio_id, fecha), grupo in groupby(filas, key=lambda f: (f[0], f[1])):
+        valor = 0
+        total = 0
+        for _, _, inicio, fin in grupo:
+            valor |= mascara(inicio, fin)
+            total += 1
+        yield espacio_id, fecha, valor, total
+
+
+def _filtro_claves(claves):
+    filtro = Q()
+    for espacio_id, fecha in claves:
+        filtro |= Q(espacio_id=espacio_id, fecha=fecha)
+    return filtro
+
+
+def recalcular(claves):
+    """Recalcula las filas de los pares (espacio_id, fecha) indicados"""
+    claves = sorted(set(claves))
+    # Por tramos para no armar un WHERE gigante con cientos de OR
+    for i in range(0, len(claves), CLAVES_POR_CONSULTA):
+        _recalcular_tramo(set(claves[i:i + CLAVES_POR_CONSULTA]))
+
+
+def _bloquear(claves):
+    """
+    Toma un bloqueo por (espacio, fecha) hasta el fin de la transacción.
+
+    En PostgreSQL (READ COMMITTED) dos transacciones que reservan bloques
+    distintos del mismo día no ven la reserva de la otra: sin el bloqueo la
+    última en escribir pisaría la máscara de la primera. La segunda espera a
+    que la primera confirme y al releer ya ve su reserva. Se bloquea en orden
+    para no generar deadlocks. SQLite ya serializa las escrituras.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    espacios, dias = zip(*sorted(claves))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(espacio, dia) FROM unnest(%s::int[], %s::int[]) AS clave(espacio, dia)',
+            [list(espacios), [fecha.toordinal() for fecha in dias]],
+        )
+
+
+def _recalcular_tramo(claves):
+    # Dentro de la transacción de la reserva no hace falta un savepoint
+    with transaction.atomic(savepoint=False):
+        _bloquear(claves)
+        _escribir_tramo(claves)
+
+
+def _escribir_tramo(claves):
+    filas = Reserva.objects.filter(_filtro_claves(claves)).order_by(
+        'espacio_id', 'fecha'
+    ).values_list('espacio_id', 'fecha', 'hora_inicio', 'hora_fin')
+
+    ocupaciones = [
+        OcupacionDiaria(espacio_id=espacio_id, fecha=fecha, mascara=valor, total_reservas=total)
+        for espacio_id, fecha, valor, total in resumir(filas)
+    ]
+    if ocupaciones:
+        OcupacionDiaria.objects.bulk_create(
+            ocupaciones,
+            update_conflicts=True,
+            unique_fields=['espacio', 'fecha'],
+            update_fields=['mascara', 'total_reservas'],
+        )
+
+    # Días que se quedaron sin reservas: se borra la fila en lugar de dejarla en 0
+    vacias = claves - {(o.espacio_id, o.fecha) for o in ocupaciones}
+    if vacias:
+        OcupacionDiaria.objects.filter(_filtro_claves(vacias)).delete()
+
+
+def reconstruir(batch_size=1000):
+    """Regenera toda la tabla desde el historial completo. Devuelve la cantidad de filas"""
+    OcupacionDiaria.objects.all().delete()
+    filas = Historial().union(
+        lambda reservas: reservas.values_list('espacio_id', 'fecha', 'hora_inicio', 'hora_fin')
+    ).order_by('espacio_id', 'fecha').iterator(chunk_size=batch_size)
+
+    total = 0
+    buffer = []
+    for espacio_id, fecha, valor, cantidad in resumir(filas):
+        buffer.append(OcupacionDiaria(espacio_id=espacio_id, fecha=fecha, mascara=valor, total_reservas=cantidad))
+        if len(buffer) >= batch_size:
+            OcupacionDiaria.objects.bulk_create(buffer)
+            total += len(buffer)
+            buffer = []
+    if buffer:
+        OcupacionDiaria.objects.bulk_create(buffer)
+        total += len(buffer)
+    return total
+
+
+def calendario_mes(year, month):
+    """
+    Ocupación de todos los espacios activos en un mes: por espacio, la lista
+    de reservas de cada día (índice 0 = día 1). Dos consultas.
+    """
+    dias = calendar.monthrange(year, month)[1]
+    espacios = list(Espacio.objects.filter(activo=True).order_by('tipo', 'nombre').values('id', 'nombre', 'tipo'))
+    por_espacio = {espacio['id']: [0] * dias for espacio in espacios}
+    filas = OcupacionDiaria.objects.filter(
+        espacio__activo=True,
+        fecha__gte=date(year, month, 1),
+        fecha__lte=date(year, month, dias),
+    ).values_list('espacio_id', 'fecha', 'total_reservas')
+    for espacio_id, fecha, total in filas:
+        if espacio_id in por_espacio:
+            por_espacio[espacio_id][fecha.day - 1] = total
+    return [{**espacio, 'reservas_por_dia': por_espacio[espacio['id']]} for espacio in espacios]
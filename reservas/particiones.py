@@ -0,0 +1,143 @@
+"""
+Particionado mensual de la tabla de reservas en PostgreSQL.
+
+La conversión de la tabla la hace la migración 0010 (con su SQL copiado
+ahí); este módulo mantiene las particiones después.
+
+reservas_reserva queda particionada por rango de `fecha`, una partición por
+mes (reservas_reserva_2025_03) más una predeterminada para las fechas que
+todavía no tienen la suya. Las consultas con un filtro de fecha (la
+disponibilidad, la ocupación, las reservas desde hoy) solo leen las
+particiones de esas fechas.
+
+- La clave primaria pasa a ser (id, fecha), porque PostgreSQL exige que
+  incluya la columna de particionado; el id sigue saliendo de una secuencia
+  y Django lo sigue usando como pk.
+- La restricción de no solapamiento se crea en cada partición (una tabla
+  particionada no la acepta hasta PostgreSQL 17). Es equivalente: solo
+  compara reservas de la misma fecha, que siempre caen en la misma partición.
+- `asegurar()` crea las particiones de los próximos meses y saca de la
+  predeterminada las filas de los meses que ya tienen partición; la corre
+  `manage.py mantener_reservas`, programado como tarea diaria. Si se atrasa
+  no se pierde nada: las reservas de un mes sin partición van a la
+  predeterminada hasta la siguiente corrida.
+
+En SQLite no hace nada: ahí el historial se archiva (reservas/historial.py).
+
+Ninguna tabla puede tener una clave foránea a reservas_reserva: con la
+clave primaria compuesta ya no hay un índice único sobre `id` al que
+apuntar. La migración 0010 se niega a correr si encuentra alguna y
+`apuntan_a_reserva()` permite verificarlo desde los modelos.
+
+Verificación (los tests de CI corren en SQLite y no pasan por aquí):
+
+- ParticionesPostgresTests en reservas/tests.py corre solo contra
+  PostgreSQL: ``DATABASE_URL=postgres://... python manage.py test reservas``.
+- Ensayo antes del deploy: restaurar un respaldo de producción en una base
+  aparte y correr ahí ``manage.py migrate`` y ``manage.py mantener_reservas``.
+  La migración compara las filas copiadas con las de la tabla original y,
+  si no coinciden, falla y se deshace entera (en PostgreSQL el DDL también
+  es transaccional). La conversión toma la tabla en exclusiva mientras copia: el
+  ensayo también da el tiempo de la ventana de mantenimiento.
+"""
+from datetime import date
+
+from django.db import connection, transaction
+
+from . import restricciones
+
+TABLA = 'reservas_reserva'
+PREDETERMINADA = 'reservas_reserva_otras'
+MESES_ADELANTE = 3
+
+
+def _mes(fecha):
+    return fecha.replace(day=1)
+
+
+def _siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def nombre(mes):
+    return f'{TABLA}_{mes:%Y_%m}'
+
+
+def _meses(desde, hasta):
+    mes = _mes(desde)
+    while mes <= hasta:
+        yield mes
+        mes = _siguiente(mes)
+
+
+def apuntan_a_reserva():
+    """Campos de cualquier modelo con una clave foránea a Reserva (debe quedar vacío)"""
+    from .models import Reserva
+    return [relacion.field for relacion in Reserva._meta.related_objects if relacion.field.concrete]
+
+
+def _restriccion(cursor, particion):
+    cursor.execute(restricciones.postgres_crear_en(particion))
+
+
+def existentes(cursor):
+    cursor.execute(
+        """
+        SELECT hija.relname
+        FROM pg_inherits
+        JOIN pg_class padre ON padre.oid = pg_inherits.inhparent
+        JOIN pg_class hija ON hija.oid = pg_inherits.inhrelid
+        WHERE padre.relname = %s
+        """,
+        [TABLA],
+    )
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def crear_particion(cursor, mes):
+    """
+    Crea la partición del mes. Se arma aparte y se adjunta al final porque
+    la predeterminada puede tener filas de ese mes: se mueven antes de
+    adjuntarla (si no, ATTACH falla).
+    """
+    particion, hasta = nombre(mes), _siguiente(mes)
+    cursor.execute(f'CREATE TABLE {particion} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f"""
+        WITH movidas AS (
+            DELETE FROM {PREDETERMINADA} WHERE fecha >= %s AND fecha < %s RETURNING *
+        )
+        INSERT INTO {particion} SELECT * FROM movidas
+        """,
+        [mes, hasta],
+    )
+    cursor.execute(
+        f"ALTER TABLE {TABLA} ATTACH PARTITION {particion} FOR VALUES FROM ('{mes}') TO ('{hasta}')"
+    )
+    _restriccion(cursor, particion)
+
+
+def asegurar(hoy=None, meses_adelante=MESES_ADELANTE):
+    """
+    Crea las particiones que falten desde el mes actual hasta `meses_adelante`
+    y las de los meses que tengan filas en la predeterminada. Devuelve los
+    nombres de las particiones creadas.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    hoy = hoy or date.today()
+    creadas = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        actuales = existentes(cursor)
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', fecha)::date FROM {PREDETERMINADA}")
+        meses = {fila[0] for fila in cursor.fetchall()}
+        fin = _mes(hoy)
+        for _ in range(meses_adelante):
+            fin = _siguiente(fin)
+        meses.update(_meses(hoy, fin))
+        for mes in sorted(meses):
+            if nombre(mes) not in actuales:
+                crear_particion(cursor, mes)
+                creadas.append(nombre(mes))
+    return creadas
+
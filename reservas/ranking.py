@@ -0,0 +1,53 @@
+"""
+Ranking de oficinas por reservas en un período.
+
+El puesto se calcula en la base de datos con RANK() sobre la suma de los
+resúmenes diarios de cada oficina: oficinas con la misma cantidad comparten
+puesto y la siguiente salta (1, 1, 3). Tanto el puesto de una oficina como
+el top N son una sola consulta, sin recorrer las oficinas en Python.
+"""
+from django.db import connection
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import Coalesce, Rank
+
+from .models import Oficina
+
+
+def tabla(desde, hasta):
+    """
+    Oficinas anotadas con total_reservas, minutos, puesto, empatadas (cuántas
+    comparten su puesto) y total_oficinas, ordenadas por puesto.
+    """
+    en_periodo = Q(resumenes_diarios__fecha__gte=desde, resumenes_diarios__fecha__lte=hasta)
+    return Oficina.objects.annotate(
+        total_reservas=Coalesce(Sum('resumenes_diarios__reservas', filter=en_periodo), 0),
+        minutos=Coalesce(Sum('resumenes_diarios__minutos', filter=en_periodo), 0),
+    ).annotate(
+        puesto=Window(Rank(), order_by=F('total_reservas').desc()),
+        empatadas=Window(Count('id'), partition_by=F('total_reservas')),
+        total_oficinas=Window(Count('id')),
+    ).order_by('puesto', 'numero')
+
+
+def posicion(oficina_id, desde, hasta):
+    """
+    (puesto, empatadas, total_oficinas) de una oficina, o None si no existe.
+
+    Una consulta: el filtro por id tiene que aplicarse sobre el ranking ya
+    calculado (un WHERE común se evaluaría antes que RANK()), por eso se
+    envuelve el SQL de tabla() en una subconsulta.
+    """
+    ranking_sql, parametros = tabla(desde, hasta).values(
+        'id', 'puesto', 'empatadas', 'total_oficinas'
+    ).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT puesto, empatadas, total_oficinas FROM ({ranking_sql}) ranking WHERE id = %s',
+            (*parametros, oficina_id),
+        )
+        return cursor.fetchone()
+
+
+def top(desde, hasta, limite=10):
+    """Las `limite` primeras oficinas del ranking"""
+    return list(tabla(desde, hasta)[:limite])
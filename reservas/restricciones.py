@@ -0,0 +1,95 @@
+"""
+Restricción de no solapamiento de reservas a nivel de base de datos.
+
+En PostgreSQL es una restricción de exclusión (sin bloquear la tabla); en
+SQLite, que se usa en desarrollo local y en los tests, se emula con triggers.
+La migración 0005 la crea con una copia congelada de este SQL. SQLite
+pierde los triggers cuando una migración reconstruye la tabla de reservas,
+por eso cualquier migración que altere ``Reserva`` debe volver a crearlos
+copiando ``SQLITE_CREAR`` en ella.
+
+Desde que la tabla está particionada en PostgreSQL (reservas/particiones.py)
+la restricción vive en cada partición: ver ``postgres_crear_en``.
+"""
+
+NOMBRE = 'reserva_sin_solapamiento'
+# SQLSTATE de PostgreSQL para exclusion_violation
+EXCLUSION_VIOLADA = '23P01'
+
+# PostgreSQL: restricción de exclusión sobre (espacio, [fecha + inicio, fecha + fin))
+POSTGRES_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    f"""
+    ALTER TABLE reservas_reserva
+    ADD CONSTRAINT {NOMBRE}
+    EXCLUDE USING gist (
+        espacio_id WITH =,
+        tsrange(fecha + hora_inicio, fecha + hora_fin, '[)') WITH &&
+    )
+    """,
+]
+POSTGRES_BORRAR = [
+    f"ALTER TABLE reservas_reserva DROP CONSTRAINT IF EXISTS {NOMBRE}",
+]
+
+
+def postgres_crear_en(particion):
+    """La misma restricción de exclusión sobre una partición de la tabla"""
+    return f"""
+    ALTER TABLE {particion}
+    ADD CONSTRAINT {particion}_sin_solapamiento
+    EXCLUDE USING gist (
+        espacio_id WITH =,
+        tsrange(fecha + hora_inicio, fecha + hora_fin, '[)') WITH &&
+    )
+    """
+
+
+def es_solapamiento(error):
+    """
+    True si el IntegrityError lo causó esta restricción y no otra (clave
+    foránea, NOT NULL, unique). En PostgreSQL se mira el SQLSTATE, que es el
+    mismo para la restricción de cada partición; en SQLite, el mensaje del
+    trigger.
+    """
+    causa = error.__cause__
+    codigo = getattr(causa, 'sqlstate', None) or getattr(causa, 'pgcode', None)
+    if codigo:
+        return codigo == EXCLUSION_VIOLADA
+    return NOMBRE in str(error)
+
+
+# SQLite (desarrollo local y tests): triggers equivalentes
+SQLITE_CONDICION = """
+    EXISTS (
+        SELECT 1 FROM reservas_reserva
+        WHERE espacio_id = NEW.espacio_id
+          AND fecha = NEW.fecha
+          AND hora_inicio < NEW.hora_fin
+          AND hora_fin > NEW.hora_inicio
+          {extra}
+    )
+"""
+SQLITE_CREAR = [
+    f"""
+    CREATE TRIGGER {NOMBRE}_insert
+    BEFORE INSERT ON reservas_reserva
+    FOR EACH ROW WHEN {SQLITE_CONDICION.format(extra='')}
+    BEGIN
+        SELECT RAISE(ABORT, '{NOMBRE}');
+    END
+    """,
+    f"""
+    CREATE TRIGGER {NOMBRE}_update
+    BEFORE UPDATE OF espacio_id, fecha, hora_inicio, hora_fin ON reservas_reserva
+    FOR EACH ROW WHEN {SQLITE_CONDICION.format(extra='AND id != NEW.id')}
+    BEGIN
+        SELECT RAISE(ABORT, '{NOMBRE}');
+    END
+    """,
+]
+SQLITE_BORRAR = [
+    f"DROP TRIGGER IF EXISTS {NOMBRE}_insert",
+    f"DROP TRIGGER IF EXISTS {NOMBRE}_update",
+]
+
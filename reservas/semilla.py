@@ -0,0 +1,209 @@
+"""
+Datos sintéticos de oficinas, espacios y reservas para pruebas de carga.
+
+Con la misma semilla se generan siempre los mismos datos. Las reservas salen
+de un generador día por día y se insertan con bulk_create por lotes, así la
+memoria no depende de cuántas se creen. Al final se reconstruyen las tablas
+derivadas (ocupación y resúmenes) como lo harían los comandos reconstruir_*
+y se invalidan las lecturas cacheadas, porque bulk_create no dispara señales.
+
+Distribuciones:
+- horarios de cada espacio según su plantilla (reservas/horarios.py);
+- más demanda en horas pico y días hábiles que en fines de semana;
+- reservas de varios bloques seguidos de la misma oficina;
+- pocas oficinas concentran la mayoría de reservas (ley de potencias);
+- estacionamientos de visita con nombre, placa y empresa del visitante.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import estadisticas, horarios, ocupacion, versiones
+from .models import Espacio, Oficina, Reserva
+
+PREFIJO_USUARIO = 'semilla'
+CLAVE = 'clave-semilla-123'
+
+# Mezcla de tipos que se repite al crear espacios: la mayoría son
+# estacionamientos y salas, como en el edificio
+PATRON_TIPOS = (
+    'sala', 'estacionamiento', 'sala', 'estacionamiento', 'directorio',
+    'estacionamiento', 'sala', 'terraza', 'estacionamiento', 'comedor',
+)
+
+# Probabilidad de que un bloque libre empiece una reserva, por tipo
+DEMANDA = {
+    'sala': 0.30,
+    'directorio': 0.18,
+    'terraza': 0.12,
+    'estacionamiento': 0.35,
+    'comedor': 0.40,
+}
+
+# Peso relativo de cada hora de inicio; las que no aparecen valen 0.5
+HORAS_PICO = {
+    'sala': {9: 1.6, 10: 1.8, 11: 1.5, 12: 0.8, 13: 0.6, 14: 1.4, 15: 1.6, 16: 1.2, 17: 0.6},
+    'directorio': {9: 1.5, 10: 1.8, 11: 1.4, 15: 1.4, 16: 1.2},
+    'terraza': {17: 1.2, 18: 1.8, 19: 2.0, 20: 1.5, 21: 0.8},
+    'estacionamiento': {8: 1.2, 9: 1.8, 10: 1.6, 14: 1.4, 15: 1.5, 16: 1.0},
+    'comedor': {8: 1.0, 9: 1.4, 10: 1.2},
+}
+
+# Cantidad de bloques seguidos de una reserva: (bloques, peso)
+DURACIONES = {
+    'sala': ((1, 50), (2, 30), (3, 12), (4, 8)),
+    'directorio': ((2, 55), (3, 25), (4, 20)),
+    'terraza': ((1, 30), (2, 45), (3, 25)),
+    'estacionamiento': ((1, 25), (2, 25), (3, 20), (4, 15), (8, 15)),
+    'comedor': ((1, 80), (2, 20)),
+}
+
+FACTOR_FIN_DE_SEMANA = {'terraza': 0.6}
+FACTOR_FIN_DE_SEMANA_DEFECTO = 0.1
+
+NOMBRES = ('Ana', 'Luis', 'María', 'Jorge', 'Rosa', 'Carlos', 'Lucía', 'Pedro', 'Sofía', 'Diego')
+APELLIDOS = ('Quispe', 'Flores', 'García', 'Rojas', 'Torres', 'Díaz', 'Vargas', 'Castro', 'Ramos', 'Mendoza')
+EMPRESAS = ('Consultora Andina', 'Logística Sur', 'Estudio Legal Prado', 'TecnoPerú', 'Inversiones Lima')
+LETRAS_PLACA = 'ABCDEFGHJKLMNPRSTUVWXYZ'
+
+
+def crear_oficinas(cantidad, rng, batch_size=1000):
+    """`cantidad` oficinas con su usuario, todas con la clave CLAVE"""
+    # Un solo hash para todos: make_password es deliberadamente lento
+    clave = make_password(CLAVE)
+    nombres = [f'{PREFIJO_USUARIO}{n:05d}' for n in range(1, cantidad + 1)]
+    User.objects.bulk_create([User(username=nombre, password=clave) for nombre in nombres], batch_size=batch_size)
+    usuarios = User.objects.filter(username__in=nombres).order_by('username')
+    return Oficina.objects.bulk_create([
+        Oficina(user=usuario, numero=str(101 + n), nombre_empresa=f'{rng.choice(EMPRESAS)} {n + 1}')
+        for n, usuario in enumerate(usuarios)
+    ], batch_size=batch_size)
+
+
+def crear_espacios(cantidad, oficinas):
+    """Espacios según PATRON_TIPOS; uno de cada dos estacionamientos es de visita"""
+    espacios = []
+    estacionamientos = 0
+    for n in range(cantidad):
+        tipo = PATRON_TIPOS[n % len(PATRON_TIPOS)]
+        espacio = Espacio(nombre=f'{tipo.capitalize()} {n + 1}', tipo=tipo)
+        if tipo == 'estacionamiento':
+            espacio.es_estacionamiento_visita = estacionamientos % 2 == 0
+            if not espacio.es_estacionamiento_visita and oficinas:
+                espacio.oficina_propietaria = oficinas[estacionamientos % len(oficinas)]
+            estacionamientos += 1
+        espacios.append(espacio)
+    return Espacio.objects.bulk_create(espacios)
+
+
+def _pesos_acumulados(cantidad, rng):
+    """Pesos 1/rango^0.8 repartidos al azar: pocas oficinas reservan mucho"""
+    pesos = [1 / (rango ** 0.8) for rango in range(1, cantidad + 1)]
+    rng.shuffle(pesos)
+    acumulados, total = [], 0
+    for peso in pesos:
+        total += peso
+        acumulados.append(total)
+    return acumulados
+
+
+def _visitante(rng):
+    placa = ''.join(rng.choice(LETRAS_PLACA) for _ in range(3)) + f'-{rng.randrange(1000):03d}'
+    return {
+        'nombre_visitante': f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}',
+        'placa_visitante': placa,
+        'empresa_visitante': rng.choice(EMPRESAS),
+    }
+
+
+def generar_reservas(oficinas, espacios, rng, hasta):
+    """
+    Genera Reserva sin guardar, un bloque por fila, recorriendo los días
+    hacia atrás desde `hasta`. Es infinito: quien lo consume decide cuándo
+    parar.
+    """
+    acumulados = _pesos_acumulados(len(oficinas), rng)
+    planes = []
+    for espacio in espacios:
+        plantilla = horarios.para_espacio(espacio)
+        pico = HORAS_PICO.get(espacio.tipo, {})
+        duraciones, pesos = zip(*DURACIONES.get(espacio.tipo, DURACIONES['sala']))
+        planes.append((
+            espacio,
+            plantilla.intervalos,
+            [DEMANDA.get(espacio.tipo, 0.3) * pico.get(inicio.hour, 0.5) for inicio, _ in plantilla.intervalos],
+            duraciones,
+            pesos,
+            FACTOR_FIN_DE_SEMANA.get(espacio.tipo, FACTOR_FIN_DE_SEMANA_DEFECTO),
+        ))
+
+    fecha = hasta
+    while True:
+        fin_de_semana = fecha.weekday() >= 5
+        for espacio, intervalos, probabilidades, duraciones, pesos, factor in planes:
+            factor_dia = factor if fin_de_semana else 1.0
+            bloque = 0
+            while bloque < len(intervalos):
+                if rng.random() >= probabilidades[bloque] * factor_dia:
+                    bloque += 1
+                    continue
+                if espacio.oficina_propietaria_id:
+                    oficina = espacio.oficina_propietaria
+                else:
+                    oficina = rng.choices(oficinas, cum_weights=acumulados)[0]
+                datos = _visitante(rng) if espacio.es_estacionamiento_visita else {}
+                seguidos = rng.choices(duraciones, weights=pesos)[0]
+                for inicio, fin in intervalos[bloque:bloque + seguidos]:
+                    yield Reserva(
+                        oficina=oficina, espacio=espacio, fecha=fecha,
+                        hora_inicio=inicio, hora_fin=fin, **datos
+                    )
+                bloque += seguidos
+        fecha -= timedelta(days=1)
+
+
+def poblar(oficinas=20, espacios=10, reservas=2000, semilla=1, hoy=None, dias_futuros=30,
+           batch_size=5000, progreso=None):
+    """
+    Crea las oficinas, los espacios y `reservas` reservas que terminan
+    `dias_futuros` días después de `hoy` y van hacia atrás lo que haga falta.
+    `progreso(creadas)` se llama después de cada lote.
+    Devuelve (oficinas, espacios, reservas creadas, primera fecha).
+    """
+    rng = random.Random(semilla)
+    hoy = hoy or date.today()
+    lista_oficinas = crear_oficinas(oficinas, rng)
+    lista_espacios = crear_espacios(espacios, lista_oficinas)
+
+    creadas = 0
+    primera = hoy
+    buffer = []
+    generador = generar_reservas(lista_oficinas, lista_espacios, rng, hoy + timedelta(days=dias_futuros))
+    for reserva in generador:
+        if creadas + len(buffer) >= reservas:
+            break
+        buffer.append(reserva)
+        if len(buffer) >= batch_size:
+            creadas += _guardar(buffer)
+            primera = buffer[-1].fecha
+            buffer = []
+            if progreso:
+                progreso(creadas)
+    if buffer:
+        creadas += _guardar(buffer)
+        primera = buffer[-1].fecha
+    generador.close()
+
+    ocupacion.reconstruir(batch_size=batch_size)
+    estadisticas.reconstruir(batch_size=batch_size)
+    # Disponibilidad y calendario dependen de 'espacios'; el panel, del ranking
+    versiones.incrementar('espacios', 'ranking')
+    return lista_oficinas, lista_espacios, creadas, min(primera, hoy)
+
+
+def _guardar(buffer):
+    with transaction.atomic():
+        return len(Reserva.objects.bulk_create(buffer))
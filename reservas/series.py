@@ -0,0 +1,158 @@
+"""
+Reservas periódicas (SerieReserva).
+
+Una serie se expande en sus fechas y se verifica contra las reservas
+existentes con una sola consulta por rango de fechas; las fechas que chocan
+se informan una por una y las libres se crean con bulk_create en una sola
+transacción, con un único recálculo de los datos derivados.
+"""
+import calendar
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+
+from . import cancelacion, disponibilidad, restricciones, sincronizacion
+from .models import Reserva, SerieReserva
+
+# Dos años de una serie semanal
+MAX_FECHAS = 104
+TAM_LOTE = 500
+
+PASOS = {
+    'semanal': timedelta(weeks=1),
+    'quincenal': timedelta(weeks=2),
+}
+
+
+class SerieInvalida(ValueError):
+    """Los parámetros de la serie no describen ninguna fecha válida"""
+
+
+class ResultadoSerie:
+    def __init__(self, serie, creadas, conflictos):
+        self.serie = serie
+        self.creadas = creadas
+        # Lista de (fecha, bloque) con el primer bloque que choca en cada fecha
+        self.conflictos = conflictos
+
+    @property
+    def fechas_creadas(self):
+        return sorted({reserva.fecha for reserva in self.creadas})
+
+
+def _sumar_meses(fecha, meses):
+    # El 31 de un mes corto pasa al último día de ese mes
+    anio, mes = divmod(fecha.month - 1 + meses, 12)
+    anio, mes = fecha.year + anio, mes + 1
+    return fecha.replace(year=anio, month=mes, day=min(fecha.day, calendar.monthrange(anio, mes)[1]))
+
+
+def expandir(fecha_inicio, frecuencia, hasta=None, repeticiones=None):
+    """Fechas de la serie desde fecha_inicio hasta `hasta` o `repeticiones` fechas"""
+    if frecuencia not in dict(SerieReserva.FRECUENCIAS):
+        raise SerieInvalida(f'Frecuencia inválida: {frecuencia}')
+    if hasta is None and not repeticiones:
+        raise SerieInvalida('Indique una fecha de término o una cantidad de repeticiones')
+    if hasta is not None and hasta < fecha_inicio:
+        raise SerieInvalida('La fecha de término es anterior a la de inicio')
+
+    fechas = []
+    while len(fechas) <= MAX_FECHAS:
+        if frecuencia == 'mensual':
+            fecha = _sumar_meses(fecha_inicio, len(fechas))
+        else:
+            fecha = fecha_inicio + PASOS[frecuencia] * len(fechas)
+        if (hasta is not None and fecha > hasta) or (repeticiones and len(fechas) == repeticiones):
+            break
+        fechas.append(fecha)
+    if len(fechas) > MAX_FECHAS:
+        raise SerieInvalida(f'Una serie puede tener como máximo {MAX_FECHAS} fechas')
+    return fechas
+
+
+def agendas(espacio, fechas, intervalos):
+    """
+    AgendaDia de cada fecha con una sola consulta sobre el rango completo.
+    Solo trae las reservas que caen dentro del horario de la serie.
+    """
+    por_fecha = {fecha: [] for fecha in fechas}
+    existentes = Reserva.objects.filter(
+        espacio=espacio,
+        fecha__range=(fechas[0], fechas[-1]),
+        hora_inicio__lt=max(fin for _, fin in intervalos),
+        hora_fin__gt=min(inicio for inicio, _ in intervalos),
+    ).values_list('fecha', 'hora_inicio', 'hora_fin')
+    for fecha, inicio, fin in existentes:
+        if fecha in por_fecha:
+            por_fecha[fecha].append((inicio, fin))
+    return {fecha: disponibilidad.AgendaDia(ocupados) for fecha, ocupados in por_fecha.items()}
+
+
+def planificar(espacio, fechas, validos):
+    """Separa las fechas libres de las que chocan: (libres, [(fecha, bloque)])"""
+    libres, conflictos = [], []
+    for fecha, agenda in agendas(espacio, fechas, [(inicio, fin) for _, inicio, fin in validos]).items():
+        try:
+            disponibilidad.validar_bloques(agenda, validos)
+        except disponibilidad.ConflictoHorario as e:
+            conflictos.append((fecha, e.bloque))
+        else:
+            libres.append(fecha)
+    return libres, conflictos
+
+
+def crear_serie(oficina, espacio, fecha_inicio, bloques, frecuencia, hasta=None, repeticiones=None,
+                nombre_visitante='', placa_visitante='', empresa_visitante=''):
+    """
+    Crea las reservas de todas las fechas libres de la serie y devuelve un
+    ResultadoSerie. Si ninguna fecha está libre no se crea la serie.
+    """
+    validos = disponibilidad.parsear_bloques(bloques)
+    if not validos:
+        raise SerieInvalida('Seleccione al menos un bloque')
+    fechas = expandir(fecha_inicio, frecuencia, hasta, repeticiones)
+    datos = dict(
+        oficina=oficina, espacio=espacio, frecuencia=frecuencia, fechas=fechas, validos=validos,
+        nombre_visitante=nombre_visitante, placa_visitante=placa_visitante, empresa_visitante=empresa_visitante,
+    )
+    try:
+        return _crear(**datos)
+    except IntegrityError as e:
+        if not restricciones.es_solapamiento(e):
+            raise
+        # Otra oficina reservó entre la lectura y la escritura: al repetir,
+        # esa fecha aparece como conflicto
+        return _crear(**datos)
+
+
+def _crear(oficina, espacio, frecuencia, fechas, validos, **visitante):
+    with transaction.atomic():
+        libres, conflictos = planificar(espacio, fechas, validos)
+        if not libres:
+            return ResultadoSerie(None, [], conflictos)
+        serie = SerieReserva.objects.create(
+            oficina=oficina,
+            espacio=espacio,
+            frecuencia=frecuencia,
+            fecha_inicio=fechas[0],
+            fecha_fin=fechas[-1],
+            bloques=[bloque for bloque, _, _ in validos],
+        )
+        creadas = Reserva.objects.bulk_create([
+            Reserva(oficina=oficina, espacio=espacio, serie=serie, fecha=fecha,
+                    hora_inicio=inicio, hora_fin=fin, **visitante)
+            for fecha in libres
+            for _, inicio, fin in validos
+        ], batch_size=TAM_LOTE)
+        # bulk_create no dispara señales
+        sincronizacion.reservas_creadas(creadas)
+    return ResultadoSerie(serie, creadas, conflictos)
+
+
+def cancelar_serie(serie, desde=None):
+    """
+    Cancela las reservas de la serie (desde una fecha, si se indica) con un
+    solo DELETE; la serie se borra cuando no le quedan reservas. Devuelve el
+    Resumen de reservas/cancelacion.py.
+    """
+    return cancelacion.cancelar(serie.oficina_id, serie=serie, desde=desde)
@@ -0,0 +1,58 @@
+"""
+Señales de Reserva que mantienen sincronizados los datos derivados, de
+Espacio que descartan su plantilla de horarios compilada y la versión del
+calendario, y de Oficina que invalidan el ranking cacheado.
+
+Las altas masivas (bulk_create) no disparan señales, así que el motor de
+disponibilidad llama a reservas/sincronizacion.py por su cuenta.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import horarios, sincronizacion, versiones
+from .models import Espacio, Oficina, Reserva
+
+
+@receiver(pre_save, sender=Reserva)
+def recordar_version_anterior(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    # Una edición se registra como baja de la versión anterior + alta de la nueva
+    instance._anterior = Reserva.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Reserva)
+def reserva_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_anterior', None)
+    with sincronizacion.lote():
+        if anterior is not None:
+            sincronizacion.reservas_eliminadas([anterior])
+        sincronizacion.reservas_creadas([instance])
+    instance._anterior = None
+
+
+@receiver(post_delete, sender=Reserva)
+def reserva_eliminada(sender, instance, **kwargs):
+    sincronizacion.reservas_eliminadas([instance])
+
+
+@receiver(post_save, sender=Espacio)
+@receiver(post_delete, sender=Espacio)
+def espacio_modificado(sender, instance, **kwargs):
+    horarios.invalidar(instance.pk)
+    # El calendario del edificio lista los espacios activos
+    versiones.incrementar('espacios')
+
+
+@receiver(post_save, sender=Oficina)
+def oficina_guardada(sender, instance, created=False, raw=False, **kwargs):
+    # El total de oficinas del ranking solo cambia con altas y bajas
+    if created and not raw:
+        versiones.incrementar('ranking')
+
+
+@receiver(post_delete, sender=Oficina)
+def oficina_eliminada(sender, instance, **kwargs):
+    versiones.incrementar('ranking')
@@ -0,0 +1,73 @@
+"""
+Punto único para mantener los datos derivados de Reserva.
+
+Cada alta o baja de reservas actualiza la ocupación diaria (ocupacion.py) y
+los resúmenes del panel (estadisticas.py) dentro de la misma transacción,
+incrementa las versiones de cache (versiones.py) de lo que haya cambiado y
+publica los eventos en vivo (eventos.py) al confirmarse.
+Las señales de Reserva llaman aquí para los save()/delete() individuales; las
+operaciones masivas (bulk_create, borrados por queryset) lo hacen
+explícitamente o dentro de `lote()`, que junta todos los cambios y los aplica
+una sola vez al salir.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import estadisticas, eventos, ocupacion, versiones
+
+_estado = threading.local()
+
+
+def reservas_creadas(reservas):
+    _registrar(reservas, 1)
+
+
+def reservas_eliminadas(reservas):
+    _registrar(reservas, -1)
+
+
+def _registrar(reservas, signo):
+    cambios = [(reserva, signo) for reserva in reservas]
+    pendientes = getattr(_estado, 'pendientes', None)
+    if pendientes is None:
+        _aplicar(cambios)
+    else:
+        pendientes.extend(cambios)
+
+
+def _aplicar(cambios):
+    if not cambios:
+        return
+    ocupacion.recalcular({(reserva.espacio_id, reserva.fecha) for reserva, _ in cambios})
+    estadisticas.acumular(cambios)
+
+    reservas = [reserva for reserva, _ in cambios]
+    nombres = {f'oficina:{reserva.oficina_id}' for reserva in reservas}
+    nombres.update(f'mes:{reserva.fecha:%Y-%m}' for reserva in reservas)
+    nombres.update(f'dia:{reserva.espacio_id}:{reserva.fecha.isoformat()}' for reserva in reservas)
+    # El ranking cuenta las reservas del mes hasta hoy; un día de margen
+    # porque las vistas usan date.today() y no la fecha local
+    hoy = timezone.localdate()
+    desde = (hoy - timedelta(days=1)).replace(day=1)
+    if any(desde <= reserva.fecha <= hoy + timedelta(days=1) for reserva in reservas):
+        nombres.add('ranking')
+    versiones.incrementar(*sorted(nombres))
+    eventos.reservas_cambiadas(cambios)
+
+
+@contextmanager
+def lote():
+    """Acumula las altas y bajas y actualiza los datos derivados una sola vez"""
+    if getattr(_estado, 'pendientes', None) is not None:
+        yield
+        return
+    _estado.pendientes = []
+    try:
+        yield
+        pendientes = _estado.pendientes
+    finally:
+        _estado.pendientes = None
+    _aplicar(pendientes)
@@ -1,3 +1,1095 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time as reloj
+from datetime import date, time, timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import (
+    agrupacion, cancelacion, disponibilidad, estadisticas, eventos, historial, horarios, importacion, ocupacion,
+    particiones, ranking, restricciones, semilla, series, versiones, views,
+)
+from .models import (
+    Oficina, Espacio, Reserva, OcupacionDiaria, ReservaArchivada, SerieReserva,
+    ResumenDiarioEspacio, ResumenDiarioHora, ResumenDiarioOficina,
+)
+
+
+def crear_oficina(numero='101'):
+    user = User.objects.create_user(username=f'oficina{numero}', password='clave-segura-123')
+    return Oficina.objects.create(user=user, numero=numero, nombre_empresa=f'Empresa {numero}')
+
+
+class DisponibilidadTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.fecha = date.today() + timedelta(days=1)
+
+    def test_agenda_detecta_cruces(self):
+        agenda = disponibilidad.AgendaDia([(time(9), time(11)), (time(14), time(15))])
+        self.assertTrue(agenda.ocupado(time(10), time(12)))
+        self.assertTrue(agenda.ocupado(time(8), time(10)))
+        self.assertFalse(agenda.ocupado(time(11), time(14)))
+        self.assertFalse(agenda.ocupado(time(15), time(16)))
+
+    def test_reservar_crea_todos_los_bloques(self):
+        # savepoint, ocupación, bulk_create, recálculo de ocupación (lectura + upsert),
+        # un upsert por resumen diario y release: no depende de la cantidad de bloques
+        with self.assertNumQueries(9):
+            creadas = disponibilidad.reservar(
+                self.oficina, self.sala, self.fecha, ['08:00-09:00', '09:00-10:00', '10:00-11:00']
+            )
+        self.assertEqual(len(creadas), 3)
+        self.assertEqual(Reserva.objects.filter(espacio=self.sala).count(), 3)
+
+    def test_conflicto_no_deja_reserva_parcial(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['10:00-11:00'])
+        with self.assertRaises(disponibilidad.ConflictoHorario) as ctx:
+            disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['09:00-10:00', '10:00-11:00'])
+        self.assertEqual(ctx.exception.bloque, '10:00-11:00')
+        self.assertEqual(Reserva.objects.filter(espacio=self.sala).count(), 1)
+
+    def test_la_restriccion_cubre_una_lectura_desactualizada(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['10:00-11:00'])
+        # Como si la otra reserva se hubiera confirmado después de la verificación previa
+        with mock.patch.object(disponibilidad, 'cargar_agenda', return_value=disponibilidad.AgendaDia()):
+            with self.assertRaises(disponibilidad.ConflictoHorario) as ctx:
+                disponibilidad.reservar(crear_oficina('202'), self.sala, self.fecha, ['09:00-10:00', '10:00-11:00'])
+        self.assertEqual(ctx.exception.bloque, '10:00-11:00')
+        self.assertEqual(Reserva.objects.filter(espacio=self.sala).count(), 1)
+
+    def test_otros_errores_de_integridad_no_son_conflictos(self):
+        with self.assertRaises(IntegrityError):
+            disponibilidad.reservar(None, self.sala, self.fecha, ['09:00-10:00'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'quita los triggers de SQLite dentro del test')
+    def test_la_migracion_lista_las_reservas_solapadas(self):
+        migracion = importlib.import_module('reservas.migrations.0005_reserva_indices_y_solapamiento')
+        with connection.cursor() as cursor:
+            for sql in migracion.SQLITE_BORRAR:
+                cursor.execute(sql)
+        primera = Reserva.objects.create(oficina=self.oficina, espacio=self.sala, fecha=self.fecha,
+                                         hora_inicio=time(9), hora_fin=time(11))
+        segunda = Reserva.objects.create(oficina=self.oficina, espacio=self.sala, fecha=self.fecha,
+                                         hora_inicio=time(10), hora_fin=time(12))
+        Reserva.objects.create(oficina=self.oficina, espacio=self.sala, fecha=self.fecha,
+                               hora_inicio=time(12), hora_fin=time(13))
+        with self.assertRaises(RuntimeError) as ctx:
+            migracion.verificar_sin_solapamientos(None, SimpleNamespace(connection=connection))
+        self.assertIn('(1 pares)', str(ctx.exception))
+        self.assertIn(f'reservas {primera.id} y {segunda.id}', str(ctx.exception))
+
+    def test_bloques_repetidos_en_el_mismo_formulario(self):
+        with self.assertRaises(disponibilidad.ConflictoHorario):
+            disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['09:00-10:00', '09:00-10:00'])
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_vista_previa_y_registro_coinciden(self):
+        cache.clear()
+        self.client.force_login(self.oficina.user)
+        self.client.post(reverse('nueva_reserva'), {
+            'espacio': self.sala.id,
+            'fecha': self.fecha.isoformat(),
+            'bloques_horarios': ['09:00-10:00', '10:00-11:00'],
+        })
+        response = self.client.get(reverse('verificar_disponibilidad_ajax'), {
+            'espacio_id': self.sala.id,
+            'fecha': self.fecha.isoformat(),
+        })
+        ocupados = [h['inicio'] for h in response.json()['horarios'] if h['ocupado']]
+        self.assertEqual(ocupados, ['09:00', '10:00'])
+
+
+class HorariosTests(TestCase):
+    def test_plantillas_por_tipo(self):
+        comedor = horarios.compilar('comedor')
+        self.assertEqual(comedor.bloques, ('08:00-09:00', '09:00-10:00', '10:00-11:00'))
+        self.assertEqual(comedor.etiquetas[0], '8:00 AM - 9:00 AM')
+        self.assertEqual(horarios.compilar('sala').etiquetas[4], '12:00 PM - 1:00 PM')
+        self.assertEqual(len(horarios.compilar('estacionamiento')), 15)
+
+    def test_horarios_personalizados_y_cache(self):
+        sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        plantilla = horarios.para_espacio(sala)
+        self.assertIs(horarios.para_espacio(Espacio.objects.get(pk=sala.pk)), plantilla)
+
+        sala.usar_horarios_personalizados = True
+        sala.horarios_personalizados = [{'inicio': '7:30', 'fin': '9:00'}, '13:00-14:00']
+        sala.save()
+        self.assertEqual(horarios.para_espacio(sala).bloques, ('07:30-09:00', '13:00-14:00'))
+
+        # Una instancia modificada en otro proceso también se recompila
+        Espacio.objects.filter(pk=sala.pk).update(usar_horarios_personalizados=False)
+        self.assertEqual(len(horarios.para_espacio(Espacio.objects.get(pk=sala.pk))), 10)
+
+    def test_nueva_reserva_rechaza_bloques_fuera_de_la_plantilla(self):
+        oficina = crear_oficina()
+        terraza = Espacio.objects.create(nombre='Terraza', tipo='terraza')
+        self.client.force_login(oficina.user)
+        self.client.post(reverse('nueva_reserva'), {
+            'espacio': terraza.id,
+            'fecha': (date.today() + timedelta(days=1)).isoformat(),
+            'bloques_horarios': ['09:00-10:00'],
+        })
+        self.assertFalse(Reserva.objects.exists())
+
+
+class MatrizDisponibilidadTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.otra_sala = Espacio.objects.create(
+            nombre='Sala 2', tipo='sala', usar_horarios_personalizados=True,
+            horarios_personalizados=['08:15-09:15', '09:15-10:15'],
+        )
+        self.hoy = date.today()
+        self.client.force_login(self.oficina.user)
+
+    def test_matriz_de_varios_espacios_y_dias(self):
+        manana = self.hoy + timedelta(days=1)
+        disponibilidad.reservar(self.oficina, self.sala, manana, ['09:00-10:00'])
+        disponibilidad.reservar(self.oficina, self.otra_sala, self.hoy, ['08:15-09:15'])
+        # Sesión, usuario, espacios, máscaras de la sala y reservas de la sala con horario propio
+        with self.assertNumQueries(5):
+            data = self.client.get(reverse('matriz_disponibilidad_ajax'), {
+                'tipo': 'sala', 'desde': self.hoy.isoformat(), 'hasta': manana.isoformat(),
+            }).json()
+        self.assertEqual(data['fechas'], [self.hoy.isoformat(), manana.isoformat()])
+        sala, otra_sala = data['espacios']
+        self.assertEqual(sala['ocupado'][0], [0] * 10)
+        self.assertEqual(sala['ocupado'][1], [0, 1] + [0] * 8)
+        self.assertEqual(otra_sala['ocupado'], [[1, 0], [0, 0]])
+
+    def test_limite_de_tamano(self):
+        response = self.client.get(reverse('matriz_disponibilidad_ajax'), {
+            'espacios': f'{self.sala.id}', 'desde': self.hoy.isoformat(),
+            'hasta': (self.hoy + timedelta(days=60)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class DisponibilidadCacheadaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.fecha = date.today() + timedelta(days=2)
+        self.client.force_login(self.oficina.user)
+
+    def pedir(self, **headers):
+        return self.client.get(reverse('verificar_disponibilidad_ajax'), {
+            'espacio_id': self.sala.id, 'fecha': self.fecha.isoformat(),
+        }, headers=headers)
+
+    def test_repeticiones_no_consultan_la_base_de_datos(self):
+        with CaptureQueriesContext(connection) as primera:
+            response = self.pedir()
+        # Sin validadores: solo sesión y usuario, el JSON sale de la cache
+        with self.assertNumQueries(2):
+            self.assertEqual(self.pedir().content, response.content)
+        self.assertGreater(len(primera), 2)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.pedir(if_none_match=response['ETag']).status_code, 304)
+
+        # Sin sesión no hay 304 ni ETag que revelen si cambió la ocupación
+        self.client.logout()
+        anonimo = self.pedir(if_none_match=response['ETag'])
+        self.assertEqual(anonimo.status_code, 302)
+        self.assertFalse(anonimo.has_header('ETag'))
+
+    def test_horario_mal_configurado_no_es_un_error_de_fecha(self):
+        # Guardado sin clean(), como quedaría un dato viejo
+        Espacio.objects.filter(pk=self.sala.pk).update(
+            usar_horarios_personalizados=True, horarios_personalizados=['25:00-26:00'],
+        )
+        response = self.pedir()
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('Hora inválida', response.json()['error'])
+
+    def test_reserva_invalida_la_respuesta(self):
+        etag = self.pedir()['ETag']
+        disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['09:00-10:00'])
+        response = self.pedir(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        ocupados = [h['inicio'] for h in response.json()['horarios'] if h['ocupado']]
+        self.assertEqual(ocupados, ['09:00'])
+
+        Reserva.objects.get().delete()
+        ocupados = [h['inicio'] for h in self.pedir().json()['horarios'] if h['ocupado']]
+        self.assertEqual(ocupados, [])
+
+    async def test_vistas_async_responden_igual_que_las_sync(self):
+        await sync_to_async(disponibilidad.reservar)(self.oficina, self.sala, self.fecha, ['10:00-11:00'])
+        await self.async_client.aforce_login(self.oficina.user)
+        for nombre, vista_sync, parametros in (
+            ('verificar_disponibilidad_ajax', views.verificar_disponibilidad_ajax,
+             {'espacio_id': self.sala.id, 'fecha': self.fecha.isoformat()}),
+            ('calendario_ocupacion_ajax', views.obtener_calendario_ocupacion_ajax,
+             {'espacio_id': self.sala.id, 'mes': self.fecha.strftime('%Y-%m')}),
+        ):
+            asincrona = await self.async_client.get(reverse(nombre), parametros)
+            request = RequestFactory().get('/', parametros)
+            request.user = self.oficina.user
+            sincrona = await sync_to_async(vista_sync)(request)
+            self.assertEqual(asincrona.status_code, 200)
+            self.assertEqual(asincrona.json(), json.loads(sincrona.content))
+
+
+class EventosEnVivoTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.fecha = date.today() + timedelta(days=1)
+
+    def test_reservas_publican_al_confirmar(self):
+        with mock.patch.object(eventos, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['09:00-10:00', '10:00-11:00'])
+                publicar.assert_not_called()
+        publicados = dict(call.args for call in publicar.call_args_list)
+        self.assertEqual(publicados[eventos.tema_dia(self.sala.id, self.fecha)]['bloques'],
+                         ['09:00-10:00', '10:00-11:00'])
+        self.assertEqual(publicados[eventos.TEMA_PANEL]['cambios'],
+                         [{'fecha': self.fecha.isoformat(), 'reservas': 2, 'minutos': 120}])
+
+    async def test_flujo_sse_del_dia(self):
+        await self.async_client.aforce_login(self.oficina.user)
+        response = await self.async_client.get(reverse('eventos_sse'), {
+            'espacio_id': self.sala.id, 'fecha': self.fecha.isoformat(),
+        })
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        contenido = aiter(response.streaming_content)
+        self.assertEqual(await anext(contenido), b'retry: 3000\n\n')
+        self.assertEqual(await anext(contenido), b': ping\n\n')
+
+        eventos.publicar(eventos.tema_dia(self.sala.id, self.fecha), {'tipo': 'reserva', 'bloques': ['09:00-10:00']})
+        mensaje = await anext(contenido)
+        self.assertTrue(mensaje.startswith(b'event: reserva\ndata: '))
+        await contenido.aclose()
+
+    def test_requiere_asgi(self):
+        self.client.force_login(self.oficina.user)
+        response = self.client.get(reverse('eventos_sse'), {'panel': '1'})
+        self.assertEqual(response.status_code, 503)
+
+
+class CalendarioEdificioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.terraza = Espacio.objects.create(nombre='Terraza', tipo='terraza')
+        self.fecha = date(2030, 3, 10)
+        self.client.force_login(self.oficina.user)
+
+    def pedir(self, **headers):
+        return self.client.get(reverse('calendario_edificio_ajax'), {'mes': '2030-03'}, headers=headers)
+
+    def test_mes_sin_cambios_responde_304(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['08:00-09:00', '10:00-11:00'])
+        response = self.pedir()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        espacios = {e['nombre']: e['reservas_por_dia'] for e in response.json()['espacios']}
+        self.assertEqual(espacios['Sala 1'][9], 2)
+        self.assertEqual(len(espacios['Terraza']), 31)
+
+        # Solo sesión y usuario
+        with self.assertNumQueries(2):
+            response = self.pedir(if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # Una reserva en otro mes no cambia este; una en el mismo mes sí
+        etag = response['ETag']
+        disponibilidad.reservar(self.oficina, self.sala, date(2030, 4, 1), ['08:00-09:00'])
+        self.assertEqual(self.pedir(if_none_match=etag).status_code, 304)
+        disponibilidad.reservar(self.oficina, self.terraza, self.fecha, ['15:00-16:00'])
+        self.assertEqual(self.pedir(if_none_match=etag).status_code, 200)
+
+
+class OcupacionDiariaTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.fecha = date.today() + timedelta(days=1)
+
+    def mascara_actual(self):
+        return OcupacionDiaria.objects.get(espacio=self.sala, fecha=self.fecha).mascara
+
+    def test_mascara_por_slots(self):
+        self.assertEqual(ocupacion.mascara(time(0), time(1)), 0b11)
+        self.assertEqual(ocupacion.mascara(time(9, 15), time(9, 45)), 0b11 << 18)
+        self.assertTrue(ocupacion.alineado(time(8), time(9, 30)))
+        self.assertFalse(ocupacion.alineado(time(8, 10), time(9)))
+
+    def test_sincroniza_altas_y_bajas(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['09:00-10:00', '10:00-11:00'])
+        self.assertEqual(self.mascara_actual(), ocupacion.mascara(time(9), time(11)))
+
+        reserva = Reserva.objects.create(oficina=self.oficina, espacio=self.sala, fecha=self.fecha,
+                                         hora_inicio=time(15), hora_fin=time(16))
+        self.assertEqual(self.mascara_actual(), ocupacion.mascara(time(9), time(11)) | ocupacion.mascara(time(15), time(16)))
+
+        reserva.delete()
+        self.assertEqual(self.mascara_actual(), ocupacion.mascara(time(9), time(11)))
+
+        self.client.force_login(self.oficina.user)
+        ids = list(Reserva.objects.values_list('id', flat=True))
+        self.client.post(reverse('eliminar_reserva', args=[ids[0]]), {'reservas_ids': ids})
+        self.assertFalse(OcupacionDiaria.objects.exists())
+
+    def test_reconstruir_desde_reservas(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['08:00-09:00', '13:00-14:00'])
+        esperado = self.mascara_actual()
+        OcupacionDiaria.objects.all().delete()
+        call_command('reconstruir_ocupacion', stdout=mock.MagicMock())
+        ocupacion_dia = OcupacionDiaria.objects.get(espacio=self.sala, fecha=self.fecha)
+        self.assertEqual(ocupacion_dia.mascara, esperado)
+        self.assertEqual(ocupacion_dia.total_reservas, 2)
+
+
+class ResumenesDiariosTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.terraza = Espacio.objects.create(nombre='Terraza', tipo='terraza')
+        self.hoy = date.today()
+
+    def resumenes(self):
+        return (
+            sorted(ResumenDiarioEspacio.objects.filter(reservas__gt=0).values_list('espacio_id', 'fecha', 'reservas', 'minutos')),
+            sorted(ResumenDiarioOficina.objects.filter(reservas__gt=0).values_list('oficina_id', 'fecha', 'reservas', 'minutos')),
+            sorted(ResumenDiarioHora.objects.filter(reservas__gt=0).values_list('fecha', 'hora', 'reservas', 'minutos')),
+        )
+
+    def test_altas_y_bajas_incrementales(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy, ['09:00-10:00', '10:00-11:00'])
+        disponibilidad.reservar(self.oficina, self.terraza, self.hoy, ['15:00-16:00'])
+        Reserva.objects.filter(espacio=self.terraza).first().delete()
+        self.assertEqual(ResumenDiarioOficina.objects.get(oficina=self.oficina, fecha=self.hoy).minutos, 120)
+        self.assertEqual(ResumenDiarioEspacio.objects.get(espacio=self.terraza, fecha=self.hoy).reservas, 0)
+
+        incrementales = self.resumenes()
+        call_command('reconstruir_resumenes', stdout=mock.MagicMock())
+        self.assertEqual(self.resumenes(), incrementales)
+
+    def test_panel_lee_resumenes(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy, ['09:00-10:00', '10:00-11:00', '13:00-14:00'])
+        indicadores = estadisticas.panel_admin(self.hoy, espacios_activos=2)
+        self.assertEqual(indicadores['total_reservas'], 3)
+        self.assertEqual(indicadores['reservas_hoy'], 3)
+        self.assertEqual(indicadores['horas_totales'], 3)
+        self.assertEqual(indicadores['horario_pico'], 'Mañanas (8AM-12PM)')
+        self.assertEqual(indicadores['espacio_favorito'], 'Sala 1')
+        self.assertEqual(indicadores['oficinas_activas'][0].total_reservas, 3)
+        self.assertEqual(indicadores['oficinas_activas'][0].horas_totales_mes, 3)
+
+        admin = User.objects.create_superuser(username='admin', password='admin123')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_reservas'], 3)
+
+    def test_panel_con_cantidad_fija_de_consultas(self):
+        admin = User.objects.create_superuser(username='admin', password='admin123')
+        self.client.force_login(admin)
+        otras = [crear_oficina(str(200 + i)) for i in range(5)]
+
+        def consultas_del_panel():
+            with CaptureQueriesContext(connection) as capturadas:
+                self.assertEqual(self.client.get(reverse('admin_dashboard')).status_code, 200)
+            return len(capturadas)
+
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy, ['09:00-10:00'])
+        pocas = consultas_del_panel()
+        for i, oficina in enumerate(otras):
+            for dias in range(1, 6):
+                disponibilidad.reservar(oficina, self.sala, self.hoy - timedelta(days=dias * 6 + i),
+                                        ['08:00-09:00', '12:00-13:00', '16:00-17:00', '19:00-20:00'])
+        self.assertEqual(consultas_del_panel(), pocas)
+        self.assertLessEqual(pocas, 10)
+
+
+class PanelOficinaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.oficina = crear_oficina()
+        self.otra = crear_oficina('202')
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.hoy = date.today()
+
+    def test_cache_por_version(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy, ['08:00-09:00', '09:00-10:00'])
+        panel = estadisticas.panel_oficina(self.oficina, self.hoy)
+        self.assertEqual((panel['horas_este_mes'], panel['reservas_este_mes']), (2, 2))
+        self.assertEqual(panel['espacio_favorito'], 'Sala 1')
+        self.assertEqual((panel['mi_ranking'], panel['total_oficinas']), (1, 2))
+        with self.assertNumQueries(0):
+            self.assertEqual(estadisticas.panel_oficina(self.oficina, self.hoy), panel)
+
+        # Una reserva de la propia oficina invalida sus indicadores
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy, ['10:00-11:00'])
+        self.assertEqual(estadisticas.panel_oficina(self.oficina, self.hoy)['reservas_este_mes'], 3)
+
+    def test_reservas_de_otra_oficina_cambian_el_ranking(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy, ['08:00-09:00'])
+        self.assertEqual(estadisticas.panel_oficina(self.otra, self.hoy)['mi_ranking'], 2)
+        disponibilidad.reservar(self.otra, self.sala, self.hoy, ['10:00-11:00', '11:00-12:00'])
+        self.assertEqual(estadisticas.panel_oficina(self.otra, self.hoy)['mi_ranking'], 1)
+        self.assertEqual(estadisticas.panel_oficina(self.oficina, self.hoy)['mi_ranking'], 2)
+
+    def test_ranking_con_empates(self):
+        tercera = crear_oficina('303')
+        crear_oficina('404')
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy, ['08:00-09:00', '09:00-10:00'])
+        disponibilidad.reservar(self.otra, self.sala, self.hoy, ['10:00-11:00', '11:00-12:00'])
+        disponibilidad.reservar(tercera, self.sala, self.hoy, ['12:00-13:00'])
+        desde = self.hoy.replace(day=1)
+
+        with self.assertNumQueries(1):
+            top = ranking.top(desde, self.hoy, limite=3)
+        self.assertEqual([(o.numero, o.puesto) for o in top], [('101', 1), ('202', 1), ('303', 3)])
+        with self.assertNumQueries(1):
+            self.assertEqual(ranking.posicion(self.otra.id, desde, self.hoy), (1, 2, 4))
+        self.assertEqual(ranking.posicion(tercera.id, desde, self.hoy), (3, 1, 4))
+
+
+class ReservasRecientesTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.otra = crear_oficina('202')
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.terraza = Espacio.objects.create(nombre='Terraza', tipo='terraza')
+        self.hoy = date.today()
+        admin = User.objects.create_superuser(username='admin', password='admin123')
+        self.client.force_login(admin)
+
+    def paginas(self, **params):
+        grupos = []
+        cursor = None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(reverse('reservas_recientes_ajax'), params).json()
+            grupos.extend(data['reservas'])
+            cursor = data['siguiente']
+            if not cursor:
+                return grupos
+
+    def test_grupos_no_se_cortan_entre_paginas(self):
+        for dias in range(6):
+            fecha = self.hoy - timedelta(days=dias)
+            disponibilidad.reservar(self.oficina, self.sala, fecha, ['08:00-09:00', '09:00-10:00', '10:00-11:00'])
+            disponibilidad.reservar(self.otra, self.sala, fecha, ['14:00-15:00'])
+        grupos = self.paginas(limite=1)
+        self.assertEqual(len(grupos), 12)
+        self.assertEqual(sum(g['cantidad_bloques'] for g in grupos), 24)
+        self.assertEqual(grupos[0]['fecha'], self.hoy.isoformat())
+        self.assertEqual(len({g['id'] for g in grupos}), 12)
+
+    def test_filtros_en_el_servidor(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy, ['08:00-09:00'])
+        disponibilidad.reservar(self.otra, self.terraza, self.hoy + timedelta(days=3), ['15:00-16:00'],
+                                nombre_visitante='Ana', placa_visitante='ABC123')
+        self.assertEqual([g['espacio'] for g in self.paginas(tipo='terraza')], ['Terraza'])
+        self.assertEqual([g['oficina'] for g in self.paginas(oficina='101')], ['101'])
+        self.assertEqual([g['placa_visitante'] for g in self.paginas(q='abc')], ['ABC123'])
+        self.assertEqual(len(self.paginas(periodo='today')), 1)
+        self.assertEqual(len(self.paginas(desde=(self.hoy + timedelta(days=1)).isoformat())), 1)
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse('reservas_recientes_ajax'), {'cursor': 'xx'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(INSTRUMENTACION_ACTIVA=True)
+class InstrumentacionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.oficina = crear_oficina()
+        self.otra = crear_oficina('202')
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.terraza = Espacio.objects.create(nombre='Terraza', tipo='terraza')
+        self.hoy = date.today()
+        for dias in range(-3, 4):
+            fecha = self.hoy + timedelta(days=dias)
+            disponibilidad.reservar(self.oficina, self.sala, fecha, ['09:00-10:00', '10:00-11:00'])
+            disponibilidad.reservar(self.otra, self.terraza, fecha, ['15:00-16:00'])
+        self.admin = User.objects.create_superuser(username='admin', password='admin123')
+
+    def test_vistas_dentro_del_presupuesto(self):
+        mes = self.hoy.strftime('%Y-%m')
+        pedidos = [
+            (self.admin, 'admin_dashboard', {}),
+            (self.admin, 'reservas_recientes_ajax', {}),
+            (self.oficina.user, 'mis_reservas', {}),
+            (self.oficina.user, 'historial_reservas_ajax', {}),
+            (self.oficina.user, 'nueva_reserva', {}),
+            (self.oficina.user, 'verificar_disponibilidad_ajax', {'espacio_id': self.sala.id, 'fecha': self.hoy.isoformat()}),
+            (self.oficina.user, 'calendario_ocupacion_ajax', {'espacio_id': self.sala.id, 'mes': mes}),
+            (self.oficina.user, 'calendario_edificio_ajax', {'mes': mes}),
+            (self.oficina.user, 'matriz_disponibilidad_ajax', {'tipo': 'sala', 'desde': self.hoy.isoformat()}),
+        ]
+        for usuario, nombre, parametros in pedidos:
+            with self.subTest(vista=nombre):
+                self.client.force_login(usuario)
+                with CaptureQueriesContext(connection) as consultas:
+                    response = self.client.get(reverse(nombre), parametros)
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNotNone(response.medicion.presupuesto)
+                self.assertEqual(response.medicion.consultas, len(consultas))
+                self.assertEqual(response.medicion.excesos(), [])
+                self.assertIn('sql;dur=', response['Server-Timing'])
+
+    def test_registra_requests_sobre_el_umbral(self):
+        self.client.force_login(self.admin)
+        with override_settings(INSTRUMENTACION_UMBRAL_CONSULTAS=1):
+            with self.assertLogs('edificio.instrumentacion', 'WARNING') as logs:
+                self.client.get(reverse('admin_dashboard'))
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro['vista'], 'admin_dashboard')
+        self.assertGreater(registro['consultas'], 1)
+
+
+class AgrupacionTests(TestCase):
+    def agrupar_en_python(self, reservas):
+        """Agrupación original de mis_reservas, como referencia"""
+        grupos = []
+        for reserva in reservas:
+            anterior = grupos[-1][-1] if grupos else None
+            if (anterior and anterior.oficina_id == reserva.oficina_id and
+                    anterior.espacio_id == reserva.espacio_id and
+                    anterior.fecha == reserva.fecha and
+                    anterior.hora_fin == reserva.hora_inicio):
+                grupos[-1].append(reserva)
+            else:
+                grupos.append([reserva])
+        return [
+            (g[0].id, g[0].oficina_id, g[0].espacio_id, g[0].fecha, g[0].hora_inicio, g[-1].hora_fin,
+             sorted(r.id for r in g), len(g), sum(r.duracion_horas() for r in g))
+            for g in grupos
+        ]
+
+    def test_coincide_con_la_agrupacion_en_python(self):
+        azar = random.Random(7)
+        oficinas = [crear_oficina(str(100 + i)) for i in range(3)]
+        espacios = [Espacio.objects.create(nombre=f'Sala {i}', tipo='sala') for i in range(3)]
+        hoy = date.today()
+        reservas = []
+        for espacio in espacios:
+            for dias in range(5):
+                minuto = 8 * 60
+                while minuto < 20 * 60:
+                    duracion = azar.choice([30, 60, 60, 120])
+                    if azar.random() < 0.7 and minuto + duracion <= 20 * 60:
+                        reservas.append(Reserva(
+                            oficina=azar.choice(oficinas), espacio=espacio, fecha=hoy + timedelta(days=dias),
+                            hora_inicio=time(minuto // 60, minuto % 60),
+                            hora_fin=time((minuto + duracion) // 60, (minuto + duracion) % 60),
+                        ))
+                    minuto += duracion
+        Reserva.objects.bulk_create(reservas)
+
+        for oficina in oficinas:
+            ordenadas = Reserva.objects.filter(oficina=oficina).order_by('espacio', 'fecha', 'hora_inicio')
+            esperado = self.agrupar_en_python(ordenadas)
+            esperado.sort(key=lambda g: g[3], reverse=True)
+            with self.assertNumQueries(2):
+                grupos = agrupacion.agrupar(Reserva.objects.filter(oficina=oficina))
+            obtenido = [
+                (g.id, g.oficina.id, g.espacio.id, g.fecha, g.hora_inicio, g.hora_fin,
+                 sorted(g.reservas_ids), g.cantidad_bloques, g.duracion_horas())
+                for g in grupos
+            ]
+            self.assertEqual(obtenido, esperado)
+        self.assertTrue(any(g.es_agrupada for g in grupos))
+
+
+class ImportacionTests(TestCase):
+    def escribir(self, contenido, codificacion):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ruta = os.path.join(carpeta.name, 'usuarios.json')
+        with open(ruta, 'w', encoding=codificacion) as archivo:
+            archivo.write(contenido)
+        return ruta
+
+    def test_importa_por_lotes_manteniendo_hashes(self):
+        hash_existente = User.objects.create_user('oficina101', password='vieja-123').password
+        hash_nuevo = 'pbkdf2_sha256$1000000$sal$hash='
+        registros = [
+            {'model': 'auth.user', 'pk': 7, 'fields': {'username': 'oficina101', 'email': 'a@b.com'}},
+            {'model': 'auth.user', 'pk': 8, 'fields': {'username': 'oficina202', 'password': hash_nuevo}},
+            {'model': 'auth.user', 'pk': 9, 'fields': {'username': 'mala', 'password': 'texto-plano'}},
+            {'model': 'reservas.oficina', 'fields': {'user': 8, 'numero': '202', 'nombre_empresa': 'Nueva'}},
+            {'model': 'reservas.oficina', 'fields': {'user': ['oficina101'], 'numero': '101'}},
+        ]
+        # UTF-16 sin BOM y bloques chicos: cada registro cruza varios bloques
+        ruta = self.escribir(json.dumps(registros, indent=2), 'utf-16-le')
+        with open(ruta, 'rb') as archivo:
+            self.assertEqual(importacion.detectar_codificacion(archivo.read(4)), 'utf-16-le')
+        with importacion.abrir(ruta) as flujo:
+            resultado = importacion.importar(importacion.leer_registros(flujo, tam_bloque=16), batch_size=2)
+
+        self.assertEqual((resultado.usuarios_creados, resultado.usuarios_actualizados), (1, 1))
+        self.assertEqual(resultado.oficinas_creadas, 2)
+        self.assertEqual([e['registro'] for e in resultado.errores], [3])
+        existente = User.objects.get(username='oficina101')
+        self.assertEqual((existente.password, existente.email), (hash_existente, 'a@b.com'))
+        self.assertEqual(User.objects.get(username='oficina202').password, hash_nuevo)
+        self.assertEqual(Oficina.objects.get(numero='202').user.username, 'oficina202')
+
+    def test_oficinas_nuevas_invalidan_el_ranking(self):
+        cache.clear()
+        oficina = crear_oficina()
+        self.assertEqual(estadisticas.panel_oficina(oficina, date.today())['total_oficinas'], 1)
+        importacion.importar([
+            {'model': 'auth.user', 'pk': 8, 'fields': {'username': 'oficina202'}},
+            {'model': 'reservas.oficina', 'fields': {'user': 8, 'numero': '202'}},
+        ])
+        self.assertEqual(estadisticas.panel_oficina(oficina, date.today())['total_oficinas'], 2)
+
+    def test_comando_con_el_fixture_del_repositorio(self):
+        salida = io.StringIO()
+        call_command('importar_usuarios', 'usuarios.json', stdout=salida)
+        self.assertIn('14 usuarios creados', salida.getvalue())
+        self.assertTrue(User.objects.get(username='admin').password.startswith('pbkdf2_sha256$'))
+
+    def test_json_roto(self):
+        ruta = self.escribir('[{"model": "auth.user", "fields": {"username": "a"}}, {"model":', 'utf-8')
+        with self.assertRaisesMessage(CommandError, 'JSON inválido'):
+            call_command('importar_usuarios', ruta, stdout=io.StringIO())
+        self.assertTrue(User.objects.filter(username='a').exists())
+
+    def test_vista_solo_para_administradores_y_de_a_una(self):
+        url = reverse('importar_usuarios')
+        self.assertEqual(self.client.post(url).status_code, 302)
+        self.client.force_login(crear_oficina('909').user)
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser(username='raiz', password='admin123'))
+        self.assertEqual(self.client.get(url).status_code, 405)
+        cache.set(importacion.CLAVE_EN_CURSO, 'otro.json')
+        try:
+            self.assertEqual(self.client.post(url).status_code, 409)
+        finally:
+            cache.delete(importacion.CLAVE_EN_CURSO)
+        self.assertContains(self.client.post(url), 'Importación terminada')
+        self.assertIsNone(cache.get(importacion.CLAVE_EN_CURSO))
+
+
+class LoginTests(TestCase):
+    def test_rehashea_contrasenas_heredadas_al_iniciar_sesion(self):
+        usuario = User.objects.create(username='oficina101', password=make_password('clave-123', hasher='pbkdf2_sha256'))
+
+        respuesta = self.client.post(reverse('login'), {'username': 'oficina101', 'password': 'clave-123'})
+        self.assertRedirects(respuesta, reverse('dashboard'), fetch_redirect_response=False)
+        usuario.refresh_from_db()
+        self.assertTrue(usuario.password.startswith('argon2$argon2id$'))
+
+        # Ya con el hasher preferido no se vuelve a guardar
+        hash_actual = usuario.password
+        self.client.logout()
+        self.client.post(reverse('login'), {'username': 'oficina101', 'password': 'clave-123'})
+        usuario.refresh_from_db()
+        self.assertEqual(usuario.password, hash_actual)
+
+
+class SemillaTests(TestCase):
+    def generar(self):
+        with transaction.atomic():
+            semilla.poblar(oficinas=5, espacios=10, reservas=300, semilla=7, hoy=date(2025, 3, 3))
+            filas = list(Reserva.objects.order_by('fecha', 'espacio__nombre', 'hora_inicio').values_list(
+                'oficina__numero', 'espacio__nombre', 'fecha', 'hora_inicio', 'placa_visitante',
+            ))
+            visita = set(Reserva.objects.filter(espacio__es_estacionamiento_visita=True).values_list(
+                'placa_visitante', flat=True,
+            ))
+            transaction.set_rollback(True)
+        return filas, visita
+
+    def test_misma_semilla_mismos_datos(self):
+        filas, placas = self.generar()
+        self.assertEqual(len(filas), 300)
+        self.assertEqual(self.generar()[0], filas)
+        self.assertTrue(placas and all(re.fullmatch(r'[A-Z]{3}-\d{3}', placa) for placa in placas))
+
+    def test_invalida_las_lecturas_cacheadas(self):
+        antes = versiones.actuales('espacios', 'ranking')
+        self.generar()
+        despues = versiones.actuales('espacios', 'ranking')
+        self.assertTrue(all(nueva != vieja for nueva, vieja in zip(despues, antes)))
+
+
+class BenchReservasTests(TestCase):
+    def test_mide_todas_las_vistas_y_detecta_regresiones(self):
+        opciones = dict(
+            oficinas=3, espacios=5, reservas=60, repeticiones=2, calentamiento=0,
+            bd_actual=True, stdout=io.StringIO(),
+        )
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'base.json')
+            call_command('bench_reservas', salida=salida, **opciones)
+            # Los datos generados se revierten al terminar
+            self.assertFalse(Reserva.objects.exists())
+
+            with open(salida, encoding='utf-8') as archivo:
+                base = json.load(archivo)
+            self.assertIn('mis_reservas', base['vistas'])
+            self.assertTrue(all(m['consultas'] > 0 for m in base['vistas'].values()))
+
+            base['vistas']['mis_reservas']['consultas'] = 1
+            with open(salida, 'w', encoding='utf-8') as archivo:
+                json.dump(base, archivo)
+            with self.assertRaisesMessage(CommandError, 'mis_reservas: consultas 1'):
+                call_command('bench_reservas', base=salida, vistas='mis_reservas', **opciones)
+
+
+class SolapamientoTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.fecha = date.today() + timedelta(days=1)
+
+    def test_base_de_datos_rechaza_solapamiento(self):
+        Reserva.objects.create(oficina=self.oficina, espacio=self.sala, fecha=self.fecha,
+                               hora_inicio=time(9), hora_fin=time(11))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reserva.objects.create(oficina=self.oficina, espacio=self.sala, fecha=self.fecha,
+                                   hora_inicio=time(10), hora_fin=time(12))
+        # Bloques contiguos y otras fechas siguen permitidos
+        Reserva.objects.create(oficina=self.oficina, espacio=self.sala, fecha=self.fecha,
+                               hora_inicio=time(11), hora_fin=time(12))
+        Reserva.objects.create(oficina=self.oficina, espacio=self.sala, fecha=self.fecha + timedelta(days=1),
+                               hora_inicio=time(9), hora_fin=time(11))
+
+    def test_carrera_perdida_se_informa_como_conflicto(self):
+        disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['10:00-11:00'])
+        # Simula que la verificación previa leyó la agenda antes que la otra oficina
+        with mock.patch.object(disponibilidad, 'cargar_agenda', return_value=disponibilidad.AgendaDia()):
+            with self.assertRaises(disponibilidad.ConflictoHorario) as ctx:
+                disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['09:00-10:00', '10:00-11:00'])
+        self.assertEqual(str(ctx.exception), 'Conflicto en horario 10:00-11:00')
+        self.assertEqual(Reserva.objects.count(), 1)
+
+
+class SeriesTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        # Un martes futuro
+        hoy = date.today()
+        self.inicio = hoy + timedelta(days=7 + (1 - hoy.weekday()) % 7)
+
+    def test_expandir(self):
+        self.assertEqual(
+            series.expandir(date(2025, 1, 31), 'mensual', repeticiones=3),
+            [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31)],
+        )
+        self.assertEqual(
+            series.expandir(date(2025, 3, 4), 'quincenal', hasta=date(2025, 4, 1)),
+            [date(2025, 3, 4), date(2025, 3, 18), date(2025, 4, 1)],
+        )
+        with self.assertRaises(series.SerieInvalida):
+            series.expandir(date(2025, 3, 4), 'semanal', repeticiones=series.MAX_FECHAS + 1)
+
+    def test_crea_las_fechas_libres_e_informa_conflictos(self):
+        tercera = self.inicio + timedelta(weeks=2)
+        disponibilidad.reservar(crear_oficina('202'), self.sala, tercera, ['10:00-11:00'])
+
+        # Mismas consultas para 4 que para 50 fechas: una para los conflictos,
+        # un bulk_create y un solo recálculo de los datos derivados
+        with self.assertNumQueries(10):
+            resultado = series.crear_serie(
+                self.oficina, self.sala, self.inicio, ['09:00-10:00', '10:00-11:00'], 'semanal', repeticiones=4,
+            )
+        self.assertEqual(resultado.conflictos, [(tercera, '10:00-11:00')])
+        self.assertEqual(len(resultado.fechas_creadas), 3)
+        self.assertEqual(resultado.serie.fecha_fin, self.inicio + timedelta(weeks=3))
+        self.assertEqual(resultado.serie.reservas.count(), 6)
+        self.assertEqual(OcupacionDiaria.objects.get(espacio=self.sala, fecha=self.inicio).total_reservas, 2)
+
+    def test_desde_el_formulario_y_cancelar_la_serie(self):
+        self.client.force_login(self.oficina.user)
+        self.client.post(reverse('nueva_reserva'), {
+            'espacio': self.sala.id,
+            'fecha': self.inicio.isoformat(),
+            'bloques_horarios': ['09:00-10:00'],
+            'repetir': 'mensual',
+            'repetir_hasta': (self.inicio + timedelta(days=70)).isoformat(),
+        })
+        serie = SerieReserva.objects.get()
+        self.assertEqual(serie.reservas.count(), 3)
+
+        # Una serie ya empezada conserva las fechas pasadas
+        Reserva.objects.filter(serie=serie, fecha=self.inicio).update(fecha=date.today() - timedelta(days=1))
+        response = self.client.post(reverse('cancelar_serie', args=[serie.id]))
+        self.assertRedirects(response, reverse('mis_reservas'), fetch_redirect_response=False)
+        self.assertEqual(Reserva.objects.filter(serie=serie).count(), 1)
+        self.assertFalse(OcupacionDiaria.objects.filter(fecha__gt=self.inicio, total_reservas__gt=0).exists())
+
+
+class CancelacionTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.otra = crear_oficina('202')
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.terraza = Espacio.objects.create(nombre='Terraza', tipo='terraza')
+        self.fecha = date.today() + timedelta(days=3)
+        disponibilidad.reservar(self.oficina, self.sala, self.fecha, ['09:00-10:00', '10:00-11:00'])
+        disponibilidad.reservar(self.oficina, self.terraza, self.fecha, ['08:00-09:00'])
+        disponibilidad.reservar(self.oficina, self.sala, self.fecha + timedelta(days=1), ['09:00-10:00'])
+        disponibilidad.reservar(self.otra, self.sala, self.fecha, ['14:00-15:00'])
+
+    def test_cancelar_un_dia_completo(self):
+        # savepoint, DELETE ... RETURNING, recálculo de ocupación (lectura,
+        # upsert y borrado de los días vacíos), un upsert por resumen diario y release
+        with self.assertNumQueries(9):
+            resumen = cancelacion.cancelar(self.oficina, desde=self.fecha, hasta=self.fecha)
+        self.assertEqual(resumen.cantidad, 3)
+        self.assertEqual(resumen.descripcion(), f'Sala 1, Terraza - {self.fecha:%d/%m/%Y}')
+        self.assertEqual(Reserva.objects.filter(oficina=self.oficina).count(), 1)
+        self.assertEqual(Reserva.objects.filter(oficina=self.otra).count(), 1)
+        self.assertEqual(OcupacionDiaria.objects.get(espacio=self.sala, fecha=self.fecha).total_reservas, 1)
+        self.assertFalse(ResumenDiarioOficina.objects.filter(oficina=self.oficina, fecha=self.fecha, reservas__gt=0).exists())
+
+        with self.assertRaises(cancelacion.CancelacionInvalida):
+            cancelacion.cancelar(self.oficina)
+
+    def test_endpoint_por_espacio_y_rango(self):
+        self.client.force_login(self.oficina.user)
+        response = self.client.post(reverse('cancelar_reservas'), {
+            'espacio': self.sala.id,
+            'desde': self.fecha.isoformat(),
+            'hasta': (self.fecha + timedelta(days=1)).isoformat(),
+        }, follow=True)
+        mensajes = [str(m) for m in response.context['messages']]
+        self.assertIn(
+            f'✅ Se cancelaron 3 bloque(s) de reserva: Sala 1 - del {self.fecha:%d/%m/%Y} '
+            f'al {self.fecha + timedelta(days=1):%d/%m/%Y}',
+            mensajes,
+        )
+        self.assertEqual(list(Reserva.objects.filter(oficina=self.oficina).values_list('espacio', flat=True)), [self.terraza.id])
+
+
+class HistorialTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.hoy = date.today()
+        for dias in (900, 500, 10):
+            disponibilidad.reservar(self.oficina, self.sala, self.hoy - timedelta(days=dias), ['09:00-10:00', '10:00-11:00'])
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy + timedelta(days=1), ['09:00-10:00'])
+
+    def test_archivar_y_leer_el_historial_completo(self):
+        resumenes = list(ResumenDiarioOficina.objects.order_by('fecha').values_list('fecha', 'reservas'))
+        salida = io.StringIO()
+        call_command('mantener_reservas', dias=400, batch_size=3, stdout=salida)
+        self.assertIn('4 reservas anteriores', salida.getvalue())
+
+        self.assertEqual(Reserva.objects.count(), 3)
+        self.assertEqual(ReservaArchivada.objects.count(), 4)
+        completo = historial.Historial()
+        self.assertEqual(completo.count(), 7)
+        self.assertEqual(set(completo.union(lambda reservas: reservas.values_list('id', flat=True))),
+                         set(Reserva.objects.values_list('id', flat=True)) | set(ReservaArchivada.objects.values_list('id', flat=True)))
+
+        # Archivar no es cancelar: los resúmenes y la ocupación quedan igual y se pueden reconstruir
+        ocupadas = list(OcupacionDiaria.objects.order_by('fecha').values_list('fecha', 'mascara'))
+        estadisticas.reconstruir()
+        ocupacion.reconstruir()
+        self.assertEqual(list(ResumenDiarioOficina.objects.order_by('fecha').values_list('fecha', 'reservas')), resumenes)
+        self.assertEqual(list(OcupacionDiaria.objects.order_by('fecha').values_list('fecha', 'mascara')), ocupadas)
+        cache.clear()
+        self.assertEqual(estadisticas.panel_oficina(self.oficina, self.hoy)['tipos_espacios'],
+                         [{'espacio__tipo': 'sala', 'cantidad': 7}])
+
+        # mis_reservas trae el mes en curso y las próximas; lo anterior llega por páginas
+        self.client.force_login(self.oficina.user)
+        inicio_mes = self.hoy.replace(day=1)
+        fechas = [self.hoy + timedelta(days=1)] + [self.hoy - timedelta(days=d) for d in (10, 500, 900)]
+        response = self.client.get(reverse('mis_reservas'))
+        self.assertEqual([r.fecha for r in response.context['reservas']], [f for f in fechas if f >= inicio_mes])
+
+        anteriores, parametros = [], {'limite': 1}
+        while True:
+            data = self.client.get(reverse('historial_reservas_ajax'), parametros).json()
+            anteriores.extend(data['reservas'])
+            if not data['siguiente']:
+                break
+            parametros['cursor'] = data['siguiente']
+        self.assertEqual([g['fecha'] for g in anteriores], [f.isoformat() for f in fechas if f < inicio_mes])
+        self.assertEqual(anteriores[-1]['cantidad_bloques'], 2)
+
+        # Las reservas nuevas siguen validándose solo contra la tabla reciente
+        disponibilidad.reservar(self.oficina, self.sala, self.hoy + timedelta(days=2), ['09:00-10:00'])
+        self.assertEqual(particiones.asegurar(), [])
+
+    def test_ninguna_clave_foranea_apunta_a_reserva(self):
+        # En PostgreSQL la clave primaria es (id, fecha): no hay un id único al que apuntar
+        self.assertEqual(particiones.apuntan_a_reserva(), [])
+
+
+class HistorialMigracionesTests(TransactionTestCase):
+    def test_una_migracion_puede_alterar_reserva(self):
+        # Sin una vista sobre reservas_reserva, SQLite puede reconstruir la tabla
+        viejo = Reserva._meta.get_field('nombre_visitante')
+        nuevo = viejo.clone()
+        nuevo.max_length = 200
+        nuevo.set_attributes_from_name('nombre_visitante')
+        nuevo.model = Reserva
+        with connection.schema_editor() as editor:
+            editor.alter_field(Reserva, viejo, nuevo)
+            editor.alter_field(Reserva, nuevo, viejo)
+            if connection.vendor == 'sqlite':
+                # La reconstrucción se lleva los triggers de no solapamiento
+                for sql in restricciones.SQLITE_CREAR:
+                    editor.execute(sql)
+        self.assertNotIn('reservas_reserva_historial', connection.introspection.table_names(include_views=True))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Particionado solo en PostgreSQL')
+class ParticionesPostgresTests(TestCase):
+    def setUp(self):
+        self.oficina = crear_oficina()
+        self.sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        self.hoy = date.today()
+
+    def particion_de(self, reserva):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM {particiones.TABLA} WHERE id = %s', [reserva.id])
+            return cursor.fetchone()[0]
+
+    def test_tabla_particionada_con_clave_compuesta(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [particiones.TABLA])
+            self.assertEqual(cursor.fetchone()[0], 'p')
+            cursor.execute(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+                [particiones.TABLA],
+            )
+            self.assertEqual(cursor.fetchone()[0], 'PRIMARY KEY (id, fecha)')
+            self.assertIn(particiones.nombre(self.hoy.replace(day=1)), particiones.existentes(cursor))
+
+    def test_reservas_en_su_particion_y_sin_solapamiento(self):
+        manana = self.hoy + timedelta(days=1)
+        reserva, = disponibilidad.reservar(self.oficina, self.sala, manana, ['10:00-11:00'])
+        self.assertEqual(self.particion_de(reserva), particiones.nombre(manana.replace(day=1)))
+
+        # La restricción de exclusión de la partición rechaza una lectura desactualizada
+        with mock.patch.object(disponibilidad, 'cargar_agenda', return_value=disponibilidad.AgendaDia()):
+            with self.assertRaises(disponibilidad.ConflictoHorario):
+                disponibilidad.reservar(crear_oficina('202'), self.sala, manana, ['10:30-11:30'])
+
+    def test_asegurar_saca_las_filas_de_la_predeterminada(self):
+        lejana = self.hoy.replace(day=1) + timedelta(days=400)
+        reserva, = disponibilidad.reservar(self.oficina, self.sala, lejana, ['09:00-10:00'])
+        self.assertEqual(self.particion_de(reserva), particiones.PREDETERMINADA)
+
+        creadas = particiones.asegurar()
+        self.assertIn(particiones.nombre(lejana.replace(day=1)), creadas)
+        self.assertEqual(self.particion_de(reserva), particiones.nombre(lejana.replace(day=1)))
+        self.assertEqual(particiones.asegurar(), [])
+
+        # Los ids siguen saliendo de la secuencia
+        otra, = disponibilidad.reservar(self.oficina, self.sala, self.hoy, ['09:00-10:00'])
+        self.assertGreater(otra.id, reserva.id)
+
+
+def reintentar_si_bloqueada(funcion, *args, intentos=500):
+    """
+    SQLite (la base de test en memoria) rechaza con "database table is
+    locked" la escritura de una transacción mientras otra tiene la tabla: se
+    reintenta la transacción completa, como haría un cliente. En PostgreSQL
+    las transacciones esperan el bloqueo y no entran aquí.
+    """
+    for _ in range(intentos - 1):
+        try:
+            return funcion(*args)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            reloj.sleep(0.005)
+    return funcion(*args)
+
+
+class ReservasConcurrentesTests(TransactionTestCase):
+    HILOS = 8
+
+    def test_reservas_paralelas_del_mismo_horario(self):
+        sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        oficinas = [crear_oficina(str(100 + i)) for i in range(self.HILOS)]
+        fecha = date.today() + timedelta(days=1)
+        barrera = threading.Barrier(self.HILOS)
+        resultados = []
+
+        def reservar(oficina):
+            try:
+                barrera.wait()
+                reintentar_si_bloqueada(disponibilidad.reservar, oficina, sala, fecha, ['09:00-10:00', '10:00-11:00'])
+                resultados.append('ok')
+            except disponibilidad.ConflictoHorario:
+                resultados.append('conflicto')
+            except Exception as e:
+                resultados.append(repr(e))
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(oficina,)) for oficina in oficinas]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        # Exactamente una gana; las demás chocan con la restricción o con la verificación previa
+        self.assertEqual(sorted(resultados), ['conflicto'] * (self.HILOS - 1) + ['ok'])
+        self.assertEqual(Reserva.objects.filter(espacio=sala, fecha=fecha).count(), 2)
+
+
+class OcupacionConcurrenteTests(TransactionTestCase):
+    HILOS = 8
+
+    def test_bloques_distintos_del_mismo_dia_en_paralelo(self):
+        sala = Espacio.objects.create(nombre='Sala 1', tipo='sala')
+        oficinas = [crear_oficina(str(100 + i)) for i in range(self.HILOS)]
+        fecha = date.today() + timedelta(days=1)
+        barrera = threading.Barrier(self.HILOS)
+        errores = []
+
+        def reservar(oficina, hora):
+            try:
+                barrera.wait()
+                reintentar_si_bloqueada(disponibilidad.reservar, oficina, sala, fecha, [f'{hora:02d}:00-{hora + 1:02d}:00'])
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(oficina, 8 + i)) for i, oficina in enumerate(oficinas)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        # Ninguna transacción pisó la máscara de otra
+        self.assertEqual(errores, [])
+        fila = OcupacionDiaria.objects.get(espacio=sala, fecha=fecha)
+        self.assertEqual(fila.total_reservas, self.HILOS)
+        self.assertEqual(fila.mascara, ocupacion.mascara(time(8), time(8 + self.HILOS)))
@@ -25,12 +25,20 @@ urlpatterns = [
     path('mis-reservas/', views.mis_reservas, name='mis_reservas'),
     path('nueva-reserva/', views.nueva_reserva, name='nueva_reserva'),
     path('eliminar-reserva/<int:reserva_id>/', views.eliminar_reserva, name='eliminar_reserva'),
+    path('cancelar-reservas/', views.cancelar_reservas, name='cancelar_reservas'),
+    path('cancelar-serie/<int:serie_id>/', views.cancelar_serie, name='cancelar_serie'),
     
     # ============================================
     # AJAX ENDPOINTS (Solo los que usas)
     # ============================================
-    path('ajax/verificar-disponibilidad/', views.verificar_disponibilidad_ajax, name='verificar_disponibilidad_ajax'),
-    path('ajax/calendario-ocupacion/', views.obtener_calendario_ocupacion_ajax, name='calendario_ocupacion_ajax'),
+    # Lecturas con el ORM async: bajo ASGI no ocupan un hilo por request
+    path('ajax/verificar-disponibilidad/', views.verificar_disponibilidad_async, name='verificar_disponibilidad_ajax'),
+    path('ajax/calendario-ocupacion/', views.calendario_ocupacion_async, name='calendario_ocupacion_ajax'),
+    path('ajax/calendario-edificio/', views.calendario_edificio_ajax, name='calendario_edificio_ajax'),
+    path('ajax/matriz-disponibilidad/', views.matriz_disponibilidad_ajax, name='matriz_disponibilidad_ajax'),
+    path('ajax/reservas-recientes/', views.reservas_recientes_ajax, name='reservas_recientes_ajax'),
+    path('ajax/historial-reservas/', views.historial_reservas_ajax, name='historial_reservas_ajax'),
+    path('eventos/', views.eventos_sse, name='eventos_sse'),
     
     # ============================================
     # ADMINISTRACIÓN
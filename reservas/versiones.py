@@ -0,0 +1,91 @@
+"""
+Números de versión en la cache para invalidar lecturas derivadas.
+
+Las lecturas cacheadas incluyen en su clave la versión de lo que leen (por
+ejemplo 'oficina:12'); al cambiar los datos se incrementa la versión y las
+claves viejas simplemente dejan de usarse hasta que expiran. Funciona igual
+con la cache local de desarrollo que con una compartida en producción.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIJO = 'reservas:version'
+
+
+def _clave(nombre):
+    return f'{PREFIJO}:{nombre}'
+
+
+def _inicial():
+    # Basada en el reloj: si la cache pierde la clave, la versión nueva
+    # nunca coincide con una ya usada
+    return time.time_ns() // 1000
+
+
+def _completar(claves, valores):
+    for clave in claves:
+        if clave not in valores:
+            cache.add(clave, _inicial(), timeout=None)
+            valores[clave] = cache.get(clave) or _inicial()
+    return [valores[clave] for clave in claves]
+
+
+def actuales(*nombres):
+    """Versiones vigentes de `nombres`, en el mismo orden, en una lectura"""
+    claves = [_clave(nombre) for nombre in nombres]
+    return _completar(claves, cache.get_many(claves))
+
+
+def estado(*nombres):
+    """
+    (versiones, modificada) en una lectura: las versiones de `nombres` y la
+    fecha (datetime UTC) del último incremento de cualquiera de ellos, o
+    None si la cache no la conoce.
+    """
+    claves = [_clave(nombre) for nombre in nombres]
+    marcas = [f'{clave}:modificada' for clave in claves]
+    valores = cache.get_many(claves + marcas)
+    momentos = [valores[marca] for marca in marcas if marca in valores]
+    modificada = datetime.fromtimestamp(max(momentos), tz=timezone.utc) if momentos else None
+    return _completar(claves, valores), modificada
+
+
+async def aestado(*nombres):
+    """Versión async de estado(), para las vistas servidas por ASGI"""
+    claves = [_clave(nombre) for nombre in nombres]
+    marcas = [f'{clave}:modificada' for clave in claves]
+    valores = await cache.aget_many(claves + marcas)
+    momentos = [valores[marca] for marca in marcas if marca in valores]
+    modificada = datetime.fromtimestamp(max(momentos), tz=timezone.utc) if momentos else None
+    for clave in claves:
+        if clave not in valores:
+            await cache.aadd(clave, _inicial(), timeout=None)
+            valores[clave] = await cache.aget(clave) or _inicial()
+    return [valores[clave] for clave in claves], modificada
+
+
+def actual(nombre):
+    return actuales(nombre)[0]
+
+
+def incrementar(*nombres):
+    """
+    Invalida las lecturas de `nombres`. Se incrementa ahora y otra vez al
+    confirmar la transacción, para que una lectura hecha mientras tanto
+    (que todavía ve los datos viejos) no quede guardada con la versión nueva.
+    """
+    _incrementar(nombres)
+    transaction.on_commit(lambda: _incrementar(nombres))
+
+
+def _incrementar(nombres):
+    for nombre in nombres:
+        clave = _clave(nombre)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.add(clave, _inicial(), timeout=None)
+        cache.set(f'{clave}:modificada', time.time(), timeout=None)
@@ -2,80 +2,27 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Q, Sum
-from django.http import JsonResponse
-from django.views.decorators.http import require_GET
+from django.db.models import Q
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
+from asgiref.sync import iscoroutinefunction
+from contextlib import aclosing
+from functools import wraps
 from datetime import date, time, datetime, timedelta
 from django.utils import timezone
-from .models import Oficina, Espacio, Reserva
+from django.utils.html import escape
+from edificio.middleware import presupuesto
+from .models import Oficina, Espacio, Reserva, OcupacionDiaria, SerieReserva
+from . import (
+    agrupacion, cancelacion, disponibilidad, estadisticas, eventos, historial, horarios, importacion, listados, matriz,
+    ocupacion, series, versiones,
+)
+import asyncio
 import json
 
-def agrupar_reservas_consecutivas(reservas_query):
-    """
-    Agrupa reservas consecutivas del mismo espacio, fecha y oficina
-    MEJORADO: Maneja múltiples IDs para eliminación en bloque
-    """
-    reservas = list(reservas_query)
-    if not reservas:
-        return []
-    
-    agrupadas = []
-    i = 0
-    
-    while i < len(reservas):
-        grupo = [reservas[i]]
-        j = i + 1
-        
-        # Buscar reservas consecutivas
-        while j < len(reservas):
-            anterior = grupo[-1]
-            actual = reservas[j]
-            
-            # Verificar si son consecutivas
-            if (anterior.oficina == actual.oficina and
-                anterior.espacio == actual.espacio and
-                anterior.fecha == actual.fecha and
-                anterior.hora_fin == actual.hora_inicio):
-                grupo.append(actual)
-                j += 1
-            else:
-                break
-        
-        # Crear objeto de reserva agrupada
-        if len(grupo) > 1:
-            # Si hay múltiples reservas, crear una agrupada
-            class ReservaAgrupada:
-                def __init__(self, reservas_grupo):
-                    self.id = reservas_grupo[0].id  # ID principal (para compatibilidad)
-                    self.oficina = reservas_grupo[0].oficina
-                    self.espacio = reservas_grupo[0].espacio
-                    self.fecha = reservas_grupo[0].fecha
-                    self.hora_inicio = reservas_grupo[0].hora_inicio
-                    self.hora_fin = reservas_grupo[-1].hora_fin
-                    self.fecha_creacion = reservas_grupo[0].fecha_creacion
-                    self.nombre_visitante = reservas_grupo[0].nombre_visitante
-                    self.placa_visitante = reservas_grupo[0].placa_visitante
-                    self.empresa_visitante = reservas_grupo[0].empresa_visitante
-                    self._duracion = sum(r.duracion_horas() for r in reservas_grupo)
-                    self.es_agrupada = True
-                    self.reservas_ids = [r.id for r in reservas_grupo]  # Todos los IDs del grupo
-                    self.cantidad_bloques = len(reservas_grupo)
-                    
-                def duracion_horas(self):
-                    return self._duracion
-            
-            agrupadas.append(ReservaAgrupada(grupo))
-        else:
-            # Si es una sola reserva, agregarla tal cual
-            grupo[0].es_agrupada = False
-            grupo[0].reservas_ids = [grupo[0].id]  # Para consistencia en template
-            grupo[0].cantidad_bloques = 1
-            agrupadas.append(grupo[0])
-        
-        i = j
-    
-    return agrupadas
-
 def login_view(request):
     if request.user.is_authenticated:
         return redirect('dashboard')
@@ -99,256 +46,80 @@ def dashboard(request):
         return redirect('admin_dashboard')
     return redirect('mis_reservas')
 
+@presupuesto(consultas=7)
 @login_required
 def admin_dashboard(request):
     if not request.user.is_superuser:
         return redirect('mis_reservas')
     
-    from django.db.models import Sum
-    from decimal import Decimal
-    
-    # Fechas para cálculos
+    # Indicadores leídos desde los resúmenes diarios
     hoy = date.today()
-    ayer = hoy - timedelta(days=1)
-    hace_una_semana = hoy - timedelta(days=7)
-    mes_actual = hoy.replace(day=1)
-    mes_anterior = (mes_actual - timedelta(days=1)).replace(day=1)
-    
-    # 1. RESERVAS TOTALES y porcentaje mensual
-    total_reservas = Reserva.objects.count()
-    reservas_mes_actual = Reserva.objects.filter(fecha__gte=mes_actual, fecha__lte=hoy).count()
-    reservas_mes_anterior = Reserva.objects.filter(fecha__gte=mes_anterior, fecha__lt=mes_actual).count()
-    
-    if reservas_mes_anterior > 0:
-        crecimiento_mensual = ((reservas_mes_actual - reservas_mes_anterior) / reservas_mes_anterior) * 100
-    else:
-        crecimiento_mensual = 100 if reservas_mes_actual > 0 else 0
-    
-    # 2. RESERVAS HOY y porcentaje vs ayer
-    reservas_hoy = Reserva.objects.filter(fecha=hoy).count()
-    reservas_ayer = Reserva.objects.filter(fecha=ayer).count()
-    
-    if reservas_ayer > 0:
-        crecimiento_diario = ((reservas_hoy - reservas_ayer) / reservas_ayer) * 100
-    else:
-        crecimiento_diario = 100 if reservas_hoy > 0 else 0
-    
-    # 3. HORAS TOTALES y porcentaje semanal
-    reservas_esta_semana = Reserva.objects.filter(fecha__gte=hace_una_semana, fecha__lte=hoy)
-    horas_esta_semana = 0
-    for reserva in reservas_esta_semana:
-        horas_esta_semana += reserva.duracion_horas()
-    
-    hace_dos_semanas = hoy - timedelta(days=14)
-    reservas_semana_anterior = Reserva.objects.filter(fecha__gte=hace_dos_semanas, fecha__lt=hace_una_semana)
-    horas_semana_anterior = 0
-    for reserva in reservas_semana_anterior:
-        horas_semana_anterior += reserva.duracion_horas()
-    
-    if horas_semana_anterior > 0:
-        crecimiento_semanal = ((horas_esta_semana - horas_semana_anterior) / horas_semana_anterior) * 100
-    else:
-        crecimiento_semanal = 100 if horas_esta_semana > 0 else 0
-    
-    # 4. OCUPACIÓN y porcentaje vs mes anterior
-    espacios_activos = Espacio.objects.filter(activo=True).count()
-    dias_mes_actual = (hoy - mes_actual).days + 1
-    horas_por_dia = 10
-    capacidad_mes_actual = espacios_activos * dias_mes_actual * horas_por_dia
-    
-    if capacidad_mes_actual > 0:
-        ocupacion_actual = (reservas_mes_actual * 100) / capacidad_mes_actual
-    else:
-        ocupacion_actual = 0
-    
-    dias_mes_anterior = (mes_actual - mes_anterior).days
-    capacidad_mes_anterior = espacios_activos * dias_mes_anterior * horas_por_dia
+    indicadores = estadisticas.panel_admin(
+        hoy,
+        espacios_activos=Espacio.objects.filter(activo=True).count()
+    )
     
-    if capacidad_mes_anterior > 0:
-        ocupacion_anterior = (reservas_mes_anterior * 100) / capacidad_mes_anterior
-    else:
-        ocupacion_anterior = 0
+    # Las reservas recientes se cargan por páginas desde reservas_recientes_ajax
+    context = {
+        **indicadores,
+    }
+    return render(request, 'reservas/admin_dashboard.html', context)
+
+# Una consulta más cuando la página trae reservas archivadas
+@presupuesto(consultas=5)
+@require_GET
+@login_required
+def reservas_recientes_ajax(request):
+    """Vista AJAX paginada (por cursor) para la tabla de reservas del panel de administración"""
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
     
-    if ocupacion_anterior > 0:
-        cambio_ocupacion = ocupacion_actual - ocupacion_anterior
-    else:
-        cambio_ocupacion = ocupacion_actual
-    
-    # HORARIO PICO
-    horarios_count = {}
-    reservas_con_hora = Reserva.objects.all()
-    
-    for reserva in reservas_con_hora:
-        hora = reserva.hora_inicio.hour
-        if 8 <= hora < 12:
-            franja = "Mañanas (8AM-12PM)"
-        elif 12 <= hora < 16:
-            franja = "Tardes (12PM-4PM)"  
-        elif 16 <= hora < 20:
-            franja = "Tardes (4PM-8PM)"
-        else:
-            franja = "Otras horas"
-            
-        horarios_count[franja] = horarios_count.get(franja, 0) + 1
-    
-    horario_pico = max(horarios_count.items(), key=lambda x: x[1]) if horarios_count else ("No definido", 0)
-    
-    # ESPACIO FAVORITO
-    espacio_favorito = Reserva.objects.values(
-        'espacio__nombre'
-    ).annotate(
-        total=Count('id')
-    ).order_by('-total').first()
-    
-    # Top oficinas
-    oficinas_activas = Oficina.objects.annotate(
-        total_reservas=Count('reserva', filter=Q(reserva__fecha__gte=mes_actual, reserva__fecha__lte=hoy))
-    ).order_by('-total_reservas')[:10]
-    
-    for oficina in oficinas_activas:
-        reservas_oficina = Reserva.objects.filter(
-            oficina=oficina,
-            fecha__gte=mes_actual,
-            fecha__lte=hoy
+    try:
+        limite = min(int(request.GET.get('limite', listados.LIMITE_POR_DEFECTO)), listados.LIMITE_MAXIMO)
+        # Historial completo: reservas recientes y archivadas
+        reservas = listados.filtrar(historial.Historial(), request.GET)
+        grupos, siguiente = listados.pagina_agrupada(
+            reservas,
+            cursor=request.GET.get('cursor'),
+            limite=max(limite, 1)
         )
         
-        if reservas_oficina.count() > 0:
-            horas_totales_oficina = sum(r.duracion_horas() for r in reservas_oficina)
-            oficina.promedio_horas = round(horas_totales_oficina / reservas_oficina.count(), 1)
-            oficina.horas_totales_mes = int(horas_totales_oficina)
-        else:
-            oficina.promedio_horas = 0
-            oficina.horas_totales_mes = 0
+        return JsonResponse({
+            'reservas': [listados.serializar_grupo(grupo) for grupo in grupos],
+            'siguiente': siguiente,
+        })
         
-        oficina.porcentaje_barra = min((oficina.total_reservas / 20) * 100, 100) if oficina.total_reservas > 0 else 0
-    
-    # Reservas recientes AGRUPADAS
-    reservas_query = Reserva.objects.select_related(
-        'oficina', 'espacio'
-    ).order_by('oficina', 'espacio', 'fecha', 'hora_inicio')
-    reservas_recientes = agrupar_reservas_consecutivas(reservas_query)
-    
-    context = {
-        'total_reservas': total_reservas,
-        'reservas_hoy': reservas_hoy,
-        'horas_totales': int(horas_esta_semana),
-        'ocupacion': round(ocupacion_actual, 1),
-        'crecimiento_mensual': round(crecimiento_mensual, 1),
-        'crecimiento_diario': round(crecimiento_diario, 1),
-        'crecimiento_semanal': round(crecimiento_semanal, 1),
-        'cambio_ocupacion': round(cambio_ocupacion, 1),
-        'horario_pico': horario_pico[0],
-        'porcentaje_pico': round((horario_pico[1] / total_reservas * 100), 0) if total_reservas > 0 else 0,
-        'espacio_favorito': espacio_favorito['espacio__nombre'] if espacio_favorito else 'No definido',
-        'porcentaje_favorito': round((espacio_favorito['total'] / total_reservas * 100), 0) if espacio_favorito and total_reservas > 0 else 0,
-        'oficinas_activas': oficinas_activas,
-        'reservas_recientes': reservas_recientes,
-    }
-    return render(request, 'reservas/admin_dashboard.html', context)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
 
+@presupuesto(consultas=8)
 @login_required
 def mis_reservas(request):
     try:
         oficina = request.user.oficina
         
-        # ORDENAR Y AGRUPAR RESERVAS
-        reservas_query = Reserva.objects.filter(
-            oficina=oficina
-        ).select_related('espacio').order_by('espacio', 'fecha', 'hora_inicio')
-        
-        # Agrupar reservas consecutivas
-        reservas_agrupadas = agrupar_reservas_consecutivas(reservas_query)
-        
-        # Ordenar por fecha descendente
-        reservas_agrupadas.sort(key=lambda r: r.fecha, reverse=True)
-        
-        # CÁLCULOS DINÁMICOS
         hoy = date.today()
-        primer_dia_mes = hoy.replace(day=1)
-        
-        reservas_este_mes = Reserva.objects.filter(
-            oficina=oficina,
-            fecha__gte=primer_dia_mes,
-            fecha__lte=hoy
-        )
-        
-        horas_este_mes = sum(reserva.duracion_horas() for reserva in reservas_este_mes)
-        
-        espacio_favorito = Reserva.objects.filter(
-            oficina=oficina
-        ).values('espacio__nombre').annotate(
-            total=Count('id')
-        ).order_by('-total').first()
-        
-        espacio_favorito_nombre = espacio_favorito['espacio__nombre'] if espacio_favorito else 'Ninguno'
-        
-        # Ranking
-        mis_reservas_mes = reservas_este_mes.count()
-        todas_las_oficinas = Oficina.objects.annotate(
-            reservas_mes=Count(
-                'reserva',
-                filter=Q(reserva__fecha__gte=primer_dia_mes, reserva__fecha__lte=hoy)
-            )
-        ).order_by('-reservas_mes')
         
-        mi_ranking = 1
-        for i, otra_oficina in enumerate(todas_las_oficinas, 1):
-            if otra_oficina.id == oficina.id:
-                mi_ranking = i
-                break
-        
-        # Estadísticas adicionales
-        total_reservas_activas = sum(1 for r in reservas_agrupadas if r.fecha >= hoy)
-        reservas_pasadas = sum(1 for r in reservas_agrupadas if r.fecha < hoy)
-        
-        proximas_reservas = [r for r in reservas_agrupadas if r.fecha >= hoy][:3]
-        
-        if reservas_este_mes.count() > 0:
-            promedio_horas = horas_este_mes / reservas_este_mes.count()
-        else:
-            promedio_horas = 0
-        
-        # Comparación con mes anterior
-        mes_anterior = (primer_dia_mes - timedelta(days=1)).replace(day=1)
-        fin_mes_anterior = primer_dia_mes - timedelta(days=1)
-        
-        reservas_mes_anterior = Reserva.objects.filter(
-            oficina=oficina,
-            fecha__gte=mes_anterior,
-            fecha__lte=fin_mes_anterior
+        # Solo el mes en curso y las próximas, con los bloques consecutivos
+        # agrupados en SQL, por fecha descendente. Los meses anteriores se
+        # piden por páginas a historial_reservas_ajax al hacer scroll, así el
+        # costo no depende de los años de historial de la oficina
+        reservas_agrupadas = agrupacion.agrupar(
+            Reserva.objects.filter(oficina=oficina, fecha__gte=hoy.replace(day=1))
         )
         
-        horas_mes_anterior = sum(reserva.duracion_horas() for reserva in reservas_mes_anterior)
-        
-        if horas_mes_anterior > 0:
-            crecimiento_porcentaje = ((horas_este_mes - horas_mes_anterior) / horas_mes_anterior) * 100
-        else:
-            crecimiento_porcentaje = 100 if horas_este_mes > 0 else 0
-        
-        # Distribución por tipo
-        tipos_espacios = Reserva.objects.filter(
-            oficina=oficina
-        ).values('espacio__tipo').annotate(
-            cantidad=Count('id')
-        ).order_by('-cantidad')
+        proximas = [r for r in reservas_agrupadas if r.fecha >= hoy]
         
         context = {
             'reservas': reservas_agrupadas,
             'oficina': oficina,
             'today': hoy,
-            'total_reservas_activas': total_reservas_activas,
-            'horas_este_mes': int(horas_este_mes),
-            'reservas_este_mes': reservas_este_mes.count(),
-            'espacio_favorito': espacio_favorito_nombre,
-            'mi_ranking': mi_ranking,
-            'total_oficinas': todas_las_oficinas.count(),
-            'reservas_pasadas': reservas_pasadas,
-            'promedio_horas': round(promedio_horas, 1),
-            'crecimiento_porcentaje': round(crecimiento_porcentaje, 1),
-            'proximas_reservas': proximas_reservas,
-            'tipos_espacios': tipos_espacios,
-            'horas_mes_anterior': int(horas_mes_anterior),
-            'mejora_vs_anterior': horas_este_mes > horas_mes_anterior,
+            'total_reservas_activas': len(proximas),
+            'proximas_reservas': proximas[:3],
+            # Horas, favorito, ranking, mes anterior y tipos: cacheados por oficina
+            **estadisticas.panel_oficina(oficina, hoy),
         }
         
         return render(request, 'reservas/mis_reservas.html', context)
@@ -357,10 +128,119 @@ def mis_reservas(request):
         messages.error(request, f'Error al cargar información: {str(e)}')
         return redirect('login')
 
+# Una consulta más cuando la página trae reservas archivadas
+@presupuesto(consultas=6)
+@require_GET
+@login_required
+def historial_reservas_ajax(request):
+    """
+    Reservas de la oficina anteriores al mes en curso (recientes y
+    archivadas), paginadas por cursor, para el scroll de mis_reservas
+    """
+    try:
+        oficina = request.user.oficina
+    except Oficina.DoesNotExist:
+        return JsonResponse({'error': 'Oficina no encontrada'}, status=403)
+    
+    try:
+        limite = min(int(request.GET.get('limite', listados.LIMITE_POR_DEFECTO)), listados.LIMITE_MAXIMO)
+        reservas = historial.Historial().filter(oficina=oficina, fecha__lt=date.today().replace(day=1))
+        grupos, siguiente = listados.pagina_agrupada(
+            reservas,
+            cursor=request.GET.get('cursor'),
+            limite=max(limite, 1)
+        )
+        
+        return JsonResponse({
+            'reservas': [listados.serializar_grupo(grupo) for grupo in grupos],
+            'siguiente': siguiente,
+        })
+        
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+
+# ============================================
+# RESPUESTAS CONDICIONALES
+# ============================================
+
+def _condicion_por_versiones(nombres_del_request):
+    """
+    Decorador condition() con ETag y Last-Modified tomados de las versiones
+    en cache (reservas/versiones.py) que devuelve nombres_del_request(request).
+    Si los parámetros no son válidos no hay validadores y responde la vista.
+    
+    Va después de login_required: un anónimo no debe poder saber por el ETag
+    si cambió la ocupación de un espacio. La sesión y el usuario son las
+    únicas consultas de un 304.
+    """
+    def nombres(request):
+        try:
+            return nombres_del_request(request)
+        except ValueError:
+            return None
+    
+    def estado(request):
+        if not hasattr(request, '_estado_versiones'):
+            actuales = nombres(request)
+            request._estado_versiones = versiones.estado(*actuales) if actuales else None
+        return request._estado_versiones
+    
+    def etag(request, *args, **kwargs):
+        actual = estado(request)
+        return '-'.join(str(v) for v in actual[0]) if actual else None
+    
+    def modificacion(request, *args, **kwargs):
+        actual = estado(request)
+        return actual[1] if actual else None
+    
+    def decorador(vista):
+        condicionada = condition(etag_func=etag, last_modified_func=modificacion)(vista)
+        if not iscoroutinefunction(vista):
+            return condicionada
+        
+        @wraps(vista)
+        async def vista_async(request, *args, **kwargs):
+            # condition() llama a etag/modificacion sin await: el estado se
+            # lee antes con la cache async para no bloquear el loop
+            if not hasattr(request, '_estado_versiones'):
+                actuales = nombres(request)
+                request._estado_versiones = await versiones.aestado(*actuales) if actuales else None
+            return await condicionada(request, *args, **kwargs)
+        
+        return vista_async
+    
+    return decorador
+
+def _nombres_disponibilidad(request):
+    espacio_id = int(request.GET.get('espacio_id', ''))
+    fecha = datetime.strptime(request.GET.get('fecha', ''), '%Y-%m-%d').date()
+    return [f'dia:{espacio_id}:{fecha.isoformat()}', 'espacios']
+
+# Segundos que se guarda el JSON ya armado; la versión del día lo invalida
+# antes si hay reservas o cancelaciones
+DURACION_CACHE_DISPONIBILIDAD = 30
+
+def _clave_disponibilidad(request, espacio_id, fecha):
+    """Clave del JSON cacheado, o None si no hay versiones para el request"""
+    if not request._estado_versiones:
+        return None
+    version = '-'.join(str(v) for v in request._estado_versiones[0])
+    return f'reservas:disponibilidad:{int(espacio_id)}:{fecha}:{version}'
+
+def _respuesta_disponibilidad(espacio, horarios_disponibles):
+    return JsonResponse({
+        'horarios': horarios_disponibles,
+        'tipo_espacio': espacio.tipo,
+        'nombre_espacio': espacio.nombre
+    })
+
+@presupuesto(consultas=4)
 @require_GET
+@cache_control(private=True, no_cache=True)
 @login_required
+@_condicion_por_versiones(_nombres_disponibilidad)
 def verificar_disponibilidad_ajax(request):
-    """Vista AJAX para verificar disponibilidad"""
+    """Vista AJAX para verificar disponibilidad (versión WSGI)"""
     espacio_id = request.GET.get('espacio_id')
     fecha = request.GET.get('fecha')
     
@@ -368,147 +248,152 @@ def verificar_disponibilidad_ajax(request):
         return JsonResponse({'error': 'Parámetros faltantes'}, status=400)
     
     try:
+        clave = _clave_disponibilidad(request, espacio_id, fecha)
+        if clave:
+            contenido = cache.get(clave)
+            if contenido is not None:
+                return HttpResponse(contenido, content_type='application/json')
+        
         espacio = Espacio.objects.get(id=espacio_id)
         fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
         
-        reservas_existentes = Reserva.objects.filter(
-            espacio=espacio,
-            fecha=fecha_obj
-        ).values('hora_inicio', 'hora_fin')
+        horarios_disponibles = disponibilidad.horarios_con_disponibilidad(espacio, fecha_obj)
         
-        horarios_disponibles = generar_horarios_por_tipo(espacio.tipo)
+        response = _respuesta_disponibilidad(espacio, horarios_disponibles)
+        if clave:
+            cache.set(clave, response.content, DURACION_CACHE_DISPONIBILIDAD)
+        return response
         
-        for horario in horarios_disponibles:
-            horario['ocupado'] = False
-            hora_inicio_horario = datetime.strptime(horario['inicio'], '%H:%M').time()
-            hora_fin_horario = datetime.strptime(horario['fin'], '%H:%M').time()
-            
-            for reserva in reservas_existentes:
-                if (hora_inicio_horario < reserva['hora_fin'] and 
-                    hora_fin_horario > reserva['hora_inicio']):
-                    horario['ocupado'] = True
-                    break
+    except Espacio.DoesNotExist:
+        return JsonResponse({'error': 'Espacio no encontrado'}, status=404)
+    except horarios.HorarioInvalido as e:
+        # También es un ValueError: el problema es la configuración del espacio, no la fecha
+        return JsonResponse({'error': f'Horarios del espacio mal configurados: {e}'}, status=500)
+    except ValueError:
+        return JsonResponse({'error': 'Formato de fecha inválido'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@presupuesto(consultas=4)
+@require_GET
+@cache_control(private=True, no_cache=True)
+@login_required
+@_condicion_por_versiones(_nombres_disponibilidad)
+async def verificar_disponibilidad_async(request):
+    """
+    Misma respuesta que verificar_disponibilidad_ajax con el ORM async: bajo
+    ASGI la espera de la base de datos no ocupa un hilo por request.
+    """
+    espacio_id = request.GET.get('espacio_id')
+    fecha = request.GET.get('fecha')
+    
+    if not espacio_id or not fecha:
+        return JsonResponse({'error': 'Parámetros faltantes'}, status=400)
+    
+    try:
+        clave = _clave_disponibilidad(request, espacio_id, fecha)
+        if clave:
+            contenido = await cache.aget(clave)
+            if contenido is not None:
+                return HttpResponse(contenido, content_type='application/json')
         
-        return JsonResponse({
-            'horarios': horarios_disponibles,
-            'tipo_espacio': espacio.tipo,
-            'nombre_espacio': espacio.nombre
-        })
+        espacio = await Espacio.objects.aget(id=espacio_id)
+        fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
+        
+        horarios_disponibles = await disponibilidad.ahorarios_con_disponibilidad(espacio, fecha_obj)
+        
+        response = _respuesta_disponibilidad(espacio, horarios_disponibles)
+        if clave:
+            await cache.aset(clave, response.content, DURACION_CACHE_DISPONIBILIDAD)
+        return response
         
     except Espacio.DoesNotExist:
         return JsonResponse({'error': 'Espacio no encontrado'}, status=404)
+    except horarios.HorarioInvalido as e:
+        # También es un ValueError: el problema es la configuración del espacio, no la fecha
+        return JsonResponse({'error': f'Horarios del espacio mal configurados: {e}'}, status=500)
     except ValueError:
         return JsonResponse({'error': 'Formato de fecha inválido'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
-def generar_horarios_por_tipo(tipo_espacio):
-    """Genera horarios según tipo de espacio"""
-    if 'directorio' in tipo_espacio.lower():
-        return [
-            {'inicio': '08:00', 'fin': '09:00', 'label': '8:00 AM - 9:00 AM'},
-            {'inicio': '09:00', 'fin': '10:00', 'label': '9:00 AM - 10:00 AM'},
-            {'inicio': '10:00', 'fin': '11:00', 'label': '10:00 AM - 11:00 AM'},
-            {'inicio': '11:00', 'fin': '12:00', 'label': '11:00 AM - 12:00 PM'},
-            {'inicio': '12:00', 'fin': '13:00', 'label': '12:00 PM - 1:00 PM'},
-            {'inicio': '13:00', 'fin': '14:00', 'label': '1:00 PM - 2:00 PM'},
-            {'inicio': '14:00', 'fin': '15:00', 'label': '2:00 PM - 3:00 PM'},
-            {'inicio': '15:00', 'fin': '16:00', 'label': '3:00 PM - 4:00 PM'},
-            {'inicio': '16:00', 'fin': '17:00', 'label': '4:00 PM - 5:00 PM'},
-            {'inicio': '17:00', 'fin': '18:00', 'label': '5:00 PM - 6:00 PM'},
-            {'inicio': '18:00', 'fin': '19:00', 'label': '6:00 PM - 7:00 PM'}
-        ]
-    elif 'estacionamiento' in tipo_espacio.lower():
-        return [
-            {'inicio': '07:00', 'fin': '08:00', 'label': '7:00 AM - 8:00 AM'},
-            {'inicio': '08:00', 'fin': '09:00', 'label': '8:00 AM - 9:00 AM'},
-            {'inicio': '09:00', 'fin': '10:00', 'label': '9:00 AM - 10:00 AM'},
-            {'inicio': '10:00', 'fin': '11:00', 'label': '10:00 AM - 11:00 AM'},
-            {'inicio': '11:00', 'fin': '12:00', 'label': '11:00 AM - 12:00 PM'},
-            {'inicio': '12:00', 'fin': '13:00', 'label': '12:00 PM - 1:00 PM'},
-            {'inicio': '13:00', 'fin': '14:00', 'label': '1:00 PM - 2:00 PM'},
-            {'inicio': '14:00', 'fin': '15:00', 'label': '2:00 PM - 3:00 PM'},
-            {'inicio': '15:00', 'fin': '16:00', 'label': '3:00 PM - 4:00 PM'},
-            {'inicio': '16:00', 'fin': '17:00', 'label': '4:00 PM - 5:00 PM'},
-            {'inicio': '17:00', 'fin': '18:00', 'label': '5:00 PM - 6:00 PM'},
-            {'inicio': '18:00', 'fin': '19:00', 'label': '6:00 PM - 7:00 PM'},
-            {'inicio': '19:00', 'fin': '20:00', 'label': '7:00 PM - 8:00 PM'},
-            {'inicio': '20:00', 'fin': '21:00', 'label': '8:00 PM - 9:00 PM'},
-            {'inicio': '21:00', 'fin': '22:00', 'label': '9:00 PM - 10:00 PM'}
-        ]
-    elif 'terraza' in tipo_espacio.lower():
-        return [
-            {'inicio': '15:00', 'fin': '16:00', 'label': '3:00 PM - 4:00 PM'},
-            {'inicio': '16:00', 'fin': '17:00', 'label': '4:00 PM - 5:00 PM'},
-            {'inicio': '17:00', 'fin': '18:00', 'label': '5:00 PM - 6:00 PM'},
-            {'inicio': '18:00', 'fin': '19:00', 'label': '6:00 PM - 7:00 PM'},
-            {'inicio': '19:00', 'fin': '20:00', 'label': '7:00 PM - 8:00 PM'},
-            {'inicio': '20:00', 'fin': '21:00', 'label': '8:00 PM - 9:00 PM'},
-            {'inicio': '21:00', 'fin': '22:00', 'label': '9:00 PM - 10:00 PM'},
-        ]
-    elif 'comedor' in tipo_espacio.lower():
-        return [
-            {'inicio': '8:00', 'fin': '9:00', 'label': '8:00 AM - 9:00 AM'},
-            {'inicio': '9:00', 'fin': '10:00', 'label': '9:00 AM - 10:00 AM'},
-            {'inicio': '10:00', 'fin': '11:00', 'label': '10:00 AM - 11:00 AM'},
-        ]
-    else:  # salas
-        return [
-            {'inicio': '08:00', 'fin': '09:00', 'label': '8:00 AM - 9:00 AM'},
-            {'inicio': '09:00', 'fin': '10:00', 'label': '9:00 AM - 10:00 AM'},
-            {'inicio': '10:00', 'fin': '11:00', 'label': '10:00 AM - 11:00 AM'},
-            {'inicio': '11:00', 'fin': '12:00', 'label': '11:00 AM - 12:00 PM'},
-            {'inicio': '12:00', 'fin': '13:00', 'label': '12:00 PM - 1:00 PM'},
-            {'inicio': '13:00', 'fin': '14:00', 'label': '1:00 PM - 2:00 PM'},
-            {'inicio': '14:00', 'fin': '15:00', 'label': '2:00 PM - 3:00 PM'},
-            {'inicio': '15:00', 'fin': '16:00', 'label': '3:00 PM - 4:00 PM'},
-            {'inicio': '16:00', 'fin': '17:00', 'label': '4:00 PM - 5:00 PM'},
-            {'inicio': '17:00', 'fin': '18:00', 'label': '5:00 PM - 6:00 PM'}
-        ]
+def _rango_mes(mes):
+    """(year, month, primer_dia, ultimo_dia) de `mes` (YYYY-MM) o del mes actual"""
+    if mes:
+        year, month = map(int, mes.split('-'))
+    else:
+        hoy = date.today()
+        year, month = hoy.year, hoy.month
+    
+    primer_dia = date(year, month, 1)
+    if month == 12:
+        ultimo_dia = date(year + 1, 1, 1) - timedelta(days=1)
+    else:
+        ultimo_dia = date(year, month + 1, 1) - timedelta(days=1)
+    return year, month, primer_dia, ultimo_dia
+
+def _ocupacion_del_mes(espacio, primer_dia, ultimo_dia):
+    return OcupacionDiaria.objects.filter(
+        espacio=espacio,
+        fecha__gte=primer_dia,
+        fecha__lte=ultimo_dia
+    ).values_list('fecha', 'total_reservas')
+
+def _respuesta_calendario(espacio, year, month, ocupacion_por_dia):
+    return JsonResponse({
+        'ocupacion_por_dia': ocupacion_por_dia,
+        'mes_solicitado': f"{year}-{month:02d}",
+        'espacio_nombre': espacio.nombre
+    })
 
+@presupuesto(consultas=4)
 @require_GET
 @login_required
 def obtener_calendario_ocupacion_ajax(request):
-    """Vista AJAX para calendario"""
+    """Vista AJAX para calendario (versión WSGI)"""
     espacio_id = request.GET.get('espacio_id')
-    mes = request.GET.get('mes')
     
     if not espacio_id:
         return JsonResponse({'error': 'ID de espacio requerido'}, status=400)
     
     try:
         espacio = Espacio.objects.get(id=espacio_id)
+        year, month, primer_dia, ultimo_dia = _rango_mes(request.GET.get('mes'))
         
-        if mes:
-            year, month = map(int, mes.split('-'))
-        else:
-            hoy = date.today()
-            year, month = hoy.year, hoy.month
+        ocupacion_por_dia = {
+            str(fecha_dia): total_reservas
+            for fecha_dia, total_reservas in _ocupacion_del_mes(espacio, primer_dia, ultimo_dia)
+        }
         
-        primer_dia = date(year, month, 1)
-        if month == 12:
-            ultimo_dia = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            ultimo_dia = date(year, month + 1, 1) - timedelta(days=1)
-        
-        reservas_mes = Reserva.objects.filter(
-            espacio=espacio,
-            fecha__gte=primer_dia,
-            fecha__lte=ultimo_dia
-        ).values('fecha').annotate(
-            total_reservas=Count('id')
-        )
+        return _respuesta_calendario(espacio, year, month, ocupacion_por_dia)
+        
+    except Espacio.DoesNotExist:
+        return JsonResponse({'error': 'Espacio no encontrado'}, status=404)
+    except ValueError:
+        return JsonResponse({'error': 'Formato de mes inválido'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@presupuesto(consultas=4)
+@require_GET
+@login_required
+async def calendario_ocupacion_async(request):
+    """Misma respuesta que obtener_calendario_ocupacion_ajax con el ORM async"""
+    espacio_id = request.GET.get('espacio_id')
+    
+    if not espacio_id:
+        return JsonResponse({'error': 'ID de espacio requerido'}, status=400)
+    
+    try:
+        espacio = await Espacio.objects.aget(id=espacio_id)
+        year, month, primer_dia, ultimo_dia = _rango_mes(request.GET.get('mes'))
         
         ocupacion_por_dia = {
-            str(reserva['fecha']): reserva['total_reservas'] 
-            for reserva in reservas_mes
+            str(fecha_dia): total_reservas
+            async for fecha_dia, total_reservas in _ocupacion_del_mes(espacio, primer_dia, ultimo_dia)
         }
         
-        return JsonResponse({
-            'ocupacion_por_dia': ocupacion_por_dia,
-            'mes_solicitado': f"{year}-{month:02d}",
-            'espacio_nombre': espacio.nombre
-        })
+        return _respuesta_calendario(espacio, year, month, ocupacion_por_dia)
         
     except Espacio.DoesNotExist:
         return JsonResponse({'error': 'Espacio no encontrado'}, status=404)
@@ -517,6 +402,138 @@ def obtener_calendario_ocupacion_ajax(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def _mes_del_calendario(request):
+    """(year, month) del parámetro `mes` (YYYY-MM), o el mes actual"""
+    mes = request.GET.get('mes')
+    if not mes:
+        hoy = date.today()
+        return hoy.year, hoy.month
+    year, month = map(int, mes.split('-'))
+    date(year, month, 1)  # valida el mes
+    return year, month
+
+def _nombres_calendario(request):
+    year, month = _mes_del_calendario(request)
+    return [f'mes:{year}-{month:02d}', 'espacios']
+
+@presupuesto(consultas=4)
+@require_GET
+@cache_control(private=True, max_age=60)
+@login_required
+@_condicion_por_versiones(_nombres_calendario)
+def calendario_edificio_ajax(request):
+    """
+    Vista AJAX con la ocupación diaria de todos los espacios activos en un mes.
+    
+    El ETag sale del contador de cambios del mes en la cache: si el navegador
+    ya tiene la versión vigente se responde 304 sin leer la ocupación.
+    """
+    try:
+        year, month = _mes_del_calendario(request)
+        return JsonResponse({
+            'mes': f"{year}-{month:02d}",
+            'espacios': ocupacion.calendario_mes(year, month),
+        })
+    except ValueError:
+        return JsonResponse({'error': 'Formato de mes inválido'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+# ============================================
+# EVENTOS EN VIVO (Server-Sent Events)
+# ============================================
+
+# Tras este tiempo se corta la conexión y EventSource se reconecta solo
+DURACION_MAXIMA_EVENTOS = 10 * 60
+
+def _mensaje_sse(evento):
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+
+@require_GET
+async def eventos_sse(request):
+    """
+    Flujo de eventos en vivo (reservas/eventos.py). Parámetros: espacio_id y
+    fecha para las reservas y cancelaciones de ese día, y/o panel=1 (solo
+    administradores) para las variaciones de los indicadores.
+    
+    Solo funciona servido por edificio/asgi.py: bajo WSGI cada conexión
+    abierta ocuparía un worker entero.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Los eventos en vivo requieren el servidor ASGI'}, status=503)
+    
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'No autorizado'}, status=401)
+    
+    temas = []
+    try:
+        if request.GET.get('espacio_id') and request.GET.get('fecha'):
+            fecha_obj = datetime.strptime(request.GET['fecha'], '%Y-%m-%d').date()
+            temas.append(eventos.tema_dia(int(request.GET['espacio_id']), fecha_obj))
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    if request.GET.get('panel'):
+        if not user.is_superuser:
+            return JsonResponse({'error': 'No autorizado'}, status=403)
+        temas.append(eventos.TEMA_PANEL)
+    if not temas:
+        return JsonResponse({'error': 'Parámetros faltantes'}, status=400)
+    
+    async def flujo():
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + DURACION_MAXIMA_EVENTOS
+        yield 'retry: 3000\n\n'
+        async with aclosing(eventos.escuchar(temas)) as recibidos:
+            async for evento in recibidos:
+                # Sin eventos se manda un comentario para mantener viva la conexión
+                yield _mensaje_sse(evento) if evento else ': ping\n\n'
+                if loop.time() > limite:
+                    break
+    
+    response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@presupuesto(consultas=4)
+@require_GET
+@login_required
+def matriz_disponibilidad_ajax(request):
+    """
+    Vista AJAX con la matriz libre/ocupado de varios espacios en un rango.
+    Parámetros: espacios (IDs separados por coma) o tipo, desde y hasta
+    (por defecto una semana desde `desde`).
+    """
+    desde = request.GET.get('desde')
+    if not desde or not (request.GET.get('espacios') or request.GET.get('tipo')):
+        return JsonResponse({'error': 'Parámetros faltantes'}, status=400)
+    
+    try:
+        desde_obj = datetime.strptime(desde, '%Y-%m-%d').date()
+        hasta = request.GET.get('hasta')
+        hasta_obj = datetime.strptime(hasta, '%Y-%m-%d').date() if hasta else desde_obj + timedelta(days=6)
+        
+        espacios = Espacio.objects.filter(activo=True).order_by('tipo', 'nombre')
+        if request.GET.get('espacios'):
+            espacios = espacios.filter(id__in=[int(i) for i in request.GET['espacios'].split(',')])
+        if request.GET.get('tipo'):
+            espacios = espacios.filter(tipo=request.GET['tipo'])
+        # Un espacio más que el máximo alcanza para saber que se pasó
+        espacios = espacios[:matriz.MAX_ESPACIOS + 1]
+        
+        return JsonResponse(matriz.calcular(espacios, desde_obj, hasta_obj))
+        
+    except matriz.MatrizDemasiadoGrande as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except horarios.HorarioInvalido as e:
+        return JsonResponse({'error': f'Horarios del espacio mal configurados: {e}'}, status=500)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@presupuesto(consultas=13)
 @login_required
 def nueva_reserva(request):
     try:
@@ -553,43 +570,30 @@ def nueva_reserva(request):
                     messages.error(request, 'El directorio permite máximo 8 bloques por día')
                     return redirect('nueva_reserva')
             
-            reservas_creadas = 0
-            
-            for bloque in bloques_horarios:
-                if '-' not in bloque:
-                    continue
-                    
-                try:
-                    hora_inicio_str, hora_fin_str = bloque.split('-')
-                    hora_inicio_obj = datetime.strptime(hora_inicio_str, '%H:%M').time()
-                    hora_fin_obj = datetime.strptime(hora_fin_str, '%H:%M').time()
-                    
-                    conflicto = Reserva.objects.filter(
-                        espacio=espacio,
-                        fecha=fecha_obj,
-                        hora_inicio__lt=hora_fin_obj,
-                        hora_fin__gt=hora_inicio_obj
-                    ).exists()
-                    
-                    if conflicto:
-                        messages.error(request, f'Conflicto en horario {hora_inicio_str}-{hora_fin_str}')
+            try:
+                # Solo se aceptan los bloques que ofrece el espacio
+                plantilla = horarios.para_espacio(espacio)
+                for _, inicio, fin in disponibilidad.parsear_bloques(bloques_horarios):
+                    if not plantilla.contiene(inicio, fin):
+                        messages.error(request, f'El horario {inicio:%H:%M}-{fin:%H:%M} no está disponible para {espacio.nombre}')
                         return redirect('nueva_reserva')
-                    
-                    Reserva.objects.create(
-                        oficina=oficina,
-                        espacio=espacio,
-                        fecha=fecha_obj,
-                        hora_inicio=hora_inicio_obj,
-                        hora_fin=hora_fin_obj,
-                        nombre_visitante=nombre_visitante,
-                        placa_visitante=placa_visitante,
-                        empresa_visitante=empresa_visitante
-                    )
-                    reservas_creadas += 1
-                    
-                except ValueError:
-                    messages.error(request, f'Formato inválido: {bloque}')
-                    return redirect('nueva_reserva')
+
+                frecuencia = request.POST.get('repetir', '')
+                if frecuencia:
+                    return _crear_serie(request, oficina, espacio, fecha_obj, bloques_horarios, frecuencia)
+
+                reservas_creadas = len(disponibilidad.reservar(
+                    oficina,
+                    espacio,
+                    fecha_obj,
+                    bloques_horarios,
+                    nombre_visitante=nombre_visitante,
+                    placa_visitante=placa_visitante,
+                    empresa_visitante=empresa_visitante
+                ))
+            except (disponibilidad.ConflictoHorario, disponibilidad.BloqueInvalido) as e:
+                messages.error(request, str(e))
+                return redirect('nueva_reserva')
             
             if reservas_creadas > 0:
                 messages.success(request, f'Se crearon {reservas_creadas} reserva(s) exitosamente!')
@@ -613,87 +617,183 @@ def nueva_reserva(request):
     context = {
         'espacios': espacios,
         'fecha_minima': date.today().isoformat(),
+        'frecuencias': SerieReserva.FRECUENCIAS,
+        'max_repeticiones': series.MAX_FECHAS,
     }
     return render(request, 'reservas/nueva_reserva.html', context)
 
+def _crear_serie(request, oficina, espacio, fecha_inicio, bloques_horarios, frecuencia):
+    """Rama de nueva_reserva para las reservas periódicas"""
+    hasta = request.POST.get('repetir_hasta')
+    repeticiones = request.POST.get('repeticiones')
+    try:
+        resultado = series.crear_serie(
+            oficina,
+            espacio,
+            fecha_inicio,
+            bloques_horarios,
+            frecuencia,
+            hasta=datetime.strptime(hasta, '%Y-%m-%d').date() if hasta else None,
+            repeticiones=int(repeticiones) if repeticiones else None,
+            nombre_visitante=request.POST.get('nombre_visitante', ''),
+            placa_visitante=request.POST.get('placa_visitante', ''),
+            empresa_visitante=request.POST.get('empresa_visitante', ''),
+        )
+    except (series.SerieInvalida, disponibilidad.BloqueInvalido) as e:
+        messages.error(request, str(e))
+        return redirect('nueva_reserva')
+    except ValueError:
+        messages.error(request, 'La fecha de término o la cantidad de repeticiones no son válidas')
+        return redirect('nueva_reserva')
+
+    conflictos = ', '.join(f'{fecha:%d/%m/%Y} ({bloque})' for fecha, bloque in resultado.conflictos[:5])
+    if len(resultado.conflictos) > 5:
+        conflictos += f' y {len(resultado.conflictos) - 5} más'
+    if resultado.serie is None:
+        messages.error(request, f'No se creó la serie: todas las fechas tienen conflictos: {conflictos}')
+        return redirect('nueva_reserva')
+
+    messages.success(
+        request,
+        f'Se creó la serie {resultado.serie.get_frecuencia_display().lower()} con '
+        f'{len(resultado.fechas_creadas)} fecha(s) y {len(resultado.creadas)} reserva(s)'
+    )
+    if resultado.conflictos:
+        messages.warning(request, f'No se reservaron {len(resultado.conflictos)} fecha(s) con conflicto: {conflictos}')
+    return redirect('mis_reservas')
+
+@login_required
+@require_POST
+def cancelar_serie(request, serie_id):
+    """Cancela las reservas pendientes de una serie (las pasadas quedan en el historial)"""
+    try:
+        oficina = request.user.oficina
+    except Oficina.DoesNotExist:
+        messages.error(request, 'Error: Oficina no encontrada')
+        return redirect('login')
+
+    serie = get_object_or_404(SerieReserva, id=serie_id, oficina=oficina)
+    resumen = series.cancelar_serie(serie, desde=date.today())
+    if resumen:
+        messages.success(request, f'✅ Se canceló la serie: {resumen.cantidad} bloque(s) de {resumen.descripcion()}')
+    else:
+        messages.error(request, '❌ La serie no tiene reservas pendientes')
+    return redirect('mis_reservas')
+
 @login_required
+@require_POST
 def eliminar_reserva(request, reserva_id):
     """
-    Elimina una reserva o un grupo de reservas agrupadas
-    MEJORADO: Puede eliminar múltiples reservas si vienen de un grupo
+    Elimina una reserva o un grupo de reservas agrupadas (reservas_ids) con
+    un solo DELETE
     """
     try:
         oficina = request.user.oficina
+        ids = request.POST.getlist('reservas_ids') or [reserva_id]
+        resumen = cancelacion.cancelar(oficina, ids=[int(i) for i in ids])
         
-        # Verificar si se envían múltiples IDs (reserva agrupada)
-        ids_a_eliminar = request.POST.getlist('reservas_ids')
-        
-        if ids_a_eliminar:
-            # Eliminar múltiples reservas (grupo)
-            reservas = Reserva.objects.filter(id__in=ids_a_eliminar, oficina=oficina)
-            cantidad = reservas.count()
-            
-            if cantidad > 0:
-                primera_reserva = reservas.first()
-                espacio_nombre = primera_reserva.espacio.nombre
-                fecha_reserva = primera_reserva.fecha.strftime('%d/%m/%Y')
-                
-                reservas.delete()
-                
-                messages.success(
-                    request,
-                    f'✅ Se eliminaron {cantidad} bloque(s) de reserva: {espacio_nombre} - {fecha_reserva}'
-                )
-            else:
-                messages.error(request, '❌ No se encontraron las reservas')
-        else:
-            # Eliminar reserva individual
-            reserva = get_object_or_404(Reserva, id=reserva_id, oficina=oficina)
-            
-            espacio_nombre = reserva.espacio.nombre
-            fecha_reserva = reserva.fecha.strftime('%d/%m/%Y')
-            hora_reserva = reserva.hora_inicio.strftime('%I:%M %p')
-            
-            reserva.delete()
-            
+        if resumen.cantidad == 1:
+            reserva = resumen.reservas[0]
             messages.success(
                 request,
-                f'✅ Reserva eliminada: {espacio_nombre} - {fecha_reserva} a las {hora_reserva}'
+                f'✅ Reserva eliminada: {resumen.descripcion()} a las {reserva.hora_inicio.strftime("%I:%M %p")}'
             )
+        elif resumen:
+            messages.success(request, f'✅ Se eliminaron {resumen.cantidad} bloque(s) de reserva: {resumen.descripcion()}')
+        else:
+            messages.error(request, '❌ No se encontraron las reservas')
         
     except Exception as e:
         messages.error(request, f'❌ Error al eliminar: {str(e)}')
     
     return redirect('mis_reservas')
 
+@login_required
+@require_POST
+def cancelar_reservas(request):
+    """
+    Cancelación masiva: por lista de IDs (reservas_ids), por rango de fechas
+    (desde/hasta, opcionalmente de un espacio) o por serie. Un solo DELETE
+    que actualiza la ocupación y los resúmenes en la misma transacción.
+    """
+    try:
+        oficina = request.user.oficina
+    except Oficina.DoesNotExist:
+        messages.error(request, 'Error: Oficina no encontrada')
+        return redirect('login')
+    
+    try:
+        desde = request.POST.get('desde')
+        hasta = request.POST.get('hasta')
+        espacio_id = request.POST.get('espacio')
+        serie_id = request.POST.get('serie')
+        resumen = cancelacion.cancelar(
+            oficina,
+            ids=[int(i) for i in request.POST.getlist('reservas_ids')],
+            espacio=int(espacio_id) if espacio_id else None,
+            desde=datetime.strptime(desde, '%Y-%m-%d').date() if desde else None,
+            hasta=datetime.strptime(hasta, '%Y-%m-%d').date() if hasta else None,
+            serie=int(serie_id) if serie_id else None,
+        )
+    except cancelacion.CancelacionInvalida as e:
+        messages.error(request, f'❌ {e}')
+        return redirect('mis_reservas')
+    except ValueError:
+        messages.error(request, '❌ Parámetros inválidos')
+        return redirect('mis_reservas')
+    
+    if resumen:
+        messages.success(request, f'✅ Se cancelaron {resumen.cantidad} bloque(s) de reserva: {resumen.descripcion()}')
+    else:
+        messages.error(request, '❌ No se encontraron reservas para cancelar')
+    return redirect('mis_reservas')
+
 def logout_view(request):
     logout(request)
     return redirect('login')
 
+@login_required
+@require_POST
 def importar_usuarios(request):
-    from django.http import HttpResponse
-    from django.core.management import call_command
-    from django.contrib.auth.models import User
+    """
+    Importa el fixture de usuarios dentro del request (solo administradores,
+    una importación a la vez). Los archivos grandes se importan con
+    `python manage.py importar_usuarios <archivo>`.
+    """
     import os
     
+    if not request.user.is_superuser:
+        return HttpResponse("❌ No autorizado", status=403)
+    
+    archivo = None
+    for nombre in ['usuarios_limpio.json', 'usuarios_utf8.json', 'usuarios.json']:
+        if os.path.exists(nombre):
+            archivo = nombre
+            break
+    
+    if not archivo:
+        return HttpResponse("❌ Ningún archivo de usuarios encontrado")
+    
     try:
-        archivo = None
-        for nombre in ['usuarios_limpio.json', 'usuarios_utf8.json', 'usuarios.json']:
-            if os.path.exists(nombre):
-                archivo = nombre
-                break
-        
-        if not archivo:
-            return HttpResponse("❌ Ningún archivo de usuarios encontrado")
-        
-        usuarios_antes = User.objects.count()
-        call_command('loaddata', archivo)
-        usuarios_despues = User.objects.count()
-        
-        return HttpResponse(f"✅ Importación exitosa usando {archivo}!<br>Usuarios antes: {usuarios_antes}<br>Usuarios después: {usuarios_despues}")
-        
-    except Exception as e:
-        return HttpResponse(f"❌ Error al importar: {str(e)}")
+        resultado = importacion.importar_en_request(archivo)
+    except importacion.ImportacionEnCurso as e:
+        return HttpResponse(f"⏳ {escape(str(e))}", status=409)
+    except importacion.ArchivoDemasiadoGrande as e:
+        return HttpResponse(f"❌ {escape(str(e))}", status=413)
+    except (OSError, LookupError, UnicodeDecodeError) as e:
+        return HttpResponse(f"❌ No se pudo leer {archivo}: {escape(str(e))}", status=500)
+    
+    errores = "<br>".join(f"- registro {e['registro']}: {escape(e['error'])}" for e in resultado.errores)
+    if resultado.error_fatal:
+        titulo = f"❌ Error al importar {archivo}: {escape(resultado.error_fatal)}"
+    else:
+        titulo = f"✅ Importación terminada usando {archivo}"
+    return HttpResponse(
+        f"{titulo}<br>Registros procesados: {resultado.procesados}"
+        f"<br>Usuarios creados: {resultado.usuarios_creados} · actualizados: {resultado.usuarios_actualizados}"
+        f"<br>Oficinas creadas: {resultado.oficinas_creadas} · actualizadas: {resultado.oficinas_actualizadas}"
+        f"<br>Errores: {resultado.total_errores}<br>{errores}"
+    )
 
 def ver_usuarios(request):
     from django.http import HttpResponse